@@ -3,25 +3,45 @@
 from django.contrib import admin
 
 #
-from .models import PersonalChat, GroupChat, Message
+from .models import (
+    PersonalChat,
+    GroupChat,
+    PersonalChatMembership,
+    GroupChatMembership,
+    Message,
+)
+from .services import sync_inbox
 
 
 class MessageInline(admin.TabularInline):
     model = Message
     extra = 0
-    readonly_fields = ("uuid", "sender", "content", "created_at", "is_read")
+    readonly_fields = ("uuid", "seq", "sender", "content", "created_at", "is_read")
     can_delete = False
 
     def has_add_permission(self, request, obj=None):
         return False
 
 
+class PersonalChatMembershipInline(admin.TabularInline):
+    model = PersonalChatMembership
+    extra = 0
+    autocomplete_fields = ("user",)
+    readonly_fields = ("joined_at",)
+
+
+class GroupChatMembershipInline(admin.TabularInline):
+    model = GroupChatMembership
+    extra = 0
+    autocomplete_fields = ("user",)
+    readonly_fields = ("joined_at",)
+
+
 @admin.register(PersonalChat)
 class PersonalChatAdmin(admin.ModelAdmin):
     list_display = ("uuid", "created_at", "updated_at", "get_participants")
     readonly_fields = ("uuid", "created_at", "updated_at")
-    filter_horizontal = ("participants",)
-    inlines = [MessageInline]
+    inlines = [PersonalChatMembershipInline, MessageInline]
 
     def get_participants(self, obj):
         return ", ".join([user.username for user in obj.participants.all()])
@@ -33,6 +53,11 @@ class PersonalChatAdmin(admin.ModelAdmin):
             return []
         return super().get_inline_instances(request, obj)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Membership inlines bypass chat.services
+        sync_inbox(form.instance)
+
 
 @admin.register(GroupChat)
 class GroupChatAdmin(admin.ModelAdmin):
@@ -45,8 +70,7 @@ class GroupChatAdmin(admin.ModelAdmin):
         "get_participant_count",
     )
     readonly_fields = ("uuid", "created_at", "updated_at")
-    filter_horizontal = ("participants",)
-    inlines = [MessageInline]
+    inlines = [GroupChatMembershipInline, MessageInline]
 
     def get_participant_count(self, obj):
         return obj.participants.count()
@@ -58,6 +82,11 @@ class GroupChatAdmin(admin.ModelAdmin):
             return []
         return super().get_inline_instances(request, obj)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Membership inlines bypass chat.services
+        sync_inbox(form.instance)
+
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
@@ -69,8 +98,18 @@ class MessageAdmin(admin.ModelAdmin):
         "created_at",
         "is_read",
     )
-    readonly_fields = ("uuid", "sender", "personal_chat", "group_chat", "created_at")
-    list_filter = ("is_read", "created_at")
+    readonly_fields = (
+        "uuid",
+        "seq",
+        "sender",
+        "chat_id",
+        "chat_kind",
+        "personal_chat",
+        "group_chat",
+        "created_at",
+    )
+    list_filter = ("chat_kind", "is_read", "created_at")
+    list_select_related = ("sender", "group_chat")
     search_fields = ("content", "sender__username")
 
     def content_preview(self, obj):
@@ -81,8 +120,8 @@ class MessageAdmin(admin.ModelAdmin):
     content_preview.short_description = "Content"
 
     def get_chat(self, obj):
-        if obj.personal_chat:
-            return f"Personal: {obj.personal_chat.uuid}"
-        return f"Group: {obj.group_chat.name}"
+        if obj.group_chat_id:
+            return f"Group: {obj.group_chat.name}"
+        return f"Personal: {obj.personal_chat_id}"
 
     get_chat.short_description = "Chat"
@@ -1,8 +1,17 @@
 # backend\chat\apps.py:
 
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ChatConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chat"
+
+    def ready(self):
+        # Import signals to ensure they are registered
+        import chat.signals
+        from chat.search import install_search_index
+
+        # Full-text index DDL that a Django migration cannot express portably
+        post_migrate.connect(install_search_index, sender=self)
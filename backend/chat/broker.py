@@ -0,0 +1,150 @@
+# backend\chat\broker.py:
+
+import asyncio
+import json
+import logging
+import struct
+from collections import defaultdict
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Every frame is a 4-byte big-endian length followed by a UTF-8 JSON object
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 1024 * 1024
+
+# A client whose socket buffer grows past this stops receiving until it drains
+MAX_CLIENT_BUFFER = 4 * 1024 * 1024
+
+
+def encode_frame(frame):
+    data = json.dumps(frame, separators=(",", ":")).encode()
+    return HEADER.pack(len(data)) + data
+
+
+async def read_frame(reader):
+    (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {size} bytes exceeds {MAX_FRAME_SIZE}")
+    return json.loads(await reader.readexactly(size))
+
+
+def parse_address(address):
+    """
+    "tcp://host:port" or "unix:///path/to/socket" -> (scheme, host/path, port)
+    """
+    url = urlparse(address)
+    if url.scheme == "unix":
+        return "unix", url.path, None
+    if url.scheme == "tcp":
+        return "tcp", url.hostname, url.port
+    raise ValueError(f"Unsupported broker address: {address}")
+
+
+async def open_connection(address):
+    scheme, host, port = parse_address(address)
+    if scheme == "unix":
+        return await asyncio.open_unix_connection(host)
+    return await asyncio.open_connection(host, port)
+
+
+class ChannelBroker:
+    """
+    Message router behind chat.layers.BrokerChannelLayer.
+
+    Each worker process connects once and identifies itself with a client id
+    that is embedded in all of its channel names. The broker only tracks which
+    clients have members in which group; per-channel membership stays in the
+    workers, so a group message crosses the wire once per worker, not once
+    per socket.
+
+    Client -> broker:
+        {"op": "hello", "client": id}
+        {"op": "send", "client": id, "channel": name, "message": {...}}
+        {"op": "group_add" | "group_discard", "group": name}
+        {"op": "group_send", "group": name, "message": {...}}
+    Broker -> client:
+        {"op": "deliver", "channel": name, "message": {...}}
+        {"op": "group", "group": name, "message": {...}}
+    """
+
+    def __init__(self):
+        self.clients = {}
+        self.groups = defaultdict(set)
+        self.dropped = 0
+
+    async def serve(self, address):
+        scheme, host, port = parse_address(address)
+        if scheme == "unix":
+            server = await asyncio.start_unix_server(self.handle, host)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        logger.info(f"Channel broker listening on {address}")
+        async with server:
+            await server.serve_forever()
+
+    def write(self, client_id, data):
+        writer = self.clients.get(client_id)
+        if writer is None:
+            return
+        if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            self.dropped += 1
+            return
+        writer.write(data)
+
+    async def handle(self, reader, writer):
+        client_id = None
+        try:
+            hello = await read_frame(reader)
+            client_id = hello["client"]
+            self.clients[client_id] = writer
+
+            while True:
+                frame = await read_frame(reader)
+                op = frame["op"]
+                if op == "send":
+                    self.write(
+                        frame["client"],
+                        encode_frame(
+                            {
+                                "op": "deliver",
+                                "channel": frame["channel"],
+                                "message": frame["message"],
+                            }
+                        ),
+                    )
+                elif op == "group_add":
+                    self.groups[frame["group"]].add(client_id)
+                elif op == "group_discard":
+                    self.discard(frame["group"], client_id)
+                elif op == "group_send":
+                    members = self.groups.get(frame["group"], ())
+                    if len(members) > 1 or client_id not in members:
+                        data = encode_frame(
+                            {
+                                "op": "group",
+                                "group": frame["group"],
+                                "message": frame["message"],
+                            }
+                        )
+                        # The sender already delivered to its own members
+                        for member in members:
+                            if member != client_id:
+                                self.write(member, data)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except (ValueError, KeyError) as e:
+            logger.error(f"Closing broker client {client_id}: {str(e)}")
+        finally:
+            if client_id is not None and self.clients.get(client_id) is writer:
+                del self.clients[client_id]
+                for group in list(self.groups):
+                    self.discard(group, client_id)
+            writer.close()
+
+    def discard(self, group, client_id):
+        members = self.groups.get(group)
+        if members is not None:
+            members.discard(client_id)
+            if not members:
+                del self.groups[group]
@@ -0,0 +1,218 @@
+# backend\chat\buffer.py:
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from utils.enamurations import ChatKind
+
+#
+from .models import Message
+from .services import bulk_create_messages
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriteBuffer:
+    """
+    Per-process write-behind buffer for WebSocket messages.
+
+    Consumers hand over fully built (uuid, created_at, seq) Message instances
+    and broadcast immediately. The buffer writes them with bulk_create when
+    ``batch_size`` rows are pending or ``flush_interval`` seconds have passed.
+
+    Delivery to the database is at-least-once: a failed batch stays at the
+    head of the queue and is retried; rows are keyed by their uuid, so a
+    retry never duplicates a message. After ``max_attempts`` failures the
+    batch is written row by row and the rows that still fail are appended to
+    the ``dead_letter_path`` NDJSON file, from which replay_dead_letters
+    writes them later. A row leaves memory only once it is in one or the
+    other.
+    """
+
+    def __init__(
+        self,
+        batch_size,
+        flush_interval,
+        dead_letter_path,
+        max_attempts=5,
+        retry_delay=1.0,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dead_letter_path = dead_letter_path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.pending = []
+        self.attempts = 0
+        self._task = None
+        self._has_data = None
+        self._full = None
+
+    def add(self, message):
+        if self._task is None or self._task.done():
+            self._has_data = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+        self.pending.append(message)
+        self._has_data.set()
+        if len(self.pending) >= self.batch_size:
+            self._full.set()
+
+    async def _run(self):
+        while True:
+            await self._has_data.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._has_data.clear()
+            self._full.clear()
+
+            if not await self.flush():
+                await asyncio.sleep(self.retry_delay)
+            if self.pending:
+                self._has_data.set()
+
+    async def flush(self):
+        """
+        Write everything pending. Returns False if a batch had to be
+        put back for a later retry.
+        """
+        while self.pending:
+            batch = self.pending[: self.batch_size]
+            try:
+                await database_sync_to_async(self.write_batch)(batch)
+            except Exception as e:
+                self.attempts += 1
+                logger.error(
+                    f"Write-behind flush of {len(batch)} messages failed "
+                    f"(attempt {self.attempts}): {str(e)}"
+                )
+                return False
+
+            del self.pending[: len(batch)]
+            self.attempts = 0
+        return True
+
+    def write_batch(self, batch):
+        if self.attempts < self.max_attempts:
+            bulk_create_messages(batch)
+        else:
+            self.write_one_by_one(batch)
+
+    def write_one_by_one(self, batch):
+        failed = []
+        for message in batch:
+            try:
+                bulk_create_messages([message])
+            except Exception as e:
+                logger.error(f"Dead-lettering message {message.uuid}: {str(e)}")
+                failed.append(message)
+        if failed:
+            # Raises if the file cannot be written: the batch then stays pending
+            write_dead_letters(self.dead_letter_path, failed)
+
+    async def drain(self):
+        """
+        Stop the background task and write out everything still pending
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while self.pending:
+            if not await self.flush():
+                await asyncio.sleep(self.retry_delay)
+
+    def drain_sync(self):
+        """
+        Write out everything still pending once the event loop is gone: the
+        atexit path for servers that send no lifespan shutdown (daphne
+        stopping on SIGTERM). Gives up, logging what is lost, only if even
+        the dead-letter file cannot be written.
+        """
+        # The task belonged to the stopped loop
+        self._task = None
+        while self.pending:
+            batch = self.pending[: self.batch_size]
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                self.attempts += 1
+                logger.error(
+                    f"Write-behind flush of {len(batch)} messages at exit failed "
+                    f"(attempt {self.attempts}): {str(e)}"
+                )
+                if self.attempts > self.max_attempts:
+                    logger.critical(
+                        f"Lost {len(self.pending)} write-behind messages: "
+                        + ", ".join(str(message.uuid) for message in self.pending)
+                    )
+                    self.pending.clear()
+                    return
+                time.sleep(self.retry_delay)
+                continue
+
+            del self.pending[: len(batch)]
+            self.attempts = 0
+
+
+def dead_letter_line(message):
+    return json.dumps(
+        {
+            "uuid": str(message.uuid),
+            "seq": message.seq,
+            "sender": str(message.sender_id),
+            "content": message.content,
+            "created_at": message.created_at.isoformat(),
+            "chat_id": str(message.chat_id),
+            "chat_kind": message.chat_kind,
+        }
+    )
+
+
+def write_dead_letters(path, messages):
+    with open(path, "a", encoding="utf-8") as file:
+        file.writelines(dead_letter_line(message) + "\n" for message in messages)
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def read_dead_letter(line):
+    """
+    Unsaved Message rebuilt from a dead-letter line
+    """
+    row = json.loads(line)
+    chat_id = uuid.UUID(row["chat_id"])
+    chat_field = (
+        "personal_chat_id" if row["chat_kind"] == ChatKind.PERSONAL else "group_chat_id"
+    )
+    return Message(
+        uuid=uuid.UUID(row["uuid"]),
+        seq=row.get("seq"),
+        sender_id=uuid.UUID(row["sender"]),
+        content=row["content"],
+        created_at=datetime.fromisoformat(row["created_at"]),
+        chat_id=chat_id,
+        chat_kind=row["chat_kind"],
+        **{chat_field: chat_id},
+    )
+
+
+message_buffer = MessageWriteBuffer(
+    batch_size=settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL,
+    dead_letter_path=settings.CHAT_WRITE_BEHIND_DEAD_LETTER_PATH,
+)
@@ -0,0 +1,112 @@
+# backend\chat\cache.py:
+
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+
+#
+from utils.cache import LRUCache
+
+# (chat kind, chat uuid, user uuid) -> chat primary key, or False for
+# "not a participant". The cache lives in process memory: other workers only
+# see a membership change once their entry expires.
+membership_cache = LRUCache(
+    maxsize=settings.CHAT_MEMBERSHIP_CACHE_SIZE,
+    ttl=settings.CHAT_MEMBERSHIP_CACHE_TTL,
+)
+
+
+def canonical_uuid(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return str(value)
+
+
+def membership_key(chat_kind, chat_uuid, user_uuid):
+    return (str(chat_kind), canonical_uuid(chat_uuid), canonical_uuid(user_uuid))
+
+
+def get_cached_chat_pk(chat_model, chat_uuid, user_uuid):
+    """
+    Cached membership lookup without touching the database.
+    Returns the chat pk, False for a cached miss, or None if unknown.
+    """
+    return membership_cache.get(membership_key(chat_model.kind, chat_uuid, user_uuid))
+
+
+def get_member_chat_pk(chat_model, chat_uuid, user_uuid):
+    """
+    Primary key of the chat if the user participates in it, otherwise None
+    """
+    key = membership_key(chat_model.kind, chat_uuid, user_uuid)
+    chat_pk = membership_cache.get(key)
+    if chat_pk is None:
+        try:
+            chat_pk = uuid.UUID(str(chat_uuid))
+        except ValueError:
+            return None
+        if not chat_model.objects.filter(pk=chat_pk, participants=user_uuid).exists():
+            chat_pk = False
+        membership_cache.set(key, chat_pk)
+    return chat_pk or None
+
+
+def get_member_chat_pks(chat_model, chat_uuids, user_uuid):
+    """
+    Batch variant of get_member_chat_pk: {requested uuid: chat pk} for the
+    chats the user participates in. Cache misses cost a single query.
+    """
+    result = {}
+    missing = {}
+    for chat_uuid in chat_uuids:
+        chat_pk = get_cached_chat_pk(chat_model, chat_uuid, user_uuid)
+        if chat_pk is None:
+            try:
+                missing[uuid.UUID(str(chat_uuid))] = chat_uuid
+            except ValueError:
+                continue
+        elif chat_pk:
+            result[chat_uuid] = chat_pk
+
+    if missing:
+        found = set(
+            chat_model.objects.filter(
+                pk__in=missing, participants=user_uuid
+            ).values_list("pk", flat=True)
+        )
+        for chat_pk, chat_uuid in missing.items():
+            key = membership_key(chat_model.kind, chat_uuid, user_uuid)
+            if chat_pk in found:
+                membership_cache.set(key, chat_pk)
+                result[chat_uuid] = chat_pk
+            else:
+                membership_cache.set(key, False)
+    return result
+
+
+def invalidate_membership(chat_kind, chat_uuid=None, user_uuid=None):
+    """
+    Forget cached memberships of a chat, of a user, or of one pair once the
+    current transaction commits. Forgetting them earlier would let a
+    concurrent reader cache the pre-commit answer for the whole TTL.
+    """
+    transaction.on_commit(
+        lambda: forget_membership(chat_kind, chat_uuid, user_uuid), robust=True
+    )
+
+
+def forget_membership(chat_kind, chat_uuid=None, user_uuid=None):
+    if chat_uuid is not None and user_uuid is not None:
+        membership_cache.delete(membership_key(chat_kind, chat_uuid, user_uuid))
+        return
+
+    chat_kind = str(chat_kind)
+    chat_uuid = canonical_uuid(chat_uuid) if chat_uuid is not None else None
+    user_uuid = canonical_uuid(user_uuid) if user_uuid is not None else None
+    membership_cache.delete_where(
+        lambda key: key[0] == chat_kind
+        and (chat_uuid is None or key[1] == chat_uuid)
+        and (user_uuid is None or key[2] == user_uuid)
+    )
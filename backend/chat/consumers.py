@@ -1,236 +1,726 @@
 # backend\chat\consumers.py:
 
+import asyncio
 import json
+import time
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import PersonalChat, GroupChat, Message
-from user.models import User
-
+from django.conf import settings
+from .models import PersonalChat, GroupChat
+from .services import (
+    create_message,
+    build_message,
+    chat_group_name,
+    message_event,
+    mark_read,
+    read_event,
+    reserve_seq,
+    get_messages_since,
+)
+from .buffer import message_buffer
+from .lifecycle import DRAIN_CLOSE_CODE, connection_tracker
+from .presence import ONLINE, AWAY, presence_registry, typing_events
+from .cache import (
+    canonical_uuid,
+    get_cached_chat_pk,
+    get_member_chat_pk,
+    get_member_chat_pks,
+)
+from utils.cache import LRUCache
+from utils.metrics import counters
+from utils.ratelimit import TokenBucket, consume_all
+
+CHAT_MODELS = {model.kind: model for model in (PersonalChat, GroupChat)}
+
+# user uuid -> TokenBucket shared by all of the user's sockets in this process
+user_buckets = LRUCache(maxsize=settings.WS_USER_CACHE_SIZE, ttl=3600)
+
+
+def get_user_bucket(user_uuid):
+    bucket = user_buckets.get(user_uuid)
+    if bucket is None:
+        bucket = TokenBucket(settings.CHAT_WS_USER_RATE, settings.CHAT_WS_USER_BURST)
+        user_buckets.set(user_uuid, bucket)
+    return bucket
+
+
+class ChatConsumerMixin:
+    """
+    Membership checks, message publishing and flow control shared by the
+    chat consumers. scope["user"] is set by utils.jwt_middleware.JWTAuthMiddleware
+    """
+
+    # ~~~~~ Flow control ~~~~~
+
+    def start_flow_control(self):
+        """
+        Call after accept(): frames to the client go through a bounded queue
+        drained by a writer task, so a slow client cannot stall the consumer
+        """
+        self.bucket = TokenBucket(
+            settings.CHAT_WS_CONNECTION_RATE, settings.CHAT_WS_CONNECTION_BURST
+        )
+        self.closing = False
+        self.last_seen = time.monotonic()
+        self.outbound = asyncio.Queue(maxsize=settings.CHAT_WS_OUTBOUND_QUEUE_SIZE)
+        self.outbound_task = asyncio.create_task(self.write_outbound())
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
+        counters.increment("ws.connections_opened")
+        connection_tracker.register(self)
+
+    def stop_flow_control(self):
+        if getattr(self, "outbound_task", None) is not None:
+            # The heartbeat task may be the one shutting the socket down
+            for task in (self.outbound_task, self.heartbeat_task):
+                if task is not asyncio.current_task():
+                    task.cancel()
+            self.outbound_task = self.heartbeat_task = None
+            connection_tracker.unregister(self)
+            counters.increment("ws.connections_closed")
+
+    async def write_outbound(self):
+        while True:
+            text_data = await self.outbound.get()
+            await self.send(text_data=text_data)
+
+    async def heartbeat(self):
+        """
+        Ping the client every CHAT_WS_HEARTBEAT_INTERVAL seconds and reap the
+        socket once it has been silent for CHAT_WS_IDLE_TIMEOUT seconds. Any
+        client frame counts, {"type": "heartbeat"} is the usual answer.
+        """
+        while True:
+            await asyncio.sleep(settings.CHAT_WS_HEARTBEAT_INTERVAL)
+            if time.monotonic() - self.last_seen > settings.CHAT_WS_IDLE_TIMEOUT:
+                counters.increment("ws.idle_reaped")
+                await self.shut_down(4009)
+                return
+            await self.send_frame({"type": "ping"}, live=True)
+
+    async def shut_down(self, code):
+        """
+        Leave the groups and presence right away, then close. A half-open
+        socket may never deliver the disconnect that would clean up.
+        """
+        if self.closing:
+            return
+        self.closing = True
+        await self.disconnect(code)
+        await self.close(code=code)
+
+    async def drain_close(self, retry_after):
+        """
+        Close for a deploy (see chat/lifecycle.py), telling the client when
+        to reconnect
+        """
+        # Straight to the socket, the outbound queue stops with the consumer
+        await self.send(
+            text_data=json.dumps({"type": "reconnect", "retry_after": retry_after})
+        )
+        await self.shut_down(DRAIN_CLOSE_CODE)
+
+    async def allow_frame(self):
+        """
+        Charge an incoming frame to the connection and user rate limits
+        """
+        self.last_seen = time.monotonic()
+        counters.increment("ws.frames_received")
+        if consume_all([self.bucket, get_user_bucket(self.user.uuid)]):
+            return True
+        counters.increment("ws.frames_rate_limited")
+        await self.send_error("Rate limit exceeded.")
+        return False
+
+    async def send_frame(self, frame, live=False):
+        """
+        Queue a frame for the client. Replies and replayed history wait for
+        room in the queue; live events from other users follow
+        CHAT_WS_SLOW_CONSUMER_POLICY when the queue is full.
+        """
+        text_data = json.dumps(frame)
+        if getattr(self, "outbound", None) is None:
+            await self.send(text_data=text_data)
+            return
+        if not live:
+            await self.outbound.put(text_data)
+            return
 
-class BaseChatConsumer(AsyncWebsocketConsumer):
-    async def connect(self):
-        self.user = self.scope["user"]
-        if self.user.is_anonymous:
-            await self.close()
+        try:
+            self.outbound.put_nowait(text_data)
+        except asyncio.QueueFull:
+            if settings.CHAT_WS_SLOW_CONSUMER_POLICY == "close":
+                if not self.closing:
+                    self.closing = True
+                    counters.increment("ws.slow_consumers_closed")
+                    await self.close(code=4008)
+            else:
+                counters.increment("ws.outbound_dropped")
+
+    async def send_error(self, detail):
+        await self.send_frame({"type": "error", "detail": detail})
+
+    async def parse_frame(self, text_data):
+        """
+        Decoded client frame, or None (after an error frame) if it is not a
+        JSON object
+        """
+        try:
+            frame = json.loads(text_data or "")
+        except ValueError:
+            await self.send_error("Invalid JSON.")
+            return None
+        if not isinstance(frame, dict):
+            await self.send_error("Frame must be a JSON object.")
+            return None
+        return frame
+
+    # ~~~~~ Presence and typing ~~~~~
+
+    def presence_groups(self):
+        """
+        Channel layer groups that hear about this user's presence changes
+        """
+        return []
+
+    async def update_presence(self, status=None):
+        """
+        Refresh this socket in the presence registry (every incoming frame
+        is a heartbeat) and broadcast the user's status if it changed
+        """
+        changed = presence_registry.update(self.user.uuid, self.channel_name, status)
+        if changed:
+            await self.broadcast_presence(changed)
+
+    async def leave_presence(self):
+        changed = presence_registry.remove(self.user.uuid, self.channel_name)
+        if changed:
+            await self.broadcast_presence(changed)
+
+    async def broadcast_presence(self, status, group_names=None):
+        event = {"type": "chat_presence", "user": str(self.user.uuid), "status": status}
+        if group_names is None:
+            group_names = self.presence_groups()
+        for group_name in group_names:
+            await self.channel_layer.group_send(group_name, event)
+
+    async def chat_presence(self, event):
+        # A user sharing several chats with us is announced once per change
+        if event["user"] == str(self.user.uuid):
+            return
+        if self.presence_seen.get(event["user"]) == event["status"]:
             return
+        self.presence_seen[event["user"]] = event["status"]
+        await self.send_frame(
+            {"type": "presence", "user": event["user"], "status": event["status"]},
+            live=True,
+        )
 
-        await self.accept()
+    def report_typing(self, chat_model, chat_pk):
+        typing_events.add(
+            chat_group_name(chat_model.kind, chat_pk),
+            chat_model.kind,
+            chat_pk,
+            self.user.uuid,
+            self.user.username,
+        )
 
-    async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+    async def chat_typing(self, event):
+        users = [
+            {"uuid": user_uuid, "username": username}
+            for user_uuid, username in event["users"].items()
+            if user_uuid != str(self.user.uuid)
+        ]
+        if users:
+            await self.send_frame(
+                {
+                    "type": "typing",
+                    "kind": event["kind"],
+                    "chat": event["chat"],
+                    "users": users,
+                },
+                live=True,
+            )
 
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json["message"]
+    # ~~~~~ Chats ~~~~~
 
-        await self.save_message(message)
+    async def get_chat_pk(self, chat_model, chat_uuid):
+        """
+        Chat primary key if self.user participates in the chat, else None
+        """
+        chat_pk = get_cached_chat_pk(chat_model, chat_uuid, self.user.uuid)
+        if chat_pk is None:
+            chat_pk = await database_sync_to_async(get_member_chat_pk)(
+                chat_model, chat_uuid, self.user.uuid
+            )
+        return chat_pk or None
+
+    @database_sync_to_async
+    def save_message(self, chat, content):
+        return create_message(chat, self.user, content)
+
+    async def publish_message(self, chat_model, chat_pk, content):
+        chat = chat_model(pk=chat_pk)
+        if settings.CHAT_WRITE_BEHIND:
+            # Broadcast first, the buffer persists the row in the background.
+            # The sequence number is reserved up front, so the frame can be
+            # deduplicated against a since_seq replay like any other.
+            saved = build_message(chat, self.user, content)
+            saved.seq = await database_sync_to_async(reserve_seq)(chat)
+            message_buffer.add(saved)
+        else:
+            saved = await self.save_message(chat, content)
 
         await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "chat_message",
-                "message": message,
-                "sender": str(self.user.uuid),
-                "sender_username": self.user.username,
-            },
+            chat_group_name(chat_model.kind, chat_pk),
+            message_event(
+                chat_model.kind,
+                chat_pk,
+                {
+                    "uuid": saved.uuid,
+                    "seq": saved.seq,
+                    "content": content,
+                    "created_at": saved.created_at,
+                },
+                self.user.uuid,
+                self.user.username,
+            ),
         )
 
-    async def chat_message(self, event):
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "message": event["message"],
-                    "sender": event["sender"],
-                    "sender_username": event["sender_username"],
-                }
+    async def publish_read(self, chat_model, chat_pk, seq):
+        """
+        Advance self.user's read watermark and tell the chat (including the
+        user's other devices) about it. False if the user left the chat or
+        the chat was deleted since it was joined.
+        """
+        result = await database_sync_to_async(mark_read)(
+            chat_model(pk=chat_pk), self.user, seq
+        )
+        if result is None:
+            return False
+        await self.channel_layer.group_send(
+            chat_group_name(chat_model.kind, chat_pk),
+            read_event(
+                chat_model.kind, chat_pk, self.user.uuid, result["last_read_seq"]
+            ),
+        )
+        return True
+
+    async def replay_since(self, chat_model, chat_pk, since_seq):
+        """
+        Send messages with seq > since_seq from the database in batches, then
+        a "replay_done" frame. Returns the last replayed seq so duplicated
+        live events can be skipped.
+        """
+        batch_size = settings.CHAT_REPLAY_BATCH_SIZE
+        sent = 0
+        truncated = False
+        while True:
+            events = await database_sync_to_async(get_messages_since)(
+                chat_model, chat_pk, since_seq, batch_size
             )
+            for event in events:
+                await self.send_message_event(event)
+            sent += len(events)
+            if events:
+                since_seq = events[-1]["seq"]
+            if len(events) < batch_size:
+                break
+            if sent >= settings.CHAT_REPLAY_MAX_MESSAGES:
+                truncated = True
+                break
+
+        await self.send_frame(
+            {
+                "type": "replay_done",
+                "kind": str(chat_model.kind),
+                "chat": str(chat_pk),
+                "seq": since_seq,
+                "truncated": truncated,
+            }
         )
+        return since_seq
 
 
-class PersonalChatConsumer(BaseChatConsumer):
+def parse_seq(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class BaseChatConsumer(ChatConsumerMixin, AsyncWebsocketConsumer):
+    """
+    One socket per chat: ws/chat/<kind>/<chat_uuid>/
+
+    Client frames:
+        {"message": "..."}
+        {"type": "read", "seq": 42}
+        {"type": "typing"}
+        {"type": "presence", "status": "online" | "away"}
+        {"type": "heartbeat"}
+
+    The server pings with {"type": "ping"} and closes silent sockets (4009).
+    A read from a user who has left the chat closes the socket (4403).
+    """
+
+    chat_model = None
+
     async def connect(self):
         self.user = self.scope["user"]
         if self.user.is_anonymous:
-            await self.close()
+            await self.close(code=4003)
+            return
+        if connection_tracker.draining:
+            await self.close(code=DRAIN_CLOSE_CODE)
             return
 
         self.chat_uuid = self.scope["url_route"]["kwargs"]["chat_uuid"]
-        self.room_group_name = f"personal_chat_{self.chat_uuid}"
 
         # Проверка, есть ли пользователь в участниках чата
         if not await self.is_chat_participant():
-            await self.close()
+            await self.close(code=4004)
             return
 
+        self.room_group_name = chat_group_name(self.chat_model.kind, self.chat_pk)
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
         await self.accept()
+        self.start_flow_control()
+        self.presence_seen = {}
+        await self.update_presence(ONLINE)
+
+        # Live events queue up in the channel while the gap is replayed
+        self.replayed_seq = 0
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        since_seq = parse_seq(query.get("since_seq", [None])[0])
+        if since_seq is not None:
+            self.replayed_seq = await self.replay_since(
+                self.chat_model, self.chat_pk, since_seq
+            )
 
-    @database_sync_to_async
-    def is_chat_participant(self):
-        try:
-            chat = PersonalChat.objects.get(uuid=self.chat_uuid)
-            return chat.participants.filter(uuid=self.user.uuid).exists()
-        except PersonalChat.DoesNotExist:
-            return False
+    async def disconnect(self, close_code):
+        self.stop_flow_control()
+        if hasattr(self, "room_group_name"):
+            await self.leave_presence()
+            await self.channel_layer.group_discard(
+                self.room_group_name, self.channel_name
+            )
+            del self.room_group_name
 
-    @database_sync_to_async
-    def save_message(self, content):
-        chat = PersonalChat.objects.get(uuid=self.chat_uuid)
-        return Message.objects.create(
-            sender=self.user, content=content, personal_chat=chat
+    async def receive(self, text_data):
+        if not await self.allow_frame():
+            return
+
+        text_data_json = await self.parse_frame(text_data)
+        if text_data_json is None:
+            return
+        frame_type = text_data_json.get("type")
+        if frame_type == "presence":
+            status = text_data_json.get("status")
+            await self.update_presence(status if status in (ONLINE, AWAY) else None)
+            return
+        await self.update_presence()
+
+        if frame_type == "heartbeat":
+            return
+        if frame_type == "typing":
+            self.report_typing(self.chat_model, self.chat_pk)
+            return
+        if frame_type == "read":
+            if not await self.publish_read(
+                self.chat_model, self.chat_pk, parse_seq(text_data_json.get("seq"))
+            ):
+                await self.shut_down(4403)
+            return
+
+        if frame_type not in (None, "message"):
+            await self.send_error("Unknown frame type.")
+            return
+        message = text_data_json.get("message")
+        if not isinstance(message, str) or not message:
+            await self.send_error("Message must be a non-empty string.")
+            return
+
+        await self.publish_message(self.chat_model, self.chat_pk, message)
+
+    async def chat_message(self, event):
+        if event["seq"] is not None and event["seq"] <= self.replayed_seq:
+            return
+        await self.send_message_event(event, live=True)
+
+    async def send_message_event(self, event, live=False):
+        await self.send_frame(
+            {
+                "uuid": event["uuid"],
+                "seq": event["seq"],
+                "message": event["message"],
+                "sender": event["sender"],
+                "sender_username": event["sender_username"],
+                "created_at": event["created_at"],
+            },
+            live=live,
         )
 
+    async def chat_read(self, event):
+        await self.send_frame(
+            {"type": "read", "user": event["user"], "seq": event["seq"]}, live=True
+        )
 
-from django.contrib.auth import get_user_model
-from django.conf import settings
-from channels.db import database_sync_to_async
-from django.contrib.auth.models import AnonymousUser
+    def presence_groups(self):
+        return [self.room_group_name]
+
+    async def is_chat_participant(self):
+        """
+        Resolve the chat primary key through the membership cache and keep it
+        for the lifetime of the connection
+        """
+        self.chat_pk = await self.get_chat_pk(self.chat_model, self.chat_uuid)
+        return self.chat_pk is not None
 
-User = get_user_model()
+
+class PersonalChatConsumer(BaseChatConsumer):
+    chat_model = PersonalChat
 
 
 class GroupChatConsumer(BaseChatConsumer):
-    async def connect(self):
-        print("WebSocket connect handler called")
-
-        # Extract token from headers and authenticate directly
-        headers = dict(self.scope["headers"])
-        authenticated = False
-
-        if b"authorization" in headers:
-            print("Found Authorization header")
-            try:
-                auth_header = headers[b"authorization"].decode()
-                print(f"Auth header: {auth_header[:20]}...")
-
-                if auth_header.startswith("Bearer "):
-                    token = auth_header.split(" ")[1]
-                    print(f"Extracted token: {token[:20]}...")
-
-                    try:
-                        # Decode token without verification first to see content
-                        import base64
-                        import json
-
-                        token_parts = token.split(".")
-                        if len(token_parts) == 3:
-                            payload_part = token_parts[1]
-                            # Add padding
-                            payload_part += "=" * ((4 - len(payload_part) % 4) % 4)
-                            payload_bytes = base64.urlsafe_b64decode(payload_part)
-                            payload = json.loads(payload_bytes)
-                            print(f"Raw token payload: {payload}")
-
-                            # Get user_id from payload
-                            user_id = payload.get("user_id")
-                            print(f"User ID from payload: {user_id}")
-
-                            # Try to get user
-                            if user_id:
-                                self.user = await self.get_user_by_uuid(user_id)
-                                print(
-                                    f"Got user: {self.user}, Anonymous: {self.user.is_anonymous}"
-                                )
-                                authenticated = not self.user.is_anonymous
-                            else:
-                                print("No user_id in token payload")
-                                self.user = AnonymousUser()
-                        else:
-                            print(f"Invalid token format")
-                            self.user = AnonymousUser()
-                    except Exception as e:
-                        print(f"Error inspecting token payload: {str(e)}")
-                        self.user = AnonymousUser()
-                else:
-                    print(f"Auth header doesn't start with 'Bearer '")
-                    self.user = AnonymousUser()
-            except Exception as e:
-                print(f"Error processing auth header: {str(e)}")
-                self.user = AnonymousUser()
-        else:
-            print("No Authorization header found")
-            self.user = AnonymousUser()
+    chat_model = GroupChat
+
+
+class MultiplexChatConsumer(ChatConsumerMixin, AsyncWebsocketConsumer):
+    """
+    One socket for all of a user's chats: ws/chat/
+
+    Client frames:
+        {"type": "subscribe", "kind": "group", "chats": ["<uuid>", ...],
+         "since_seq": {"<uuid>": 42}}
+        {"type": "unsubscribe", "kind": "group", "chats": ["<uuid>", ...]}
+        {"type": "message", "kind": "group", "chat": "<uuid>", "message": "..."}
+        {"type": "read", "kind": "group", "chat": "<uuid>", "seq": 42}
+        {"type": "typing", "kind": "group", "chat": "<uuid>"}
+        {"type": "presence", "status": "online" | "away"}
+        {"type": "heartbeat"}
+
+    The user's presence is announced to every chat as it gets subscribed.
+    The server pings with {"type": "ping"} and closes silent sockets (4009).
+
+    Every server frame carries "type", and chat events carry "kind" and "chat".
+    """
 
-        # Check authentication result
-        if not authenticated:
-            print("Authentication failed, closing connection")
+    async def connect(self):
+        self.user = self.scope["user"]
+        if self.user.is_anonymous:
             await self.close(code=4003)
             return
+        if connection_tracker.draining:
+            await self.close(code=DRAIN_CLOSE_CODE)
+            return
 
-        # Extract chat UUID from URL
-        self.chat_uuid = self.scope["url_route"]["kwargs"]["chat_uuid"]
-        print(f"Connecting to chat with UUID: {self.chat_uuid}")
+        # channel layer group name -> (chat model, chat pk)
+        self.subscriptions = {}
+        # channel layer group name -> last seq sent by a replay
+        self.replayed_seq = {}
+        # user uuid -> last presence status sent to this socket
+        self.presence_seen = {}
+        await self.accept()
+        self.start_flow_control()
 
-        self.room_group_name = f"group_chat_{self.chat_uuid}"
+    async def disconnect(self, close_code):
+        self.stop_flow_control()
+        if hasattr(self, "subscriptions"):
+            await self.leave_presence()
+        for group_name in getattr(self, "subscriptions", {}):
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+        self.subscriptions = {}
 
-        # Check if user is participant
-        print("Checking if user is a chat participant")
-        is_participant = await self.is_chat_participant()
-        print(f"Is participant check result: {is_participant}")
+    async def receive(self, text_data):
+        if not await self.allow_frame():
+            return
 
-        if not is_participant:
-            print(f"User {self.user} is not a participant in chat {self.chat_uuid}")
-            await self.close(code=4004)
+        frame = await self.parse_frame(text_data)
+        if frame is None:
             return
 
-        # Add to channel group
-        print(f"Adding channel to group: {self.room_group_name}")
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        if frame.get("type") == "presence":
+            status = frame.get("status")
+            await self.update_presence(status if status in (ONLINE, AWAY) else None)
+            return
+        await self.update_presence()
+        if frame.get("type") == "heartbeat":
+            return
 
-        # Accept the connection
-        print("Accepting WebSocket connection")
-        await self.accept()
-        print(
-            f"WebSocket connected successfully for user {self.user} in chat {self.chat_uuid}"
-        )
+        handlers = {
+            "subscribe": self.handle_subscribe,
+            "unsubscribe": self.handle_unsubscribe,
+            "message": self.handle_message,
+            "read": self.handle_read,
+            "typing": self.handle_typing,
+        }
+        handler = handlers.get(frame.get("type"))
+        chat_model = CHAT_MODELS.get(frame.get("kind"))
+        if handler is None or chat_model is None:
+            await self.send_error("Unknown frame type or chat kind.")
+            return
 
-    async def disconnect(self, close_code):
-        print(f"WebSocket disconnect with code: {close_code}")
+        await handler(chat_model, frame)
 
-        if hasattr(self, "room_group_name"):
-            print(f"Removing from group: {self.room_group_name}")
-            await self.channel_layer.group_discard(
-                self.room_group_name, self.channel_name
+    async def handle_subscribe(self, chat_model, frame):
+        chat_uuids = self.get_frame_chats(frame)
+        if chat_uuids is None:
+            await self.send_error("chats must be a list of chat uuids.")
+            return
+        free = settings.CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS - len(self.subscriptions)
+        if len(chat_uuids) > free:
+            await self.send_error(
+                f"Subscription limit reached ({settings.CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS} maximum)."
             )
+            return
 
-    @database_sync_to_async
-    def get_user_by_uuid(self, user_uuid):
-        try:
-            print(f"Looking up user with UUID: {user_uuid}")
-            return User.objects.get(uuid=user_uuid)
-        except User.DoesNotExist:
-            print(f"User with UUID {user_uuid} not found in database")
-            return AnonymousUser()
-        except Exception as e:
-            print(f"Error looking up user: {str(e)}")
-            return AnonymousUser()
+        chat_pks = await database_sync_to_async(get_member_chat_pks)(
+            chat_model, chat_uuids, self.user.uuid
+        )
+        subscribed = []
+        added = []
+        for chat_pk in chat_pks.values():
+            group_name = chat_group_name(chat_model.kind, chat_pk)
+            if group_name not in self.subscriptions:
+                await self.channel_layer.group_add(group_name, self.channel_name)
+                self.subscriptions[group_name] = (chat_model, chat_pk)
+                added.append(group_name)
+            subscribed.append(str(chat_pk))
+        if added:
+            await self.broadcast_presence(
+                presence_registry.status(self.user.uuid), added
+            )
 
-    @database_sync_to_async
-    def is_chat_participant(self):
-        from chat.models import GroupChat  # Import here to avoid circular imports
+        await self.send_frame(
+            {
+                "type": "subscribed",
+                "kind": chat_model.kind,
+                "chats": subscribed,
+                "rejected": [
+                    str(chat_uuid)
+                    for chat_uuid in chat_uuids
+                    if chat_uuid not in chat_pks
+                ],
+            }
+        )
 
-        try:
-            print(f"Looking up chat with UUID: {self.chat_uuid}")
-            chat = GroupChat.objects.get(uuid=self.chat_uuid)
+        since = frame.get("since_seq")
+        if not isinstance(since, dict):
+            since = {chat_uuid: since for chat_uuid in chat_uuids}
+        for chat_uuid, chat_pk in chat_pks.items():
+            since_seq = parse_seq(since.get(chat_uuid))
+            if since_seq is not None:
+                group_name = chat_group_name(chat_model.kind, chat_pk)
+                self.replayed_seq[group_name] = await self.replay_since(
+                    chat_model, chat_pk, since_seq
+                )
+
+    async def handle_unsubscribe(self, chat_model, frame):
+        chat_uuids = self.get_frame_chats(frame)
+        if chat_uuids is None:
+            await self.send_error("chats must be a list of chat uuids.")
+            return
+        unsubscribed = []
+        for chat_uuid in chat_uuids:
+            group_name = chat_group_name(chat_model.kind, canonical_uuid(chat_uuid))
+            if self.subscriptions.pop(group_name, None) is not None:
+                self.replayed_seq.pop(group_name, None)
+                await self.channel_layer.group_discard(group_name, self.channel_name)
+                unsubscribed.append(canonical_uuid(chat_uuid))
+
+        await self.send_frame(
+            {"type": "unsubscribed", "kind": chat_model.kind, "chats": unsubscribed}
+        )
 
-            print(
-                f"Checking if user {self.user.uuid} is participant in chat {self.chat_uuid}"
-            )
-            result = chat.participants.filter(uuid=self.user.uuid).exists()
+    async def handle_message(self, chat_model, frame):
+        group_name = chat_group_name(chat_model.kind, canonical_uuid(frame.get("chat")))
+        subscription = self.subscriptions.get(group_name)
+        if subscription is None:
+            await self.send_error("Subscribe to the chat before sending messages.")
+            return
+        if not isinstance(frame.get("message"), str) or not frame["message"]:
+            await self.send_error("Message must be a non-empty string.")
+            return
 
-            print(f"Participant check result: {result}")
-            return result
-        except GroupChat.DoesNotExist:
-            print(f"Chat with UUID {self.chat_uuid} does not exist")
-            return False
-        except Exception as e:
-            print(f"Error checking chat participation: {str(e)}")
-            return False
+        await self.publish_message(chat_model, subscription[1], frame["message"])
 
-    @database_sync_to_async
-    def save_message(self, content):
-        chat = GroupChat.objects.get(uuid=self.chat_uuid)
-        return Message.objects.create(
-            sender=self.user, content=content, group_chat=chat
+    async def handle_read(self, chat_model, frame):
+        group_name = chat_group_name(chat_model.kind, canonical_uuid(frame.get("chat")))
+        subscription = self.subscriptions.get(group_name)
+        if subscription is None:
+            await self.send_error("Subscribe to the chat before marking it read.")
+            return
+
+        if not await self.publish_read(
+            chat_model, subscription[1], parse_seq(frame.get("seq"))
+        ):
+            # Stop relaying a chat the user can no longer read
+            await self.send_error("You are no longer a participant of this chat.")
+            del self.subscriptions[group_name]
+            self.replayed_seq.pop(group_name, None)
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+
+    async def handle_typing(self, chat_model, frame):
+        group_name = chat_group_name(chat_model.kind, canonical_uuid(frame.get("chat")))
+        subscription = self.subscriptions.get(group_name)
+        if subscription is None:
+            await self.send_error("Subscribe to the chat before typing in it.")
+            return
+
+        self.report_typing(chat_model, subscription[1])
+
+    def presence_groups(self):
+        return list(self.subscriptions)
+
+    def get_frame_chats(self, frame):
+        """
+        Chat uuids of a (un)subscribe frame, None if "chats" is not a list of
+        strings
+        """
+        chats = frame.get("chats")
+        if chats is None and frame.get("chat"):
+            chats = [frame["chat"]]
+        if chats is None:
+            return []
+        if not isinstance(chats, list) or not all(
+            isinstance(chat, str) for chat in chats
+        ):
+            return None
+        return chats
+
+    async def chat_message(self, event):
+        group_name = chat_group_name(event["kind"], event["chat"])
+        replayed_seq = self.replayed_seq.get(group_name, 0)
+        if event["seq"] is not None and event["seq"] <= replayed_seq:
+            return
+        await self.send_message_event(event, live=True)
+
+    async def chat_read(self, event):
+        await self.send_frame(
+            {
+                "type": "read",
+                "kind": event["kind"],
+                "chat": event["chat"],
+                "user": event["user"],
+                "seq": event["seq"],
+            },
+            live=True,
+        )
+
+    async def send_message_event(self, event, live=False):
+        await self.send_frame(
+            {
+                "type": "message",
+                "kind": event["kind"],
+                "chat": event["chat"],
+                "uuid": event["uuid"],
+                "seq": event["seq"],
+                "message": event["message"],
+                "sender": event["sender"],
+                "sender_username": event["sender_username"],
+                "created_at": event["created_at"],
+            },
+            live=live,
         )
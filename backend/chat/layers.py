@@ -0,0 +1,261 @@
+# backend\chat\layers.py:
+
+import asyncio
+import logging
+import random
+import string
+import time
+import zlib
+from copy import deepcopy
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+#
+from .broker import encode_frame, open_connection, read_frame
+
+logger = logging.getLogger(__name__)
+
+
+def shard_index(name, shard_count):
+    """
+    Stable shard for a group or client name (the same in every process)
+    """
+    return zlib.crc32(name.encode()) % shard_count
+
+
+class BrokerClient:
+    """
+    State of the layer inside one event loop: the local channel queues and
+    group members, plus one connection per broker shard. Connections are kept
+    up by a background task that re-announces local groups on reconnect.
+    """
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.client_id = "".join(random.choices(string.ascii_letters, k=12))
+        self.channels = {}
+        self.groups = {}
+        self.writers = [None] * len(layer.hosts)
+        self.connected = [asyncio.Event() for _ in layer.hosts]
+        self.tasks = [
+            asyncio.get_running_loop().create_task(self.maintain(index))
+            for index in range(len(layer.hosts))
+        ]
+
+    async def maintain(self, index):
+        address = self.layer.hosts[index]
+        delay = 0.1
+        while True:
+            try:
+                reader, writer = await open_connection(address)
+            except OSError as e:
+                logger.warning(f"Channel broker {address} unavailable: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+                continue
+
+            delay = 0.1
+            writer.write(encode_frame({"op": "hello", "client": self.client_id}))
+            for group in self.groups:
+                if shard_index(group, len(self.writers)) == index:
+                    writer.write(encode_frame({"op": "group_add", "group": group}))
+            self.writers[index] = writer
+            self.connected[index].set()
+
+            try:
+                while True:
+                    frame = await read_frame(reader)
+                    if frame["op"] == "deliver":
+                        self.deliver(frame["channel"], frame["message"])
+                    elif frame["op"] == "group":
+                        for channel in list(self.groups.get(frame["group"], ())):
+                            self.deliver(channel, frame["message"])
+            except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                logger.warning(f"Lost connection to channel broker {address}")
+            finally:
+                self.connected[index].clear()
+                self.writers[index] = None
+                writer.close()
+
+    async def write(self, index, frame, wait=True):
+        """
+        Send a frame to a broker shard. While the shard is down, wait up to
+        connect_timeout for it (or not at all with wait=False) and then drop.
+        """
+        if not self.connected[index].is_set():
+            if not wait:
+                return
+            try:
+                await asyncio.wait_for(
+                    self.connected[index].wait(), self.layer.connect_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropping {frame['op']}: broker shard {index} is down")
+                return
+        writer = self.writers[index]
+        writer.write(encode_frame(frame))
+        if writer.transport.get_write_buffer_size() > 64 * 1024:
+            await writer.drain()
+
+    def queue(self, channel):
+        queue = self.channels.get(channel)
+        if queue is None:
+            queue = self.channels[channel] = asyncio.Queue(
+                maxsize=self.layer.get_capacity(channel)
+            )
+        return queue
+
+    def deliver(self, channel, message):
+        try:
+            self.queue(channel).put_nowait((time.time() + self.layer.expiry, message))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class BrokerChannelLayer(BaseChannelLayer):
+    """
+    Channel layer that fans out across processes and nodes through one or
+    more ChannelBroker processes (see the run_channel_broker command).
+
+    CONFIG:
+        hosts: ["tcp://127.0.0.1:8765", "unix:///run/chat-broker.sock", ...]
+
+    Groups are sharded over the hosts by name, so every member of a group
+    talks to the same broker and sees that group's messages in order. Local
+    members are served without a network hop. Messages must be
+    JSON-serializable; delivery is at-most-once like the other layers.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(
+        self,
+        hosts=None,
+        expiry=60,
+        capacity=100,
+        channel_capacity=None,
+        connect_timeout=1.0,
+        **kwargs,
+    ):
+        super().__init__(
+            expiry=expiry,
+            capacity=capacity,
+            channel_capacity=channel_capacity,
+            **kwargs,
+        )
+        self.hosts = list(hosts or ["tcp://127.0.0.1:8765"])
+        self.connect_timeout = connect_timeout
+        self.clients = {}
+
+    def get_client(self):
+        """
+        One BrokerClient per event loop (async_to_sync may run a new loop)
+        """
+        loop = asyncio.get_running_loop()
+        for other in [other for other in self.clients if other.is_closed()]:
+            del self.clients[other]
+        client = self.clients.get(loop)
+        if client is None:
+            client = self.clients[loop] = BrokerClient(self)
+        return client
+
+    def client_of(self, channel):
+        # specific.<client id>!<random>
+        return channel.split("!", 1)[0].rsplit(".", 1)[-1]
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        assert "!" in channel, "Only process-specific channels are supported"
+
+        client = self.get_client()
+        target = self.client_of(channel)
+        if target == client.client_id:
+            if not client.deliver(channel, deepcopy(message)):
+                raise ChannelFull(channel)
+            return
+
+        await client.write(
+            shard_index(target, len(self.hosts)),
+            {"op": "send", "client": target, "channel": channel, "message": message},
+        )
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        client = self.get_client()
+        while True:
+            queue = client.queue(channel)
+            try:
+                expires_at, message = await queue.get()
+            finally:
+                if queue.empty() and client.channels.get(channel) is queue:
+                    del client.channels[channel]
+            if expires_at >= time.time():
+                return message
+
+    async def new_channel(self, prefix="specific."):
+        client = self.get_client()
+        suffix = "".join(random.choices(string.ascii_letters, k=12))
+        return f"{prefix}{client.client_id}!{suffix}"
+
+    async def flush(self):
+        for client in self.clients.values():
+            client.channels.clear()
+            client.groups.clear()
+
+    async def close(self):
+        client = self.clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        client = self.get_client()
+        members = client.groups.setdefault(group, set())
+        members.add(channel)
+        if len(members) == 1:
+            await client.write(
+                shard_index(group, len(self.hosts)),
+                {"op": "group_add", "group": group},
+                # Announced again by BrokerClient.maintain on (re)connect
+                wait=False,
+            )
+
+    async def group_discard(self, group, channel):
+        assert self.valid_channel_name(channel), "Invalid channel name"
+        assert self.valid_group_name(group), "Invalid group name"
+        client = self.get_client()
+        members = client.groups.get(group)
+        if not members or channel not in members:
+            return
+        members.discard(channel)
+        if not members:
+            del client.groups[group]
+            await client.write(
+                shard_index(group, len(self.hosts)),
+                {"op": "group_discard", "group": group},
+                wait=False,
+            )
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        assert self.valid_group_name(group), "Invalid group name"
+        client = self.get_client()
+        for channel in list(client.groups.get(group, ())):
+            client.deliver(channel, deepcopy(message))
+        await client.write(
+            shard_index(group, len(self.hosts)),
+            {"op": "group_send", "group": group, "message": message},
+        )
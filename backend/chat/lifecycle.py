@@ -0,0 +1,122 @@
+# backend\chat\lifecycle.py:
+
+import asyncio
+import logging
+import random
+import signal
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+#
+from utils.metrics import counters
+
+logger = logging.getLogger(__name__)
+
+# Channel layer group every process listens on for drain requests
+CONTROL_GROUP = "chat_control"
+# Close code of drained sockets: "Service Restart", the client should reconnect
+DRAIN_CLOSE_CODE = 1012
+
+DRAIN_SIGNAL = getattr(signal, "SIGUSR1", None)
+
+
+class ConnectionTracker:
+    """
+    Chat sockets open in this process, and the drain mode used on deploys.
+
+    While draining, new sockets are refused and the open ones are closed one
+    by one, evenly spread over ``period`` seconds in random order. Each gets a
+    "reconnect" frame with a random ``retry_after`` below ``jitter`` seconds
+    first, so the clients come back to the new workers gradually instead of
+    all at once.
+
+    Drain is triggered by SIGUSR1 or by a "chat.drain" message to the
+    CONTROL_GROUP channel layer group (see the drain_chat_sockets command).
+    """
+
+    def __init__(self, period, jitter):
+        self.period = period
+        self.jitter = jitter
+        self.consumers = set()
+        self.draining = False
+        self._task = None
+        self._drain_task = None
+
+    def ensure_started(self):
+        """
+        Install the signal handler and listen on the control group, once per
+        event loop
+        """
+        if self._task is not None and not self._task.done():
+            return
+        loop = asyncio.get_running_loop()
+        if DRAIN_SIGNAL is not None:
+            try:
+                loop.add_signal_handler(DRAIN_SIGNAL, self.start_drain)
+            except (NotImplementedError, RuntimeError, ValueError) as e:
+                # Not the main thread, or a loop without signal support
+                logger.info(f"Chat drain signal handler not installed: {str(e)}")
+        self._task = loop.create_task(self._listen())
+
+    async def start(self):
+        self.ensure_started()
+
+    async def stop(self):
+        for task in (self._task, self._drain_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = self._drain_task = None
+
+    def register(self, consumer):
+        self.consumers.add(consumer)
+
+    def unregister(self, consumer):
+        self.consumers.discard(consumer)
+
+    def start_drain(self, period=None):
+        if self.draining:
+            return
+        self.draining = True
+        self._drain_task = asyncio.get_running_loop().create_task(
+            self.drain(self.period if period is None else period)
+        )
+
+    async def drain(self, period):
+        consumers = list(self.consumers)
+        random.shuffle(consumers)
+        logger.info(f"Draining {len(consumers)} chat sockets over {period}s")
+        step = period / len(consumers) if consumers else 0
+        for consumer in consumers:
+            if consumer in self.consumers:
+                try:
+                    await consumer.drain_close(round(random.uniform(0, self.jitter), 1))
+                    counters.increment("ws.connections_drained")
+                except Exception as e:
+                    logger.error(f"Error draining chat socket: {str(e)}")
+            await asyncio.sleep(step)
+
+    async def _listen(self):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        channel = await channel_layer.new_channel()
+        while True:
+            # Re-joined periodically, group membership expires in some layers
+            await channel_layer.group_add(CONTROL_GROUP, channel)
+            try:
+                message = await asyncio.wait_for(channel_layer.receive(channel), 3600)
+            except asyncio.TimeoutError:
+                continue
+            except Exception as e:
+                logger.error(f"Chat control channel failed: {str(e)}")
+                return
+            if message.get("type") == "chat.drain":
+                self.start_drain(message.get("period"))
+
+
+connection_tracker = ConnectionTracker(
+    period=settings.CHAT_WS_DRAIN_PERIOD,
+    jitter=settings.CHAT_WS_RECONNECT_JITTER,
+)
@@ -0,0 +1,92 @@
+# backend\chat\management\commands\backfill_inbox.py:
+
+import logging
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from chat.models import PersonalChat, GroupChat, InboxEntry
+
+logger = logging.getLogger(__name__)
+
+# ~~~~~~~~~~~~~~~~~~~~ CHAT ~~~~~~~~~~~~~~~~~~~~
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the missing InboxEntry rows of existing chat memberships. "
+        "Runs in batches, skips entries that already exist, and can be "
+        "interrupted and restarted at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between batches to spare the database",
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        for chat_model in (PersonalChat, GroupChat):
+            processed += self.backfill(chat_model, options)
+
+        logger.info(f"Inbox backfill finished: {processed} memberships")
+        self.stdout.write(
+            self.style.SUCCESS(f"Done, {processed} memberships have an inbox entry")
+        )
+
+    def backfill(self, chat_model, options):
+        membership_model = chat_model.participants.through
+        lazy_chats = set()
+        if chat_model is GroupChat:
+            lazy_chats = set(
+                membership_model.objects.values("chat")
+                .annotate(participants=Count("id"))
+                .filter(participants__gt=settings.CHAT_INBOX_FANOUT_LIMIT)
+                .values_list("chat", flat=True)
+            )
+
+        memberships = membership_model.objects.order_by("id").values(
+            "id",
+            "chat",
+            "user",
+            "last_read_seq",
+            "chat__last_seq",
+            "chat__last_message_preview",
+            "chat__last_message_at",
+            "chat__created_at",
+        )
+        last_id = 0
+        processed = 0
+        while True:
+            rows = list(memberships.filter(id__gt=last_id)[: options["batch_size"]])
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+
+            InboxEntry.objects.bulk_create(
+                [
+                    InboxEntry(
+                        user_id=row["user"],
+                        chat_id=row["chat"],
+                        chat_kind=chat_model.kind,
+                        last_activity_at=row["chat__last_message_at"]
+                        or row["chat__created_at"],
+                        last_seq=row["chat__last_seq"],
+                        last_read_seq=row["last_read_seq"],
+                        preview=row["chat__last_message_preview"],
+                        lazy=row["chat"] in lazy_chats,
+                    )
+                    for row in rows
+                ],
+                ignore_conflicts=True,
+            )
+            processed += len(rows)
+
+            self.stdout.write(f"{processed} {chat_model.kind} memberships processed")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        return processed
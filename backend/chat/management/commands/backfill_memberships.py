@@ -0,0 +1,122 @@
+# backend\chat\management\commands\backfill_memberships.py:
+
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+from chat.models import PersonalChat, GroupChat, Message
+
+logger = logging.getLogger(__name__)
+
+# ~~~~~~~~~~~~~~~~~~~~ CHAT ~~~~~~~~~~~~~~~~~~~~
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies participants from the implicit many-to-many tables used "
+        "before the membership models (chat_personalchat_participants, "
+        "chat_groupchat_participants) into PersonalChatMembership / "
+        "GroupChatMembership. last_read_seq becomes the highest seq the user "
+        "sent or that was marked is_read. Existing memberships are kept, so "
+        "the command can be re-run; run it before backfill_inbox."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between batches to spare the database",
+        )
+
+    def handle(self, *args, **options):
+        tables = connection.introspection.table_names()
+        processed = 0
+        for chat_model in (PersonalChat, GroupChat):
+            legacy_table = f"{chat_model._meta.db_table}_participants"
+            if legacy_table not in tables:
+                self.stdout.write(f"{legacy_table} does not exist, skipped")
+                continue
+            processed += self.backfill(chat_model, legacy_table, options)
+
+        logger.info(f"Membership backfill finished: {processed} participants")
+        self.stdout.write(
+            self.style.SUCCESS(f"Done, {processed} participants copied or kept")
+        )
+
+    def backfill(self, chat_model, legacy_table, options):
+        membership_model = chat_model.participants.through
+        quote = connection.ops.quote_name
+        chat_column = f"{chat_model._meta.model_name}_id"
+        query = (
+            f"SELECT {quote('id')}, {quote(chat_column)}, {quote('user_id')} "
+            f"FROM {quote(legacy_table)} WHERE {quote('id')} > %s "
+            f"ORDER BY {quote('id')} LIMIT %s"
+        )
+        last_id = 0
+        processed = 0
+
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(query, [last_id, options["batch_size"]])
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            # Values come back as the database stores them (uuid strings on
+            # SQLite); normalize through the fields
+            pairs = [
+                (
+                    chat_model._meta.pk.to_python(chat_pk),
+                    membership_model._meta.get_field("user").target_field.to_python(
+                        user_pk
+                    ),
+                )
+                for _, chat_pk, user_pk in rows
+            ]
+            read_seqs = self.read_seqs(pairs)
+            membership_model.objects.bulk_create(
+                [
+                    membership_model(
+                        chat_id=chat_pk,
+                        user_id=user_pk,
+                        last_read_seq=read_seqs.get((chat_pk, user_pk), 0),
+                    )
+                    for chat_pk, user_pk in pairs
+                ],
+                ignore_conflicts=True,
+            )
+            processed += len(rows)
+
+            self.stdout.write(f"{processed} {chat_model.kind} participants processed")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        return processed
+
+    def read_seqs(self, pairs):
+        """
+        {(chat, user): highest seq the user sent or that is marked read}
+        """
+        chat_pks = {chat_pk for chat_pk, _ in pairs}
+        messages = Message.objects.filter(chat_id__in=chat_pks, seq__isnull=False)
+        read = dict(
+            messages.filter(is_read=True)
+            .values("chat_id")
+            .annotate(seq=Max("seq"))
+            .values_list("chat_id", "seq")
+        )
+        sent = {
+            (chat_pk, sender_pk): seq
+            for chat_pk, sender_pk, seq in messages.values("chat_id", "sender")
+            .annotate(seq=Max("seq"))
+            .values_list("chat_id", "sender", "seq")
+        }
+        return {
+            (chat_pk, user_pk): max(
+                read.get(chat_pk, 0), sent.get((chat_pk, user_pk), 0)
+            )
+            for chat_pk, user_pk in pairs
+        }
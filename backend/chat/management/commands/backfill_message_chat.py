@@ -0,0 +1,57 @@
+# backend\chat\management\commands\backfill_message_chat.py:
+
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from chat.models import Message
+from utils.enamurations import ChatKind
+
+logger = logging.getLogger(__name__)
+
+# ~~~~~~~~~~~~~~~~~~~~ CHAT ~~~~~~~~~~~~~~~~~~~~
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills Message.chat_id and chat_kind for rows created before they "
+        "existed. Runs in small batches, each committed on its own, and can "
+        "be interrupted and restarted at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between batches to spare the database",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        pending = Message.objects.filter(chat_id__isnull=True).order_by("uuid")
+        last_uuid = None
+        updated = 0
+
+        while True:
+            batch = pending if last_uuid is None else pending.filter(uuid__gt=last_uuid)
+            uuids = list(batch.values_list("uuid", flat=True)[:batch_size])
+            if not uuids:
+                break
+            last_uuid = uuids[-1]
+
+            # One short UPDATE per kind, keyed by primary key
+            updated += Message.objects.filter(
+                uuid__in=uuids, personal_chat__isnull=False
+            ).update(chat_id=F("personal_chat"), chat_kind=ChatKind.PERSONAL)
+            updated += Message.objects.filter(
+                uuid__in=uuids, group_chat__isnull=False
+            ).update(chat_id=F("group_chat"), chat_kind=ChatKind.GROUP)
+
+            self.stdout.write(f"{updated} messages backfilled")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        logger.info(f"Message chat_id backfill finished: {updated} rows")
+        self.stdout.write(self.style.SUCCESS(f"Done, {updated} messages backfilled"))
@@ -0,0 +1,49 @@
+# backend\chat\management\commands\backfill_personal_pair_key.py:
+
+import logging
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from chat.models import PersonalChat
+from chat.services import pair_key
+
+logger = logging.getLogger(__name__)
+
+# ~~~~~~~~~~~~~~~~~~~~ CHAT ~~~~~~~~~~~~~~~~~~~~
+
+
+class Command(BaseCommand):
+    help = (
+        "Sets PersonalChat.pair_key on existing two-person chats. When a pair "
+        "has several chats, the oldest one gets the key. Safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        pending = (
+            PersonalChat.objects.filter(pair_key__isnull=True)
+            .annotate(participant_count=Count("participants"))
+            .filter(participant_count=2)
+            .order_by("created_at", "uuid")
+            .prefetch_related("participants")
+        )
+        updated = skipped = 0
+
+        for chat in pending.iterator(chunk_size=options["batch_size"]):
+            first, second = [user.pk for user in chat.participants.all()]
+            key = pair_key(first, second)
+            if PersonalChat.objects.filter(pair_key=key).exists():
+                skipped += 1
+                continue
+            PersonalChat.objects.filter(pk=chat.pk).update(pair_key=key)
+            updated += 1
+
+        logger.info(
+            f"Personal chat pair_key backfill: {updated} set, {skipped} duplicates"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done, {updated} chats keyed, {skipped} duplicate chats left unkeyed"
+            )
+        )
@@ -0,0 +1,163 @@
+# backend\chat\management\commands\bench_channel_layer.py:
+
+import asyncio
+import json
+import multiprocessing
+import queue
+import socket
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chat.broker import ChannelBroker
+from chat.layers import BrokerChannelLayer
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def wait_connected(layer):
+    client = layer.get_client()
+    for event in client.connected:
+        await asyncio.wait_for(event.wait(), 10)
+
+
+def run_broker(address):
+    asyncio.run(ChannelBroker().serve(address))
+
+
+def run_worker(hosts, group, count, timeout, ready, results):
+    asyncio.run(receive_messages(hosts, group, count, timeout, ready, results))
+
+
+async def receive_messages(hosts, group, count, timeout, ready, results):
+    layer = BrokerChannelLayer(hosts=hosts)
+    await wait_connected(layer)
+    channel = await layer.new_channel()
+    await layer.group_add(group, channel)
+    ready.put(True)
+
+    latencies = []
+    try:
+        for _ in range(count):
+            message = await asyncio.wait_for(layer.receive(channel), timeout)
+            latencies.append(time.monotonic() - message["sent_at"])
+    except asyncio.TimeoutError:
+        pass
+    results.put(latencies)
+    await layer.close()
+
+
+async def publish_messages(hosts, group, count, interval):
+    layer = BrokerChannelLayer(hosts=hosts)
+    await wait_connected(layer)
+    for seq in range(count):
+        await layer.group_send(
+            group, {"type": "bench.message", "seq": seq, "sent_at": time.monotonic()}
+        )
+        await asyncio.sleep(interval)
+    await layer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures group_send fan-out latency of BrokerChannelLayer with "
+        "1, 4 and 16 worker processes and saves the results as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+        parser.add_argument("--messages", type=int, default=500)
+        parser.add_argument(
+            "--interval", type=float, default=0.002, help="Seconds between sends"
+        )
+        parser.add_argument("--shards", type=int, default=1)
+        parser.add_argument("--output", default="bench_channel_layer.json")
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context("spawn")
+        hosts = [f"tcp://127.0.0.1:{free_port()}" for _ in range(options["shards"])]
+        brokers = [
+            context.Process(target=run_broker, args=(host,), daemon=True)
+            for host in hosts
+        ]
+        for broker in brokers:
+            broker.start()
+
+        results = []
+        try:
+            for workers in options["workers"]:
+                results.append(self.run(context, hosts, workers, options))
+                row = results[-1]
+                self.stdout.write(
+                    f"workers={workers:<3} received={row['received']}/{row['expected']} "
+                    f"p50={row['p50_ms']}ms p99={row['p99_ms']}ms max={row['max_ms']}ms"
+                )
+        finally:
+            for broker in brokers:
+                broker.terminate()
+
+        report = {
+            "benchmark": "channel_layer_fanout",
+            "created_at": timezone.now().isoformat(),
+            "messages": options["messages"],
+            "interval": options["interval"],
+            "shards": options["shards"],
+            "results": results,
+        }
+        with open(options["output"], "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    def run(self, context, hosts, workers, options):
+        group = f"bench_{workers}_{int(time.time())}"
+        count = options["messages"]
+        ready = context.Queue()
+        received = context.Queue()
+        processes = [
+            context.Process(
+                target=run_worker,
+                args=(hosts, group, count, 10, ready, received),
+                daemon=True,
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.get(timeout=60)
+        time.sleep(0.2)
+
+        asyncio.run(publish_messages(hosts, group, count, options["interval"]))
+
+        latencies = []
+        for _ in processes:
+            try:
+                latencies.extend(received.get(timeout=60))
+            except queue.Empty:
+                break
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        def ms(value):
+            return round(value * 1000, 3) if value is not None else None
+
+        return {
+            "workers": workers,
+            "expected": count * workers,
+            "received": len(latencies),
+            "p50_ms": ms(percentile(latencies, 0.50)),
+            "p99_ms": ms(percentile(latencies, 0.99)),
+            "max_ms": ms(max(latencies) if latencies else None),
+        }
@@ -0,0 +1,149 @@
+# backend\chat\management\commands\bench_message_search.py:
+
+import json
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chat.models import GroupChat, GroupChatMembership, Message
+from chat.search import search_messages
+from user.models import User
+from utils.enamurations import ChatKind
+
+# ~~~~~~~~~~~~~~~~~~~~ CHAT ~~~~~~~~~~~~~~~~~~~~
+
+
+def make_vocabulary(rng, size):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(letters, k=rng.randint(3, 9))))
+    return sorted(words)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds group chats with synthetic messages (10M by default) and "
+        "measures ranked full-text search latency against a LIKE scan"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=10_000_000)
+        parser.add_argument("--chats", type=int, default=1000)
+        parser.add_argument("--batch-size", type=int, default=20_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--like-queries", type=int, default=5)
+        parser.add_argument(
+            "--skip-seed", action="store_true", help="Reuse a seeded database"
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", default="bench_message_search.json")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        vocabulary = make_vocabulary(rng, 5000)
+        # Zipf-like word frequencies, as in natural text
+        weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+
+        user, _ = User.objects.get_or_create(
+            username="search_bench", defaults={"email": "search_bench@example.com"}
+        )
+        report = {
+            "benchmark": "message_search",
+            "created_at": timezone.now().isoformat(),
+        }
+        if not options["skip_seed"]:
+            report["seed"] = self.seed(rng, user, vocabulary, weights, options)
+
+        report["messages"] = Message.objects.count()
+        report["fts"] = self.measure(
+            rng, user, vocabulary, weights, options["queries"], like=False
+        )
+        report["like"] = self.measure(
+            rng, user, vocabulary, weights, options["like_queries"], like=True
+        )
+        for name in ("fts", "like"):
+            row = report[name]
+            self.stdout.write(
+                f"{name:<5} queries={row['queries']} p50={row['p50_ms']}ms "
+                f"p99={row['p99_ms']}ms max={row['max_ms']}ms"
+            )
+
+        with open(options["output"], "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    def seed(self, rng, user, vocabulary, weights, options):
+        chats = GroupChat.objects.bulk_create(
+            [
+                GroupChat(name=f"Search bench {index}", created_by=user)
+                for index in range(options["chats"])
+            ]
+        )
+        GroupChatMembership.objects.bulk_create(
+            [GroupChatMembership(chat=chat, user=user) for chat in chats]
+        )
+
+        started = time.monotonic()
+        created_at = timezone.now() - timedelta(seconds=options["messages"])
+        remaining = options["messages"]
+        while remaining > 0:
+            batch = []
+            for _ in range(min(options["batch_size"], remaining)):
+                chat = rng.choice(chats)
+                created_at += timedelta(seconds=1)
+                batch.append(
+                    Message(
+                        sender=user,
+                        content=" ".join(
+                            rng.choices(vocabulary, weights, k=rng.randint(5, 15))
+                        ),
+                        created_at=created_at,
+                        chat_id=chat.pk,
+                        chat_kind=ChatKind.GROUP,
+                        group_chat=chat,
+                    )
+                )
+            Message.objects.bulk_create(batch)
+            remaining -= len(batch)
+            self.stdout.write(f"{options['messages'] - remaining} messages seeded")
+
+        elapsed = time.monotonic() - started
+        return {
+            "messages": options["messages"],
+            "chats": options["chats"],
+            "seconds": round(elapsed, 1),
+            "rows_per_second": round(options["messages"] / elapsed),
+        }
+
+    def measure(self, rng, user, vocabulary, weights, count, like):
+        latencies = []
+        for _ in range(count):
+            words = rng.choices(vocabulary, weights, k=rng.randint(1, 2))
+            started = time.monotonic()
+            if like:
+                # What the admin search did: a substring scan of every row
+                queryset = Message.objects.filter(
+                    chat_id__in=GroupChatMembership.objects.filter(user=user).values(
+                        "chat"
+                    )
+                )
+                for word in words:
+                    queryset = queryset.filter(content__icontains=word)
+                list(queryset.order_by("-created_at").values("uuid")[:20])
+            else:
+                search_messages(GroupChat, user, " ".join(words), limit=20)
+            latencies.append(time.monotonic() - started)
+
+        return {
+            "queries": count,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+        }
@@ -0,0 +1,363 @@
+# backend\chat\management\commands\bench_websocket.py:
+
+import asyncio
+import json
+import os
+import resource
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+from chat.models import GroupChat, GroupChatMembership
+from user.models import User
+from utils.metrics import counters
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# ~~~~~~~~~~~~~~~~~~~~ CHAT ~~~~~~~~~~~~~~~~~~~~
+
+USERNAME_PREFIX = "bench_ws_"
+MARKER = "bench"
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def ms(value):
+    return round(value * 1000, 3) if value is not None else None
+
+
+def rss_bytes(pid=None):
+    """
+    Resident set size of a process. Without psutil only the peak RSS of this
+    process is available.
+    """
+    if psutil is not None:
+        return psutil.Process(pid or os.getpid()).memory_info().rss
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class InProcessConnection:
+    """
+    Socket driven through core.asgi.application in this event loop, without
+    a server or network in between
+    """
+
+    def __init__(self, path, token):
+        from channels.testing import WebsocketCommunicator
+        from core.asgi import application
+
+        self.communicator = WebsocketCommunicator(application, f"{path}?token={token}")
+
+    async def connect(self, timeout):
+        connected, code = await self.communicator.connect(timeout=timeout)
+        return connected
+
+    async def send(self, text):
+        await self.communicator.send_to(text_data=text)
+
+    async def receive(self):
+        # Cancelling a pending receive leaves the application running,
+        # only a timeout would stop it
+        return await self.communicator.receive_from(timeout=24 * 3600)
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class LocalhostConnection:
+    """
+    Socket to a running ASGI server (daphne / uvicorn) through the websockets
+    package
+    """
+
+    def __init__(self, url, path, token):
+        self.uri = f"{url.rstrip('/')}/{path}?token={token}"
+        self.socket = None
+
+    async def connect(self, timeout):
+        import websockets
+
+        self.socket = await websockets.connect(
+            self.uri, open_timeout=timeout, max_queue=None
+        )
+        return True
+
+    async def send(self, text):
+        await self.socket.send(text)
+
+    async def receive(self):
+        return await self.socket.recv()
+
+    async def close(self):
+        await self.socket.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens N authenticated sockets to ws/chat/group/<uuid>/ (in-process "
+        "or against a server with --url), drives messages at a fixed rate and "
+        "reports connect latency, delivery p50/p99 and RSS per connection as "
+        "JSON. The per-user WebSocket rate limits still apply to senders."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=1000)
+        parser.add_argument(
+            "--chats",
+            type=int,
+            default=1,
+            help="Connections are spread over this many group chats",
+        )
+        parser.add_argument("--senders", type=int, default=10)
+        parser.add_argument("--messages", type=int, default=1000)
+        parser.add_argument(
+            "--rate", type=float, default=100, help="Messages per second, in total"
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=200,
+            help="Connection attempts in flight during the connect storm",
+        )
+        parser.add_argument("--connect-timeout", type=float, default=30)
+        parser.add_argument(
+            "--drain-timeout",
+            type=float,
+            default=30,
+            help="Seconds to wait for deliveries after the last send",
+        )
+        parser.add_argument(
+            "--url",
+            help="e.g. ws://127.0.0.1:8000 to benchmark a running server "
+            "(requires the websockets package)",
+        )
+        parser.add_argument(
+            "--server-pid",
+            type=int,
+            help="Measure the RSS of this server process in --url mode",
+        )
+        parser.add_argument("--output", default="bench_websocket.json")
+
+    def handle(self, *args, **options):
+        chats, users = self.seed(options)
+        report = asyncio.run(self.run(chats, users, options))
+        report.update(
+            {
+                "benchmark": "websocket",
+                "created_at": timezone.now().isoformat(),
+                "mode": "localhost" if options["url"] else "in-process",
+                "chats": options["chats"],
+                "senders": options["senders"],
+                "rate": options["rate"],
+                "counters": counters.snapshot(),
+            }
+        )
+
+        connect = report["connect"]
+        delivery = report["delivery"]
+        self.stdout.write(
+            f"connect   ok={connect['connected']}/{connect['attempted']} "
+            f"p50={connect['p50_ms']}ms p99={connect['p99_ms']}ms "
+            f"{connect['per_second']}/s"
+        )
+        self.stdout.write(
+            f"delivery  received={delivery['received']}/{delivery['expected']} "
+            f"p50={delivery['p50_ms']}ms p99={delivery['p99_ms']}ms "
+            f"max={delivery['max_ms']}ms {delivery['per_second']}/s"
+        )
+        self.stdout.write(
+            f"memory    {report['memory']['rss_per_connection_kb']} KB RSS "
+            f"per connection ({report['memory']['measured']})"
+        )
+
+        with open(options["output"], "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    def seed(self, options):
+        """
+        Benchmark users are reused between runs, the chats are new every run
+        """
+        count = options["connections"]
+        existing = set(
+            User.objects.filter(username__startswith=USERNAME_PREFIX).values_list(
+                "username", flat=True
+            )
+        )
+        missing = []
+        for index in range(count):
+            username = f"{USERNAME_PREFIX}{index}"
+            if username not in existing:
+                user = User(username=username, email=f"{username}@example.com")
+                user.set_unusable_password()
+                missing.append(user)
+        User.objects.bulk_create(missing, batch_size=1000)
+
+        by_username = User.objects.filter(username__startswith=USERNAME_PREFIX).in_bulk(
+            [f"{USERNAME_PREFIX}{index}" for index in range(count)],
+            field_name="username",
+        )
+        users = [by_username[f"{USERNAME_PREFIX}{index}"] for index in range(count)]
+
+        chats = GroupChat.objects.bulk_create(
+            [
+                GroupChat(name=f"WebSocket bench {index}", created_by=users[0])
+                for index in range(max(1, options["chats"]))
+            ]
+        )
+        GroupChatMembership.objects.bulk_create(
+            [
+                GroupChatMembership(chat=chats[index % len(chats)], user=user)
+                for index, user in enumerate(users)
+            ],
+            batch_size=1000,
+        )
+        return chats, users
+
+    def make_connection(self, chat, user, options):
+        path = f"ws/chat/group/{chat.pk}/"
+        token = str(AccessToken.for_user(user))
+        if options["url"]:
+            return LocalhostConnection(options["url"], path, token)
+        return InProcessConnection(f"/{path}", token)
+
+    async def run(self, chats, users, options):
+        measured_pid = options["server_pid"] if options["url"] else None
+        rss_before = rss_bytes(measured_pid)
+
+        # ~~~~~ Connect storm ~~~~~
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        connect_latencies = []
+        connections = {}
+
+        async def open_connection(index, user):
+            chat = chats[index % len(chats)]
+            connection = self.make_connection(chat, user, options)
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    ok = await connection.connect(options["connect_timeout"])
+                except Exception:
+                    ok = False
+                if ok:
+                    connect_latencies.append(time.monotonic() - started)
+                    connections[index] = (chat, connection)
+
+        storm_started = time.monotonic()
+        await asyncio.gather(
+            *(open_connection(index, user) for index, user in enumerate(users))
+        )
+        storm_elapsed = time.monotonic() - storm_started
+
+        rss_after = rss_bytes(measured_pid)
+
+        # ~~~~~ Fan-out ~~~~~
+        members = {}
+        for chat, _ in connections.values():
+            members[chat.pk] = members.get(chat.pk, 0) + 1
+
+        delivery_latencies = []
+        errors = []
+        expected = 0
+        delivered = asyncio.Event()
+
+        async def read_frames(connection):
+            while True:
+                try:
+                    frame = json.loads(await connection.receive())
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    return
+                if frame.get("type") == "error":
+                    errors.append(frame.get("detail"))
+                    continue
+                parts = str(frame.get("message", "")).split(" ")
+                if len(parts) == 3 and parts[0] == MARKER:
+                    delivery_latencies.append(time.monotonic() - float(parts[2]))
+                    if len(delivery_latencies) >= expected:
+                        delivered.set()
+
+        readers = [
+            asyncio.create_task(read_frames(connection))
+            for _, connection in connections.values()
+        ]
+        # Let the presence frames of the connect storm settle
+        await asyncio.sleep(1)
+
+        senders = list(connections.values())[: max(1, options["senders"])]
+        send_started = time.monotonic()
+        for seq in range(options["messages"] if senders else 0):
+            # Sends follow a fixed schedule, a slow send does not lower the rate
+            delay = send_started + seq / options["rate"] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            chat, connection = senders[seq % len(senders)]
+            expected += members[chat.pk]
+            await connection.send(
+                json.dumps({"message": f"{MARKER} {seq} {time.monotonic()}"})
+            )
+        send_elapsed = time.monotonic() - send_started
+
+        delivered.clear()
+        if len(delivery_latencies) < expected:
+            try:
+                await asyncio.wait_for(delivered.wait(), options["drain_timeout"])
+            except asyncio.TimeoutError:
+                pass
+        fanout_elapsed = time.monotonic() - send_started
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        await asyncio.gather(
+            *(connection.close() for _, connection in connections.values()),
+            return_exceptions=True,
+        )
+
+        return {
+            "connect": {
+                "attempted": len(users),
+                "connected": len(connections),
+                "seconds": round(storm_elapsed, 3),
+                "per_second": round(len(connections) / storm_elapsed, 1),
+                "p50_ms": ms(percentile(connect_latencies, 0.50)),
+                "p99_ms": ms(percentile(connect_latencies, 0.99)),
+                "max_ms": ms(max(connect_latencies, default=None)),
+            },
+            "delivery": {
+                "messages": options["messages"],
+                "send_seconds": round(send_elapsed, 3),
+                "expected": expected,
+                "received": len(delivery_latencies),
+                "per_second": round(len(delivery_latencies) / fanout_elapsed, 1),
+                "errors": len(errors),
+                "p50_ms": ms(percentile(delivery_latencies, 0.50)),
+                "p99_ms": ms(percentile(delivery_latencies, 0.99)),
+                "max_ms": ms(max(delivery_latencies, default=None)),
+            },
+            "memory": {
+                "measured": (
+                    f"server pid {measured_pid}"
+                    if measured_pid
+                    else "this process (clients and application)"
+                ),
+                "psutil": psutil is not None,
+                "rss_before_mb": round(rss_before / 2**20, 1),
+                "rss_after_mb": round(rss_after / 2**20, 1),
+                "rss_per_connection_kb": (
+                    round((rss_after - rss_before) / len(connections) / 1024, 1)
+                    if connections
+                    else None
+                ),
+            },
+        }
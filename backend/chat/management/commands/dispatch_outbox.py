@@ -0,0 +1,45 @@
+# backend\chat\management\commands\dispatch_outbox.py:
+
+import logging
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chat.outbox import dispatch_outbox
+
+logger = logging.getLogger(__name__)
+
+# ~~~~~~~~~~~~~~~~~~~~ CHAT ~~~~~~~~~~~~~~~~~~~~
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends pending chat outbox events to the channel layer. Useful as a "
+        "standalone dispatcher next to a multi-process channel layer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.CHAT_OUTBOX_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--interval", type=float, default=settings.CHAT_OUTBOX_POLL_INTERVAL
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the outbox once and exit"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("Dispatching chat outbox..."))
+        sent = 0
+        try:
+            while True:
+                count = dispatch_outbox(options["batch_size"])
+                sent += count
+                if count < options["batch_size"]:
+                    if options["once"]:
+                        break
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        logger.info(f"Chat outbox dispatcher stopped after {sent} events")
+        self.stdout.write(self.style.SUCCESS(f"{sent} events dispatched"))
@@ -0,0 +1,57 @@
+# backend\chat\management\commands\drain_chat_sockets.py:
+
+import os
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chat.lifecycle import CONTROL_GROUP, DRAIN_SIGNAL
+
+# ~~~~~~~~~~~~~~~~~~~~ CHAT ~~~~~~~~~~~~~~~~~~~~
+
+
+class Command(BaseCommand):
+    help = (
+        "Puts the chat WebSocket workers into drain mode: they refuse new "
+        "sockets and close the open ones gradually with a reconnect hint. "
+        "Reaches every worker through the channel layer, or the given "
+        "processes by signal (required with InMemoryChannelLayer)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            type=float,
+            default=settings.CHAT_WS_DRAIN_PERIOD,
+            help="Seconds over which the open sockets are closed",
+        )
+        parser.add_argument(
+            "--pid",
+            type=int,
+            nargs="+",
+            help="Signal these worker processes instead (drains over "
+            "CHAT_WS_DRAIN_PERIOD)",
+        )
+
+    def handle(self, *args, **options):
+        if options["pid"]:
+            if DRAIN_SIGNAL is None:
+                raise CommandError("Drain signals are not supported on this platform.")
+            for pid in options["pid"]:
+                os.kill(pid, DRAIN_SIGNAL)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Drain signal sent to {len(options['pid'])} workers"
+                )
+            )
+            return
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None or isinstance(channel_layer, InMemoryChannelLayer):
+            raise CommandError(
+                "The in-memory channel layer is per process, use --pid instead."
+            )
+        async_to_sync(channel_layer.group_send)(
+            CONTROL_GROUP, {"type": "chat.drain", "period": options["period"]}
+        )
+        self.stdout.write(self.style.SUCCESS("Drain requested from all chat workers"))
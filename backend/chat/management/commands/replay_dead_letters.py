@@ -0,0 +1,67 @@
+# backend\chat\management\commands\replay_dead_letters.py:
+
+import logging
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chat.buffer import read_dead_letter, write_dead_letters
+from chat.services import bulk_create_messages
+
+logger = logging.getLogger(__name__)
+
+# ~~~~~~~~~~~~~~~~~~~~ CHAT ~~~~~~~~~~~~~~~~~~~~
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the messages the write-behind buffer could not persist from "
+        "the dead-letter file to the database. Messages already stored are "
+        "skipped; the ones that fail again go back to the file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path", default=settings.CHAT_WRITE_BEHIND_DEAD_LETTER_PATH
+        )
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            self.stdout.write(self.style.SUCCESS("No dead letters"))
+            return
+
+        # Servers keep appending to path; replay a snapshot of it
+        replaying = f"{path}.replaying"
+        if not os.path.exists(replaying):
+            os.replace(path, replaying)
+        with open(replaying, encoding="utf-8") as file:
+            messages = [read_dead_letter(line) for line in file if line.strip()]
+
+        written = 0
+        failed = []
+        for start in range(0, len(messages), options["batch_size"]):
+            batch = messages[start : start + options["batch_size"]]
+            try:
+                written += len(bulk_create_messages(batch))
+            except Exception:
+                # One bad row must not hold back the rest of the batch
+                for message in batch:
+                    try:
+                        written += len(bulk_create_messages([message]))
+                    except Exception as e:
+                        logger.error(f"Replay of message {message.uuid} failed: {e}")
+                        failed.append(message)
+
+        if failed:
+            write_dead_letters(path, failed)
+        os.remove(replaying)
+
+        logger.info(
+            f"Dead letter replay finished: {written} written, {len(failed)} failed"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done, {written} messages written, {len(failed)} kept in {path}"
+            )
+        )
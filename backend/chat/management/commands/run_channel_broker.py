@@ -0,0 +1,29 @@
+# backend\chat\management\commands\run_channel_broker.py:
+
+import asyncio
+import logging
+from django.core.management.base import BaseCommand
+from chat.broker import ChannelBroker
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Starts a channel broker for chat.layers.BrokerChannelLayer"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--address",
+            default="tcp://127.0.0.1:8765",
+            help='"tcp://host:port" or "unix:///path/to/socket"',
+        )
+
+    def handle(self, *args, **options):
+        address = options["address"]
+        self.stdout.write(self.style.SUCCESS(f"Starting channel broker on {address}"))
+        logger.info(f"Starting channel broker on {address}")
+
+        try:
+            asyncio.run(ChannelBroker().serve(address))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS("Channel broker stopped"))
@@ -0,0 +1,293 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0002_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GroupChatMembership",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_read_seq", models.PositiveBigIntegerField(default=0)),
+                ("joined_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="InboxEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("chat_id", models.UUIDField()),
+                (
+                    "chat_kind",
+                    models.CharField(
+                        choices=[("personal", "Personal"), ("group", "Group")],
+                        max_length=10,
+                    ),
+                ),
+                ("last_activity_at", models.DateTimeField()),
+                ("last_seq", models.PositiveBigIntegerField(default=0)),
+                ("last_read_seq", models.PositiveBigIntegerField(default=0)),
+                ("preview", models.CharField(blank=True, default="", max_length=100)),
+                ("lazy", models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="OutboxEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("group_name", models.CharField(max_length=100)),
+                ("payload", models.JSONField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PersonalChatMembership",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("last_read_seq", models.PositiveBigIntegerField(default=0)),
+                ("joined_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="groupchat",
+            name="last_message",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="chat.message",
+            ),
+        ),
+        migrations.AddField(
+            model_name="groupchat",
+            name="last_message_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="groupchat",
+            name="last_message_preview",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="groupchat",
+            name="last_seq",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="chat_id",
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="chat_kind",
+            field=models.CharField(
+                blank=True,
+                choices=[("personal", "Personal"), ("group", "Group")],
+                editable=False,
+                max_length=10,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="seq",
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="personalchat",
+            name="last_message",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="chat.message",
+            ),
+        ),
+        migrations.AddField(
+            model_name="personalchat",
+            name="last_message_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="personalchat",
+            name="last_message_preview",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="personalchat",
+            name="last_seq",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="personalchat",
+            name="pair_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="created_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["chat_id", "created_at", "uuid"],
+                name="message_chat_created_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="message",
+            constraint=models.UniqueConstraint(
+                fields=("chat_id", "seq"), name="message_chat_seq_unique"
+            ),
+        ),
+        migrations.AddField(
+            model_name="groupchatmembership",
+            name="chat",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="memberships",
+                to="chat.groupchat",
+            ),
+        ),
+        migrations.AddField(
+            model_name="groupchatmembership",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        # The implicit chat_groupchat_participants table is left in place for
+        # backfill_memberships to copy from; only the model state moves
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="groupchat",
+                    name="participants",
+                    field=models.ManyToManyField(
+                        related_name="group_chats",
+                        through="chat.GroupChatMembership",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="inboxentry",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="inbox_entries",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="personalchatmembership",
+            name="chat",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="memberships",
+                to="chat.personalchat",
+            ),
+        ),
+        migrations.AddField(
+            model_name="personalchatmembership",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        # The implicit chat_personalchat_participants table is left in place for
+        # backfill_memberships to copy from; only the model state moves
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="personalchat",
+                    name="participants",
+                    field=models.ManyToManyField(
+                        related_name="personal_chats",
+                        through="chat.PersonalChatMembership",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="groupchatmembership",
+            constraint=models.UniqueConstraint(
+                fields=("chat", "user"), name="group_chat_membership_unique"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inboxentry",
+            index=models.Index(
+                fields=["user", "-last_activity_at", "-chat_id"],
+                name="inbox_user_activity_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="inboxentry",
+            constraint=models.UniqueConstraint(
+                fields=("chat_id", "user"), name="inbox_chat_user_unique"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="personalchatmembership",
+            constraint=models.UniqueConstraint(
+                fields=("chat", "user"), name="personal_chat_membership_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.models import F
+
+BATCH_SIZE = 5000
+
+
+def backfill_message_chat(apps, schema_editor):
+    """
+    Same as the backfill_message_chat command: rows left without chat_id
+    would be invisible to history, replay and search, which filter on it
+    alone. Batches commit on their own, so a large table is not locked in
+    one transaction and an interrupted run picks up where it stopped.
+    """
+    Message = apps.get_model("chat", "Message")
+    pending = Message.objects.filter(chat_id__isnull=True).order_by("uuid")
+    last_uuid = None
+    while True:
+        batch = pending if last_uuid is None else pending.filter(uuid__gt=last_uuid)
+        uuids = list(batch.values_list("uuid", flat=True)[:BATCH_SIZE])
+        if not uuids:
+            break
+        last_uuid = uuids[-1]
+        Message.objects.filter(uuid__in=uuids, personal_chat__isnull=False).update(
+            chat_id=F("personal_chat"), chat_kind="personal"
+        )
+        Message.objects.filter(uuid__in=uuids, group_chat__isnull=False).update(
+            chat_id=F("group_chat"), chat_kind="group"
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("chat", "0003_memberships_inbox_outbox_message_chat"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_message_chat, migrations.RunPython.noop),
+    ]
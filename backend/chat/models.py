@@ -2,6 +2,7 @@
 
 
 from django.db import models
+from django.utils import timezone
 
 #
 import uuid
@@ -9,6 +10,7 @@ import uuid
 #
 from user.models import User
 from utils.functions import get_deleted_user_id
+from utils.enamurations import ChatKind
 
 
 class Chat(models.Model):
@@ -16,21 +18,45 @@ class Chat(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized pointer to the newest message, kept by chat.services
+    last_message = models.ForeignKey(
+        "Message",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    last_message_preview = models.CharField(max_length=100, blank=True, default="")
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # Last sequence number handed out to a message of this chat
+    last_seq = models.PositiveBigIntegerField(default=0, editable=False)
+
     class Meta:
         abstract = True
 
 
 class PersonalChat(Chat):
-    participants = models.ManyToManyField(User, related_name="personal_chats")
+    kind = ChatKind.PERSONAL
+    participants = models.ManyToManyField(
+        User, through="PersonalChatMembership", related_name="personal_chats"
+    )
+    # sha256 of the two sorted participant uuids, see chat.services.pair_key.
+    # Unique, so a pair of users has at most one chat opened through it.
+    pair_key = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False
+    )
 
     def __str__(self):
         return f"Personal chat {self.uuid}"
 
 
 class GroupChat(Chat):
+    kind = ChatKind.GROUP
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
-    participants = models.ManyToManyField(User, related_name="group_chats")
+    participants = models.ManyToManyField(
+        User, through="GroupChatMembership", related_name="group_chats"
+    )
     created_by = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, related_name="created_group_chats"
     )
@@ -39,14 +65,68 @@ class GroupChat(Chat):
         return f"{self.name} ({self.uuid})"
 
 
+class ChatMembership(models.Model):
+    """
+    A participant of a chat and their read watermark: every message with
+    seq <= last_read_seq is read, so unread = chat.last_seq - last_read_seq
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    last_read_seq = models.PositiveBigIntegerField(default=0)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.user_id} in {self.chat_id}"
+
+
+class PersonalChatMembership(ChatMembership):
+    chat = models.ForeignKey(
+        PersonalChat, on_delete=models.CASCADE, related_name="memberships"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["chat", "user"], name="personal_chat_membership_unique"
+            ),
+        ]
+
+
+class GroupChatMembership(ChatMembership):
+    chat = models.ForeignKey(
+        GroupChat, on_delete=models.CASCADE, related_name="memberships"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["chat", "user"], name="group_chat_membership_unique"
+            ),
+        ]
+
+
 class Message(models.Model):
     uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     sender = models.ForeignKey(
         User, on_delete=models.SET(get_deleted_user_id), related_name="sent_messages"
     )
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: write-behind consumers stamp messages before the INSERT
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Legacy flag, read state is tracked by ChatMembership.last_read_seq
     is_read = models.BooleanField(default=False)
+    # Per-chat, monotonically increasing; assigned by chat.services on insert
+    seq = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+
+    # Uuid of the chat whichever table it lives in, plus the table. Chat uuids
+    # are unique across kinds, so chat_id alone selects one chat's history.
+    chat_id = models.UUIDField(null=True, blank=True, editable=False)
+    chat_kind = models.CharField(
+        max_length=10, choices=ChatKind.choices, null=True, blank=True, editable=False
+    )
 
     personal_chat = models.ForeignKey(
         PersonalChat,
@@ -65,10 +145,81 @@ class Message(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # History, replay and keyset pagination: (chat_id, created_at, uuid)
+            models.Index(
+                fields=["chat_id", "created_at", "uuid"],
+                name="message_chat_created_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["chat_id", "seq"], name="message_chat_seq_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Message from {self.sender.username} in {self.chat_kind} chat {self.chat_id}"
+
+    def save(self, *args, **kwargs):
+        if self.chat_id is None:
+            if self.personal_chat_id:
+                self.chat_id, self.chat_kind = self.personal_chat_id, ChatKind.PERSONAL
+            elif self.group_chat_id:
+                self.chat_id, self.chat_kind = self.group_chat_id, ChatKind.GROUP
+        super().save(*args, **kwargs)
+
+
+class InboxEntry(models.Model):
+    """
+    A user's row in their chat list, for any kind of chat (fan-out on write).
+
+    chat.services moves last_seq, preview and last_activity_at on every new
+    message and last_read_seq with the membership watermark, so the list is
+    read with one range scan of the user's index. Entries of groups larger
+    than CHAT_INBOX_FANOUT_LIMIT are "lazy": messages do not touch them and
+    they are refreshed from the chat row when the inbox is read.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="inbox_entries"
+    )
+    chat_id = models.UUIDField()
+    chat_kind = models.CharField(max_length=10, choices=ChatKind.choices)
+    last_activity_at = models.DateTimeField()
+    last_seq = models.PositiveBigIntegerField(default=0)
+    last_read_seq = models.PositiveBigIntegerField(default=0)
+    preview = models.CharField(max_length=100, blank=True, default="")
+    lazy = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # The inbox: a user's chats, most recently active first
+            models.Index(
+                fields=["user", "-last_activity_at", "-chat_id"],
+                name="inbox_user_activity_idx",
+            ),
+        ]
+        constraints = [
+            # Also the index of the per-message fan-out UPDATE
+            models.UniqueConstraint(
+                fields=["chat_id", "user"], name="inbox_chat_user_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Inbox of {self.user_id}: {self.chat_kind} chat {self.chat_id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Channel layer event written in the same transaction as the change it
+    announces. chat.outbox sends the events in id order and deletes them.
+    """
+
+    group_name = models.CharField(max_length=100)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        chat_type = "Personal chat" if self.personal_chat else "Group chat"
-        chat_id = (
-            self.personal_chat.uuid if self.personal_chat else self.group_chat.uuid
-        )
-        return f"Message from {self.sender.username} in {chat_type} {chat_id}"
+        return f"Outbox event {self.pk} for {self.group_name}"
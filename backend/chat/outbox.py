@@ -0,0 +1,102 @@
+# backend\chat\outbox.py:
+
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+#
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def dispatch_outbox(batch_size):
+    """
+    Send the oldest ``batch_size`` outbox events to the channel layer and
+    delete them. Returns the number of events sent.
+
+    The rows stay locked until they are deleted, so concurrent dispatchers
+    take turns and events of a chat keep their order (sequence numbers are
+    allocated under the chat row lock, so ids follow commit order per chat).
+    A failed send rolls the batch back for the next round.
+    """
+    channel_layer = get_channel_layer()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update().order_by("id")[:batch_size]
+        )
+        for event in events:
+            async_to_sync(channel_layer.group_send)(event.group_name, event.payload)
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).delete()
+    return len(events)
+
+
+class OutboxDispatcher:
+    """
+    Background task draining the outbox into the channel layer.
+
+    It is started by the ASGI startup hooks (core/lifespan.py) before the
+    process serves its first request, wakes up right after a transaction with new events
+    commits, and also checks the table every ``poll_interval`` seconds to
+    pick up events committed by other processes.
+    """
+
+    def __init__(self, batch_size, poll_interval):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._loop = None
+        self._task = None
+        self._wake = None
+
+    def ensure_started(self):
+        """
+        Start the task on the running event loop unless it is already running
+        """
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+
+    async def start(self):
+        self.ensure_started()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self):
+        """
+        Thread-safe; used as a transaction.on_commit callback
+        """
+        if self._task is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                while (
+                    await database_sync_to_async(dispatch_outbox)(self.batch_size)
+                    == self.batch_size
+                ):
+                    pass
+            except Exception as e:
+                logger.error(f"Error dispatching chat outbox: {str(e)}")
+
+
+outbox_dispatcher = OutboxDispatcher(
+    batch_size=settings.CHAT_OUTBOX_BATCH_SIZE,
+    poll_interval=settings.CHAT_OUTBOX_POLL_INTERVAL,
+)
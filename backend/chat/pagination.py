@@ -0,0 +1,192 @@
+# backend\chat\pagination.py:
+
+import base64
+import uuid
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset pagination over (created_at, uuid) for chat history.
+
+    Anchors are message UUIDs passed as ``before``, ``after`` or ``around``.
+    Without an anchor the latest page is returned. Results are always in
+    chronological order.
+    """
+
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "limit"
+    anchor_query_params = ("before", "after", "around")
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_anchor(self, queryset, request):
+        anchors = {
+            param: request.query_params[param]
+            for param in self.anchor_query_params
+            if param in request.query_params
+        }
+        if not anchors:
+            return None, None
+        if len(anchors) > 1:
+            raise ValidationError(
+                {"detail": "Use only one of 'before', 'after' or 'around'."}
+            )
+
+        direction, value = anchors.popitem()
+        try:
+            anchor = queryset.values("created_at", "uuid").get(uuid=value)
+        except (queryset.model.DoesNotExist, DjangoValidationError):
+            raise NotFound({"detail": "Anchor message not found."})
+        return direction, anchor
+
+    def older_than(self, queryset, anchor, limit, inclusive=False):
+        condition = Q(created_at__lt=anchor["created_at"]) | Q(
+            created_at=anchor["created_at"],
+            **{"uuid__lte" if inclusive else "uuid__lt": anchor["uuid"]},
+        )
+        rows = list(
+            queryset.filter(condition).order_by("-created_at", "-uuid")[: limit + 1]
+        )
+        has_more = len(rows) > limit
+        return rows[:limit][::-1], has_more
+
+    def newer_than(self, queryset, anchor, limit):
+        condition = Q(created_at__gt=anchor["created_at"]) | Q(
+            created_at=anchor["created_at"], uuid__gt=anchor["uuid"]
+        )
+        rows = list(
+            queryset.filter(condition).order_by("created_at", "uuid")[: limit + 1]
+        )
+        has_more = len(rows) > limit
+        return rows[:limit], has_more
+
+    def paginate_queryset(self, queryset, request, view=None):
+        limit = self.get_page_size(request)
+        direction, anchor = self.get_anchor(queryset, request)
+
+        if direction is None:
+            rows = list(queryset.order_by("-created_at", "-uuid")[: limit + 1])
+            self.has_older = len(rows) > limit
+            self.has_newer = False
+            self.page = rows[:limit][::-1]
+        elif direction == "before":
+            self.page, self.has_older = self.older_than(queryset, anchor, limit)
+            self.has_newer = True
+        elif direction == "after":
+            self.page, self.has_newer = self.newer_than(queryset, anchor, limit)
+            self.has_older = True
+        else:
+            # The anchor itself is part of the older half
+            older, self.has_older = self.older_than(
+                queryset, anchor, limit - limit // 2, inclusive=True
+            )
+            newer, self.has_newer = self.newer_than(queryset, anchor, limit // 2)
+            self.page = older + newer
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        first = self.page[0] if self.page else None
+        last = self.page[-1] if self.page else None
+        return Response(
+            {
+                "before": str(first.uuid) if first and self.has_older else None,
+                "after": str(last.uuid) if last and self.has_newer else None,
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "before": {"type": "string", "format": "uuid", "nullable": True},
+                "after": {"type": "string", "format": "uuid", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class InboxKeysetPagination(BasePagination):
+    """
+    Keyset pagination over (last_activity_at, chat_id), newest first.
+
+    The ``cursor`` of the next page encodes the last row of the current one,
+    so every page is a single range scan of the user's inbox index.
+    """
+
+    page_size = 30
+    max_page_size = 100
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, entry):
+        value = f"{entry.last_activity_at.isoformat()}|{entry.chat_id}"
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            value = base64.urlsafe_b64decode(cursor.encode()).decode()
+            activity, chat_id = value.split("|")
+            activity = parse_datetime(activity)
+            chat_id = uuid.UUID(chat_id)
+        except ValueError:
+            activity = None
+        if activity is None:
+            raise ValidationError({"detail": "Invalid cursor."})
+        return activity, chat_id
+
+    def paginate_queryset(self, queryset, request, view=None):
+        limit = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            activity, chat_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(last_activity_at__lt=activity)
+                | Q(last_activity_at=activity, chat_id__lt=chat_id)
+            )
+        rows = list(queryset.order_by("-last_activity_at", "-chat_id")[: limit + 1])
+        self.has_more = len(rows) > limit
+        self.page = rows[:limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": (
+                    self.encode_cursor(self.page[-1])
+                    if self.page and self.has_more
+                    else None
+                ),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,138 @@
+# backend\chat\presence.py:
+
+import asyncio
+import threading
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+#
+from utils.cache import LRUCache
+
+ONLINE = "online"
+AWAY = "away"
+OFFLINE = "offline"
+
+
+class PresenceRegistry:
+    """
+    Presence of the users connected to this process, kept in memory only.
+
+    Every socket reports its own status (online or away) and is refreshed by
+    any frame it sends. A user is online if any fresh socket is online, away
+    if all fresh sockets are away, and offline otherwise. Sockets silent for
+    longer than ``ttl`` seconds no longer count.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        # user uuid -> {channel name: (status, last seen)}
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def _status(self, user_uuid, now):
+        statuses = [
+            status
+            for status, seen_at in self._connections.get(user_uuid, {}).values()
+            if now - seen_at <= self.ttl
+        ]
+        if ONLINE in statuses:
+            return ONLINE
+        return AWAY if statuses else OFFLINE
+
+    def update(self, user_uuid, channel_name, status=None):
+        """
+        Refresh a socket, optionally changing its status. Returns the user's
+        new status if it changed, else None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            before = self._status(user_uuid, now)
+            connections = self._connections.setdefault(user_uuid, {})
+            if status is None:
+                status = connections.get(channel_name, (ONLINE, now))[0]
+            connections[channel_name] = (status, now)
+            after = self._status(user_uuid, now)
+        return after if after != before else None
+
+    def remove(self, user_uuid, channel_name):
+        now = time.monotonic()
+        with self._lock:
+            before = self._status(user_uuid, now)
+            connections = self._connections.get(user_uuid, {})
+            connections.pop(channel_name, None)
+            if not connections:
+                self._connections.pop(user_uuid, None)
+            after = self._status(user_uuid, now)
+        return after if after != before else None
+
+    def status(self, user_uuid):
+        with self._lock:
+            return self._status(user_uuid, time.monotonic())
+
+    def snapshot(self):
+        """
+        {user uuid: status} of every user that is not offline
+        """
+        now = time.monotonic()
+        with self._lock:
+            statuses = {
+                user_uuid: self._status(user_uuid, now)
+                for user_uuid in self._connections
+            }
+        return {
+            user_uuid: status
+            for user_uuid, status in statuses.items()
+            if status != OFFLINE
+        }
+
+
+presence_registry = PresenceRegistry(ttl=settings.CHAT_PRESENCE_TTL)
+
+
+class TypingCoalescer:
+    """
+    Collects the typing notifications of a chat for half an ``interval`` and
+    broadcasts them as one event. A user is announced at most once per
+    interval in a chat, however often their client reports typing.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.recent = LRUCache(maxsize=100000, ttl=interval)
+        # channel layer group -> {"kind", "chat", "users": {uuid: username}}
+        self.pending = {}
+
+    def add(self, group_name, chat_kind, chat_pk, user_uuid, username):
+        """
+        Returns False if the notification was folded into an earlier one
+        """
+        key = (group_name, str(user_uuid))
+        if key in self.recent:
+            return False
+        self.recent.set(key, True)
+
+        pending = self.pending.get(group_name)
+        if pending is None:
+            pending = self.pending[group_name] = {
+                "kind": str(chat_kind),
+                "chat": str(chat_pk),
+                "users": {},
+            }
+            asyncio.get_running_loop().call_later(
+                self.interval / 2,
+                lambda: asyncio.ensure_future(self.flush(group_name)),
+            )
+        pending["users"][str(user_uuid)] = username
+        return True
+
+    async def flush(self, group_name):
+        pending = self.pending.pop(group_name, None)
+        if pending:
+            await get_channel_layer().group_send(
+                group_name, {"type": "chat_typing", **pending}
+            )
+
+
+typing_events = TypingCoalescer(interval=settings.CHAT_TYPING_INTERVAL)
@@ -0,0 +1,158 @@
+# backend\chat\search.py:
+
+import logging
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import OperationalError
+
+#
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "chat_message_fts"
+PG_INDEX = "chat_message_content_fts_idx"
+
+# Word characters only: everything else would be FTS5 / tsquery syntax
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def message_table():
+    return Message._meta.db_table
+
+
+def fts5_exists(cursor):
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+    )
+    return cursor.fetchone() is not None
+
+
+def install_search_index(sender=None, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate hook creating the full-text index of Message.content.
+
+    SQLite: an external-content FTS5 table kept in sync by triggers.
+    PostgreSQL: a GIN index on to_tsvector('simple', content), which the
+    database maintains on every write by itself.
+    """
+    connection = connections[using]
+    table = message_table()
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {table} "
+                f"USING GIN (to_tsvector('simple', content))"
+            )
+        elif connection.vendor == "sqlite":
+            created = not fts5_exists(cursor)
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    f"content, content='{table}', content_rowid='rowid')"
+                )
+            except OperationalError as e:
+                logger.warning(f"FTS5 unavailable, message search uses LIKE: {e}")
+                return
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} "
+                f"BEGIN INSERT INTO {FTS_TABLE}(rowid, content) "
+                f"VALUES (new.rowid, new.content); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} "
+                f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) "
+                f"VALUES ('delete', old.rowid, old.content); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au "
+                f"AFTER UPDATE OF content ON {table} "
+                f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) "
+                f"VALUES ('delete', old.rowid, old.content); "
+                f"INSERT INTO {FTS_TABLE}(rowid, content) "
+                f"VALUES (new.rowid, new.content); END"
+            )
+            if created:
+                rebuild_search_index(using)
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Re-create the index from the message table, e.g. after a SQLite VACUUM
+    (which may renumber the rowids the FTS5 table points to)
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"REINDEX INDEX {PG_INDEX}")
+        elif connection.vendor == "sqlite" and fts5_exists(cursor):
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def search_tokens(query):
+    return TOKEN_RE.findall(query)[:16]
+
+
+def search_messages(chat_model, user, query, chat_pk=None, limit=20, offset=0):
+    """
+    Ranked [(message uuid, rank), ...] of messages matching every word of the
+    query, restricted to chats of ``chat_model`` the user participates in
+    (or to one of them with chat_pk). Best match first.
+    """
+    tokens = search_tokens(query)
+    if not tokens:
+        return []
+
+    connection = connections[Message.objects.db]
+    uuid_field = Message._meta.get_field("chat_id")
+    membership = chat_model.participants.through._meta
+    table = message_table()
+
+    conditions = [
+        "m.chat_kind = %s",
+        f"m.chat_id IN (SELECT {membership.get_field('chat').column} "
+        f"FROM {membership.db_table} WHERE {membership.get_field('user').column} = %s)",
+    ]
+    params = [
+        str(chat_model.kind),
+        uuid_field.get_db_prep_value(user.pk, connection),
+    ]
+    if chat_pk is not None:
+        conditions.append("m.chat_id = %s")
+        params.append(uuid_field.get_db_prep_value(chat_pk, connection))
+    where = " AND ".join(conditions)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"SELECT m.uuid, ts_rank(to_tsvector('simple', m.content), q) AS rank "
+                f"FROM {table} m, to_tsquery('simple', %s) q "
+                f"WHERE to_tsvector('simple', m.content) @@ q AND {where} "
+                f"ORDER BY rank DESC, m.created_at DESC LIMIT %s OFFSET %s",
+                # Every word must match, the last one also as a prefix
+                [" & ".join(tokens[:-1] + [f"{tokens[-1]}:*"]), *params]
+                + [limit, offset],
+            )
+        elif connection.vendor == "sqlite" and fts5_exists(cursor):
+            cursor.execute(
+                f"SELECT m.uuid, -bm25({FTS_TABLE}) AS rank "
+                f"FROM {FTS_TABLE} JOIN {table} m ON m.rowid = {FTS_TABLE}.rowid "
+                f"WHERE {FTS_TABLE} MATCH %s AND {where} "
+                f"ORDER BY bm25({FTS_TABLE}), m.created_at DESC LIMIT %s OFFSET %s",
+                [" ".join(f'"{token}"' for token in tokens) + "*", *params]
+                + [limit, offset],
+            )
+        else:
+            like = " AND ".join("m.content LIKE %s" for _ in tokens)
+            cursor.execute(
+                f"SELECT m.uuid, 0 AS rank FROM {table} m WHERE {like} AND {where} "
+                f"ORDER BY m.created_at DESC LIMIT %s OFFSET %s",
+                [f"%{token}%" for token in tokens] + params + [limit, offset],
+            )
+        rows = cursor.fetchall()
+
+    pk_field = Message._meta.pk
+    return [
+        (pk_field.to_python(message_uuid), float(rank)) for message_uuid, rank in rows
+    ]
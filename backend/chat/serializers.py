@@ -1,9 +1,12 @@
 # backend\chat\serializers.py:
 
+from django.db import transaction
 from rest_framework import serializers
 
 #
-from .models import PersonalChat, GroupChat, Message
+from .models import PersonalChat, GroupChat, InboxEntry, Message
+from .services import add_participants, open_personal_chat
+from user.models import User
 from user.serializers import UserSerializer
 
 
@@ -12,30 +15,79 @@ class MessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Message
-        fields = ("uuid", "sender", "content", "created_at", "is_read")
-        read_only_fields = ("uuid", "sender", "created_at")
+        fields = ("uuid", "seq", "sender", "content", "created_at", "is_read")
+        read_only_fields = ("uuid", "seq", "sender", "created_at")
+
+
+class MessageSearchResultSerializer(MessageSerializer):
+    chat_id = serializers.UUIDField(read_only=True)
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(MessageSerializer.Meta):
+        fields = MessageSerializer.Meta.fields + ("chat_id", "chat_kind", "rank")
+        read_only_fields = fields
+
+
+class CompactMessageSerializer(serializers.ModelSerializer):
+    """
+    Message with a sender reference only; senders are sent once per page in
+    a separate "users" map keyed by uuid
+    """
+
+    sender_id = serializers.UUIDField(read_only=True)
+
+    class Meta:
+        model = Message
+        fields = ("uuid", "seq", "sender_id", "content", "created_at", "is_read")
+        read_only_fields = fields
 
 
 class PersonalChatSerializer(serializers.ModelSerializer):
     participants = UserSerializer(many=True, read_only=True)
     last_message = serializers.SerializerMethodField()
+    last_read_seq = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = PersonalChat
-        fields = ("uuid", "participants", "created_at", "updated_at", "last_message")
-        read_only_fields = ("uuid", "created_at", "updated_at")
+        fields = (
+            "uuid",
+            "participants",
+            "created_at",
+            "updated_at",
+            "last_message",
+            "last_message_preview",
+            "last_message_at",
+            "last_read_seq",
+            "unread_count",
+        )
+        read_only_fields = (
+            "uuid",
+            "created_at",
+            "updated_at",
+            "last_message_preview",
+            "last_message_at",
+        )
 
     def get_last_message(self, obj):
-        last_message = obj.messages.order_by("-created_at").first()
-        if last_message:
-            return MessageSerializer(last_message).data
+        if obj.last_message:
+            return MessageSerializer(obj.last_message).data
         return None
 
+    def get_last_read_seq(self, obj):
+        # Annotated by the chat viewsets for the requesting user
+        return getattr(obj, "last_read_seq", 0)
+
+    def get_unread_count(self, obj):
+        return getattr(obj, "unread_count", 0)
+
 
 class GroupChatSerializer(serializers.ModelSerializer):
     participants = UserSerializer(many=True, read_only=True)
     created_by = UserSerializer(read_only=True)
     last_message = serializers.SerializerMethodField()
+    last_read_seq = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = GroupChat
@@ -48,15 +100,32 @@ class GroupChatSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
             "last_message",
+            "last_message_preview",
+            "last_message_at",
+            "last_read_seq",
+            "unread_count",
+        )
+        read_only_fields = (
+            "uuid",
+            "created_by",
+            "created_at",
+            "updated_at",
+            "last_message_preview",
+            "last_message_at",
         )
-        read_only_fields = ("uuid", "created_by", "created_at", "updated_at")
 
     def get_last_message(self, obj):
-        last_message = obj.messages.order_by("-created_at").first()
-        if last_message:
-            return MessageSerializer(last_message).data
+        if obj.last_message:
+            return MessageSerializer(obj.last_message).data
         return None
 
+    def get_last_read_seq(self, obj):
+        # Annotated by the chat viewsets for the requesting user
+        return getattr(obj, "last_read_seq", 0)
+
+    def get_unread_count(self, obj):
+        return getattr(obj, "unread_count", 0)
+
 
 class CreatePersonalChatSerializer(serializers.ModelSerializer):
     participant_ids = serializers.ListField(
@@ -68,22 +137,42 @@ class CreatePersonalChatSerializer(serializers.ModelSerializer):
         fields = ("uuid", "participant_ids")
         read_only_fields = ("uuid",)
 
+    def validate_participant_ids(self, value):
+        user = self.context["request"].user
+        others = set(value) - {user.pk}
+        if not others:
+            raise serializers.ValidationError(
+                "Add at least one participant other than yourself."
+            )
+        unknown = others - set(
+            User.objects.filter(pk__in=others).values_list("pk", flat=True)
+        )
+        if unknown:
+            raise serializers.ValidationError(
+                [f"User {user_id} not found." for user_id in sorted(map(str, unknown))]
+            )
+        return value
+
     def create(self, validated_data):
         participant_ids = validated_data.pop("participant_ids")
-        chat = PersonalChat.objects.create()
-
-        # Добавляем создателя чата и указанных участников
-        from user.models import User
+        user = self.context["request"].user
 
-        chat.participants.add(self.context["request"].user)
+        # A chat with one other user is looked up by its pair key first
+        others = {user_id for user_id in participant_ids if user_id != user.pk}
+        if len(others) == 1:
+            chat, created = open_personal_chat(user.pk, others.pop())
+            chat.created = created
+            chat.unknown_participant_ids = []
+            return chat
 
-        for user_id in participant_ids:
-            try:
-                user = User.objects.get(uuid=user_id)
-                chat.participants.add(user)
-            except User.DoesNotExist:
-                pass
+        # Добавляем создателя чата и указанных участников
+        with transaction.atomic():
+            chat = PersonalChat.objects.create()
+            _, _, chat.unknown_participant_ids = add_participants(
+                chat, [self.context["request"].user.pk, *participant_ids]
+            )
 
+        chat.created = True
         return chat
 
 
@@ -100,21 +189,59 @@ class CreateGroupChatSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         participant_ids = validated_data.pop("participant_ids")
 
-        chat = GroupChat.objects.create(
-            name=validated_data["name"],
-            description=validated_data.get("description", ""),
-            created_by=self.context["request"].user,
-        )
+        with transaction.atomic():
+            chat = GroupChat.objects.create(
+                name=validated_data["name"],
+                description=validated_data.get("description", ""),
+                created_by=self.context["request"].user,
+            )
+            _, _, chat.unknown_participant_ids = add_participants(
+                chat, [self.context["request"].user.pk, *participant_ids]
+            )
 
-        from user.models import User
+        return chat
 
-        chat.participants.add(self.context["request"].user)
 
-        for user_id in participant_ids:
-            try:
-                user = User.objects.get(uuid=user_id)
-                chat.participants.add(user)
-            except User.DoesNotExist:
-                pass
+class OpenPersonalChatSerializer(serializers.Serializer):
+    user_id = serializers.UUIDField()
 
-        return chat
+    def validate_user_id(self, value):
+        if value == self.context["request"].user.pk:
+            raise serializers.ValidationError("Cannot open a chat with yourself.")
+        if not User.objects.filter(pk=value).exists():
+            raise serializers.ValidationError("User not found.")
+        return value
+
+
+class ParticipantIdsSerializer(serializers.Serializer):
+    """
+    Either a single "user_id" or a list of "user_ids"
+    """
+
+    user_id = serializers.UUIDField(required=False)
+    user_ids = serializers.ListField(
+        child=serializers.UUIDField(), required=False, allow_empty=False
+    )
+
+    def validate(self, attrs):
+        if "user_id" not in attrs and "user_ids" not in attrs:
+            raise serializers.ValidationError({"error": "User ID is required"})
+        return attrs
+
+
+class InboxEntrySerializer(serializers.ModelSerializer):
+    chat = serializers.UUIDField(source="chat_id")
+    kind = serializers.CharField(source="chat_kind")
+    unread_count = serializers.IntegerField()
+
+    class Meta:
+        model = InboxEntry
+        fields = [
+            "chat",
+            "kind",
+            "last_activity_at",
+            "preview",
+            "last_seq",
+            "last_read_seq",
+            "unread_count",
+        ]
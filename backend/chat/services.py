@@ -0,0 +1,473 @@
+# backend\chat\services.py:
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+#
+import hashlib
+import logging
+import uuid
+
+#
+from .cache import invalidate_membership
+from .models import PersonalChat, GroupChat, InboxEntry, Message, OutboxEvent
+from .outbox import outbox_dispatcher
+from user.models import User
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_LENGTH = 100
+
+
+def message_chat_field(chat):
+    """
+    Name of the Message foreign key that points to the given chat
+    """
+    return "personal_chat" if isinstance(chat, PersonalChat) else "group_chat"
+
+
+def chat_group_name(chat_kind, chat_pk):
+    """
+    Channel layer group that receives the events of one chat
+    """
+    return f"{chat_kind}_chat_{chat_pk}"
+
+
+def make_preview(content):
+    if len(content) > PREVIEW_LENGTH:
+        return f"{content[: PREVIEW_LENGTH - 3]}..."
+    return content
+
+
+def update_last_message(chat, message):
+    """
+    Move the chat's last-message pointer to the message unless a newer one
+    is already recorded. A single conditional UPDATE keeps it race free.
+    """
+    type(chat).objects.filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.created_at),
+        pk=chat.pk,
+    ).update(
+        last_message=message,
+        last_message_preview=make_preview(message.content),
+        last_message_at=message.created_at,
+        updated_at=message.created_at,
+    )
+
+
+def advance_read_seq(chat, user, seq):
+    """
+    Move the user's read watermark forward to seq (never backwards)
+    """
+    membership_model = type(chat).participants.through
+    InboxEntry.objects.filter(chat_id=chat.pk, user=user, last_read_seq__lt=seq).update(
+        last_read_seq=seq
+    )
+    return membership_model.objects.filter(
+        chat=chat.pk, user=user, last_read_seq__lt=seq
+    ).update(last_read_seq=seq)
+
+
+# ~~~~~ Inbox ~~~~~
+
+
+def update_inbox(chat, message):
+    """
+    Fan a new message out to the inbox entries of the chat's participants
+    with one UPDATE. Lazy entries (large groups) are left alone.
+    """
+    InboxEntry.objects.filter(
+        chat_id=chat.pk, lazy=False, last_seq__lt=message.seq
+    ).update(
+        last_seq=message.seq,
+        last_activity_at=message.created_at,
+        preview=make_preview(message.content),
+    )
+
+
+def refresh_inbox_entries(chat_model, entries):
+    """
+    Copy the chat's current state into the given entries (a queryset of one
+    kind of chat) with one UPDATE
+    """
+    chat = chat_model.objects.filter(pk=OuterRef("chat_id"))
+    return entries.update(
+        last_seq=Subquery(chat.values("last_seq")[:1]),
+        preview=Subquery(chat.values("last_message_preview")[:1]),
+        last_activity_at=Subquery(
+            chat.annotate(activity=Coalesce("last_message_at", "created_at")).values(
+                "activity"
+            )[:1]
+        ),
+    )
+
+
+def refresh_lazy_inbox(user):
+    """
+    Bring the user's lazy entries up to date before the inbox is read
+    """
+    refresh_inbox_entries(GroupChat, InboxEntry.objects.filter(user=user, lazy=True))
+
+
+def is_lazy_inbox(chat, participant_count):
+    return (
+        chat.kind == GroupChat.kind
+        and participant_count > settings.CHAT_INBOX_FANOUT_LIMIT
+    )
+
+
+def create_inbox_entries(chat, user_pks):
+    """
+    Inbox entries of new participants, with the chat's current state
+    """
+    if not user_pks:
+        return
+    chat_model = type(chat)
+    membership_model = chat_model.participants.through
+    state = chat_model.objects.filter(pk=chat.pk).values(
+        "last_seq", "last_message_preview", "last_message_at", "created_at"
+    )
+    state = state.first()
+    if state is None:
+        return
+    lazy = is_lazy_inbox(chat, membership_model.objects.filter(chat=chat.pk).count())
+    InboxEntry.objects.bulk_create(
+        [
+            InboxEntry(
+                user_id=user_pk,
+                chat_id=chat.pk,
+                chat_kind=chat.kind,
+                last_activity_at=state["last_message_at"] or state["created_at"],
+                last_seq=state["last_seq"],
+                preview=state["last_message_preview"],
+                lazy=lazy,
+            )
+            for user_pk in user_pks
+        ],
+        ignore_conflicts=True,
+    )
+    set_inbox_mode(chat, lazy)
+
+
+def set_inbox_mode(chat, lazy):
+    """
+    Switch the chat's entries between fan-out on write and lazy refresh.
+    Entries leaving lazy mode are caught up first.
+    """
+    entries = InboxEntry.objects.filter(chat_id=chat.pk).exclude(lazy=lazy)
+    if not lazy:
+        refresh_inbox_entries(type(chat), entries)
+    entries.update(lazy=lazy)
+
+
+def sync_inbox_mode(chat):
+    membership_model = type(chat).participants.through
+    set_inbox_mode(
+        chat,
+        is_lazy_inbox(chat, membership_model.objects.filter(chat=chat.pk).count()),
+    )
+
+
+def sync_inbox(chat):
+    """
+    Create and delete the chat's inbox entries to match its participants,
+    for changes made without chat.services (admin, participants.add/remove)
+    """
+    membership_model = type(chat).participants.through
+    members = set(
+        membership_model.objects.filter(chat=chat.pk).values_list("user", flat=True)
+    )
+    entries = set(
+        InboxEntry.objects.filter(chat_id=chat.pk).values_list("user", flat=True)
+    )
+    if entries - members:
+        InboxEntry.objects.filter(chat_id=chat.pk, user__in=entries - members).delete()
+    if members - entries:
+        create_inbox_entries(chat, members - entries)
+    else:
+        sync_inbox_mode(chat)
+
+
+def mark_read(chat, user, seq=None):
+    """
+    Mark the chat as read by the user up to seq, or up to the newest message.
+    Returns the resulting watermark and unread count, or None if the chat is
+    gone or the user no longer participates in it.
+    """
+    last_seq = (
+        type(chat).objects.filter(pk=chat.pk).values_list("last_seq", flat=True).first()
+    )
+    if last_seq is None:
+        return None
+    seq = last_seq if seq is None else min(seq, last_seq)
+    advance_read_seq(chat, user, seq)
+
+    membership_model = type(chat).participants.through
+    last_read_seq = (
+        membership_model.objects.filter(chat=chat.pk, user=user)
+        .values_list("last_read_seq", flat=True)
+        .first()
+    )
+    if last_read_seq is None:
+        return None
+    return {"last_read_seq": last_read_seq, "unread_count": last_seq - last_read_seq}
+
+
+def add_participants(chat, user_ids):
+    """
+    Add users to the chat with one lookup and one INSERT.
+    Returns (added, already participants, unknown ids) as lists of uuids.
+    """
+    users = User.objects.only("uuid").in_bulk(set(user_ids))
+    unknown = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in users]
+    membership_model = type(chat).participants.through
+
+    with transaction.atomic():
+        existing = set(
+            membership_model.objects.filter(chat=chat.pk, user__in=users).values_list(
+                "user", flat=True
+            )
+        )
+        added = [user_pk for user_pk in users if user_pk not in existing]
+        membership_model.objects.bulk_create(
+            [membership_model(chat_id=chat.pk, user_id=user_pk) for user_pk in added],
+            ignore_conflicts=True,
+        )
+        create_inbox_entries(chat, added)
+
+        # bulk_create sends no m2m_changed, so chat.signals does not run.
+        # Registered inside the block: it runs when the outermost commits.
+        for user_pk in added:
+            invalidate_membership(chat.kind, chat.pk, user_pk)
+    return added, list(existing), unknown
+
+
+def remove_participants(chat, user_ids):
+    """
+    Remove users from the chat with one DELETE.
+    Returns (removed, not participants) as lists of uuids.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    membership_model = type(chat).participants.through
+
+    with transaction.atomic():
+        memberships = membership_model.objects.filter(chat=chat.pk, user__in=user_ids)
+        removed = list(memberships.values_list("user", flat=True))
+        memberships.delete()
+        InboxEntry.objects.filter(chat_id=chat.pk, user__in=removed).delete()
+        sync_inbox_mode(chat)
+
+        for user_pk in removed:
+            invalidate_membership(chat.kind, chat.pk, user_pk)
+    return removed, [user_id for user_id in user_ids if user_id not in removed]
+
+
+def pair_key(user_pk, other_pk):
+    """
+    Order-independent key of a pair of users
+    """
+    first, second = sorted([str(user_pk), str(other_pk)])
+    return hashlib.sha256(f"{first}:{second}".encode()).hexdigest()
+
+
+def open_personal_chat(user_pk, other_pk):
+    """
+    The personal chat of two users, created on first use.
+    Returns (chat, created). Concurrent calls for the same pair race on the
+    unique pair_key; the loser reads the winner's chat.
+    """
+    key = pair_key(user_pk, other_pk)
+    chat = PersonalChat.objects.filter(pair_key=key).first()
+    if chat is not None:
+        return chat, False
+
+    try:
+        with transaction.atomic():
+            chat = PersonalChat.objects.create(pair_key=key)
+            add_participants(chat, [user_pk, other_pk])
+    except IntegrityError:
+        return PersonalChat.objects.get(pair_key=key), False
+    return chat, True
+
+
+def build_message(chat, sender, content):
+    """
+    Unsaved message with its uuid and created_at already assigned
+    """
+    return Message(
+        uuid=uuid.uuid4(),
+        sender=sender,
+        content=content,
+        created_at=timezone.now(),
+        chat_id=chat.pk,
+        chat_kind=chat.kind,
+        **{message_chat_field(chat): chat},
+    )
+
+
+def allocate_seq(chat, count=1):
+    """
+    Reserve ``count`` consecutive sequence numbers of the chat and return the
+    first one. The UPDATE locks the chat row until the surrounding
+    transaction ends, so numbers follow commit order within a chat.
+    """
+    chat_model = type(chat)
+    chat_model.objects.filter(pk=chat.pk).update(last_seq=F("last_seq") + count)
+    last_seq = chat_model.objects.filter(pk=chat.pk).values_list("last_seq", flat=True)
+    return last_seq.get() - count + 1
+
+
+def reserve_seq(chat):
+    """
+    Sequence number for a message written later by the write-behind buffer,
+    so its broadcast is resumable like any other. One short UPDATE, the row
+    lock is released right away.
+    """
+    with transaction.atomic():
+        return allocate_seq(chat)
+
+
+def create_message(chat, sender, content, publish=False):
+    """
+    Create a message in the chat, assign its sequence number and update the
+    chat's denormalized last-message fields in the same transaction.
+    With publish=True the chat_message event goes through the outbox, so
+    WebSocket subscribers get it once the transaction commits.
+    """
+    with transaction.atomic():
+        message = build_message(chat, sender, content)
+        message.seq = allocate_seq(chat)
+        message.save(force_insert=True)
+        update_last_message(chat, message)
+        update_inbox(chat, message)
+        # A sender has read everything up to their own message
+        advance_read_seq(chat, sender, message.seq)
+        if publish:
+            OutboxEvent.objects.create(
+                group_name=chat_group_name(chat.kind, chat.pk),
+                payload=message_event(
+                    chat.kind,
+                    chat.pk,
+                    {
+                        "uuid": message.uuid,
+                        "seq": message.seq,
+                        "content": message.content,
+                        "created_at": message.created_at,
+                    },
+                    sender.uuid,
+                    sender.username,
+                ),
+            )
+            transaction.on_commit(outbox_dispatcher.wake)
+    return message
+
+
+def bulk_create_messages(messages):
+    """
+    Insert prepared messages in one statement, assigning sequence numbers in
+    created_at order to those without one (write-behind messages reserve
+    theirs with reserve_seq) and moving each chat's last-message pointer once.
+
+    Safe to retry: messages whose uuid is already stored are skipped before
+    any sequence number is allocated, so a replayed batch leaves no gaps in
+    last_seq. Messages of chats deleted in the meantime are dropped.
+    Returns the messages that were inserted.
+    """
+    chat_models = {model.kind: model for model in (PersonalChat, GroupChat)}
+
+    with transaction.atomic():
+        stored = set(
+            Message.objects.filter(
+                uuid__in=[message.uuid for message in messages]
+            ).values_list("uuid", flat=True)
+        )
+        by_chat = {}
+        for message in messages:
+            if message.uuid not in stored:
+                key = (chat_models[message.chat_kind], message.chat_id)
+                by_chat.setdefault(key, []).append(message)
+
+        for chat_model in chat_models.values():
+            chat_pks = [pk for model, pk in by_chat if model is chat_model]
+            existing = set(
+                chat_model.objects.filter(pk__in=chat_pks).values_list("pk", flat=True)
+            )
+            for chat_pk in set(chat_pks) - existing:
+                dropped = by_chat.pop((chat_model, chat_pk))
+                logger.warning(
+                    f"Dropping {len(dropped)} messages of deleted "
+                    f"{chat_model.kind} chat {chat_pk}"
+                )
+
+        written = []
+        for (chat_model, chat_pk), chat_messages in by_chat.items():
+            chat_messages.sort(key=lambda message: message.created_at)
+            unnumbered = [message for message in chat_messages if message.seq is None]
+            if unnumbered:
+                first_seq = allocate_seq(chat_model(pk=chat_pk), len(unnumbered))
+                for offset, message in enumerate(unnumbered):
+                    message.seq = first_seq + offset
+            chat_messages.sort(key=lambda message: message.seq)
+            written.extend(chat_messages)
+
+        Message.objects.bulk_create(written)
+        for (chat_model, chat_pk), chat_messages in by_chat.items():
+            chat = chat_model(pk=chat_pk)
+            update_last_message(chat, chat_messages[-1])
+            update_inbox(chat, chat_messages[-1])
+            read_seqs = {}
+            for message in chat_messages:
+                read_seqs[message.sender_id] = message.seq
+            for sender_pk, seq in read_seqs.items():
+                advance_read_seq(chat, sender_pk, seq)
+    return written
+
+
+def message_event(chat_kind, chat_pk, message, sender_uuid, sender_username):
+    """
+    Channel layer event for a chat message, also used for replayed history
+    """
+    return {
+        "type": "chat_message",
+        "kind": str(chat_kind),
+        "chat": str(chat_pk),
+        "uuid": str(message["uuid"]),
+        "seq": message["seq"],
+        "message": message["content"],
+        "sender": str(sender_uuid),
+        "sender_username": sender_username,
+        "created_at": message["created_at"].isoformat(),
+    }
+
+
+def read_event(chat_kind, chat_pk, user_uuid, last_read_seq):
+    """
+    Channel layer event for a moved read watermark
+    """
+    return {
+        "type": "chat_read",
+        "kind": str(chat_kind),
+        "chat": str(chat_pk),
+        "user": str(user_uuid),
+        "seq": last_read_seq,
+    }
+
+
+def get_messages_since(chat_model, chat_pk, since_seq, limit):
+    """
+    Up to ``limit`` events of messages with seq > since_seq, oldest first
+    """
+    rows = (
+        Message.objects.filter(chat_id=chat_pk, seq__gt=since_seq)
+        .order_by("seq")
+        .values("uuid", "seq", "content", "created_at", "sender", "sender__username")
+    )
+    return [
+        message_event(
+            chat_model.kind, chat_pk, row, row["sender"], row["sender__username"]
+        )
+        for row in rows[:limit]
+    ]
@@ -0,0 +1,64 @@
+# backend\chat\signals.py:
+
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+#
+from .cache import invalidate_membership
+from .models import PersonalChat, GroupChat, InboxEntry
+from .services import sync_inbox
+
+
+@receiver(m2m_changed, sender=PersonalChat.participants.through)
+@receiver(m2m_changed, sender=GroupChat.participants.through)
+def invalidate_participants_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop cached memberships touched by participants.add/remove/clear
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+
+    if reverse:
+        # user.personal_chats / user.group_chats side
+        chat_kind = (
+            PersonalChat.kind
+            if sender is PersonalChat.participants.through
+            else GroupChat.kind
+        )
+        if pk_set is None:
+            invalidate_membership(chat_kind, user_uuid=instance.pk)
+        else:
+            for chat_pk in pk_set:
+                invalidate_membership(chat_kind, chat_pk, instance.pk)
+    elif pk_set is None:
+        invalidate_membership(instance.kind, chat_uuid=instance.pk)
+    else:
+        for user_pk in pk_set:
+            invalidate_membership(instance.kind, instance.pk, user_pk)
+
+
+@receiver(m2m_changed, sender=PersonalChat.participants.through)
+@receiver(m2m_changed, sender=GroupChat.participants.through)
+def sync_participants_inbox(sender, instance, action, reverse, pk_set, model, **kwargs):
+    """
+    Keep inbox entries in step with participants.add/remove/clear
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        sync_inbox(instance)
+        return
+    # user.personal_chats / user.group_chats side: model is the chat model
+    if pk_set is None:
+        InboxEntry.objects.filter(user=instance, chat_kind=model.kind).delete()
+    else:
+        for chat_pk in pk_set:
+            sync_inbox(model(pk=chat_pk))
+
+
+@receiver(post_delete, sender=PersonalChat)
+@receiver(post_delete, sender=GroupChat)
+def invalidate_deleted_chat_cache(sender, instance, **kwargs):
+    invalidate_membership(instance.kind, chat_uuid=instance.pk)
+    InboxEntry.objects.filter(chat_id=instance.pk).delete()
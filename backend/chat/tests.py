@@ -1,5 +1,1154 @@
 # backend\chat\tests.py:
 
-from django.test import TestCase
+import json
+import unittest
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+#
+from user.models import User
+from utils.jwt_middleware import get_user_from_token, user_cache
+from utils.ratelimit import TokenBucket, consume_all
+from .consumers import GroupChatConsumer, MultiplexChatConsumer, user_buckets
+from .buffer import message_buffer
+from .cache import get_member_chat_pk, membership_cache, membership_key
+from .lifecycle import DRAIN_CLOSE_CODE, connection_tracker
+from .models import (
+    GroupChat,
+    GroupChatMembership,
+    InboxEntry,
+    Message,
+    OutboxEvent,
+    PersonalChat,
+)
+from .presence import AWAY, OFFLINE, ONLINE, PresenceRegistry, typing_events
+from .outbox import dispatch_outbox, outbox_dispatcher
+from .search import FTS_TABLE, PG_INDEX, fts5_exists, search_messages
+from .services import (
+    build_message,
+    bulk_create_messages,
+    chat_group_name,
+    create_message,
+    mark_read,
+    message_event,
+    add_participants,
+    open_personal_chat,
+    pair_key,
+    remove_participants,
+)
+
+
+def make_user(username):
+    return User.objects.create_user(
+        username=username, email=f"{username}@example.com", password="pw12345!"
+    )
+
+
+async def connect(consumer, user, path="/ws/chat/"):
+    communicator = WebsocketCommunicator(consumer.as_asgi(), path)
+    communicator.scope["user"] = user
+    if "url_route" not in communicator.scope:
+        chat_uuid = communicator.scope["path"].rstrip("/").rsplit("/", 1)[-1]
+        communicator.scope["url_route"] = {"kwargs": {"chat_uuid": chat_uuid}}
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator
+
+
+async def receive_frame(communicator, frame_type):
+    """
+    Next frame of the given type, skipping presence and typing updates
+    """
+    while True:
+        frame = await communicator.receive_json_from()
+        if frame.get("type") == frame_type:
+            return frame
+
+
+class FrameRateLimitTests(TransactionTestCase):
+    def setUp(self):
+        self.user = make_user("alice")
+        user_buckets.clear()
+
+    def test_refused_frame_is_not_charged_to_the_other_bucket(self):
+        connection = TokenBucket(rate=0, burst=2)
+        user = TokenBucket(rate=0, burst=0)
+
+        self.assertFalse(consume_all([connection, user]))
+        self.assertEqual(connection.tokens, 2)
+
+    @override_settings(CHAT_WS_CONNECTION_RATE=0, CHAT_WS_CONNECTION_BURST=3)
+    async def test_frames_over_the_connection_burst_are_refused(self):
+        communicator = await connect(MultiplexChatConsumer, self.user)
+        frame = json.dumps({"type": "unsubscribe", "kind": "group", "chats": []})
+        for _ in range(5):
+            await communicator.send_to(text_data=frame)
+        replies = [await communicator.receive_json_from() for _ in range(5)]
+        await communicator.disconnect()
+
+        self.assertEqual(
+            [reply["type"] for reply in replies], ["unsubscribed"] * 3 + ["error"] * 2
+        )
+        self.assertEqual(replies[-1]["detail"], "Rate limit exceeded.")
+
+    @override_settings(CHAT_WS_USER_RATE=0, CHAT_WS_USER_BURST=2)
+    async def test_user_limit_is_shared_by_sockets(self):
+        first = await connect(MultiplexChatConsumer, self.user)
+        second = await connect(MultiplexChatConsumer, self.user)
+        frame = json.dumps({"type": "unsubscribe", "kind": "group", "chats": []})
+        for communicator in (first, second, second):
+            await communicator.send_to(text_data=frame)
+        replies = [
+            await first.receive_json_from(),
+            await second.receive_json_from(),
+            await second.receive_json_from(),
+        ]
+        await first.disconnect()
+        await second.disconnect()
+
+        self.assertEqual(
+            [reply["type"] for reply in replies],
+            ["unsubscribed", "unsubscribed", "error"],
+        )
+
+
+class ReadWatermarkTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice, self.bob)
+        for number in range(5):
+            create_message(self.chat, self.alice, f"message {number}")
+
+    def test_mark_read_returns_watermark_and_unread_count(self):
+        self.assertEqual(
+            mark_read(self.chat, self.bob, 2), {"last_read_seq": 2, "unread_count": 3}
+        )
+
+    def test_sender_has_read_own_messages(self):
+        self.assertEqual(
+            mark_read(self.chat, self.alice, 0), {"last_read_seq": 5, "unread_count": 0}
+        )
+
+    def test_watermark_never_moves_backwards_or_past_last_seq(self):
+        mark_read(self.chat, self.bob, 4)
+        self.assertEqual(mark_read(self.chat, self.bob, 1)["last_read_seq"], 4)
+        self.assertEqual(mark_read(self.chat, self.bob, 99)["last_read_seq"], 5)
+
+    def test_chat_list_reports_unread_count(self):
+        mark_read(self.chat, self.bob, 3)
+        client = APIClient()
+        client.force_authenticate(self.bob)
+
+        response = client.get("/api/groups/")
+
+        self.assertEqual(response.json()["results"][0]["unread_count"], 2)
+
+    def test_mark_read_after_leaving_the_chat(self):
+        remove_participants(self.chat, [self.bob.uuid])
+
+        self.assertIsNone(mark_read(self.chat, self.bob))
+
+
+class ReadAfterLeavingTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice, self.bob)
+
+    async def test_chat_socket_is_closed(self):
+        communicator = await connect(
+            GroupChatConsumer, self.bob, f"/ws/chat/group/{self.chat.uuid}/"
+        )
+        await database_sync_to_async(remove_participants)(self.chat, [self.bob.uuid])
+
+        await communicator.send_json_to({"type": "read"})
+
+        self.assertEqual(
+            await communicator.receive_output(),
+            {"type": "websocket.close", "code": 4403},
+        )
+
+    async def test_multiplex_subscription_is_dropped(self):
+        communicator = await connect(MultiplexChatConsumer, self.bob)
+        chat = str(self.chat.uuid)
+        await communicator.send_json_to(
+            {"type": "subscribe", "kind": "group", "chats": [chat]}
+        )
+        await communicator.receive_json_from()
+        await database_sync_to_async(remove_participants)(self.chat, [self.bob.uuid])
+
+        await communicator.send_json_to({"type": "read", "kind": "group", "chat": chat})
+        error = await communicator.receive_json_from()
+        await communicator.send_json_to({"type": "read", "kind": "group", "chat": chat})
+        reply = await communicator.receive_json_from()
+        await communicator.disconnect()
+
+        self.assertEqual(
+            error["detail"], "You are no longer a participant of this chat."
+        )
+        self.assertEqual(
+            reply["detail"], "Subscribe to the chat before marking it read."
+        )
+
+
+class OpenPersonalChatTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_either_side_of_a_pair_gets_the_same_chat(self):
+        chat, created = open_personal_chat(self.alice.pk, self.bob.pk)
+        same, created_again = open_personal_chat(self.bob.pk, self.alice.pk)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(chat.pk, same.pk)
+
+    def test_losing_a_creation_race_returns_the_winner(self):
+        winner, _ = open_personal_chat(self.alice.pk, self.bob.pk)
+        first = QuerySet.first
+        calls = []
+
+        def first_misses_once(queryset):
+            calls.append(queryset)
+            return None if len(calls) == 1 else first(queryset)
+
+        with mock.patch.object(QuerySet, "first", first_misses_once):
+            chat, created = open_personal_chat(self.bob.pk, self.alice.pk)
+
+        self.assertFalse(created)
+        self.assertEqual(chat.pk, winner.pk)
+
+    def test_pair_key_is_unique(self):
+        PersonalChat.objects.create(pair_key=pair_key(self.alice.pk, self.bob.pk))
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PersonalChat.objects.create(pair_key=pair_key(self.bob.pk, self.alice.pk))
+
+    def test_open_returns_the_read_watermark(self):
+        chat, _ = open_personal_chat(self.alice.pk, self.bob.pk)
+        for number in range(3):
+            create_message(chat, self.bob, f"message {number}")
+        mark_read(chat, self.alice, 1)
+
+        response = self.client.post(
+            "/api/personal/open/", {"user_id": str(self.bob.pk)}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["last_read_seq"], 1)
+        self.assertEqual(response.json()["unread_count"], 2)
+
+    def test_open_rejects_unknown_and_self(self):
+        for user_id in (uuid.uuid4(), self.alice.pk):
+            response = self.client.post(
+                "/api/personal/open/", {"user_id": str(user_id)}, format="json"
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(PersonalChat.objects.exists())
+
+    def test_create_rejects_unknown_and_self(self):
+        for participant_ids in ([uuid.uuid4()], [self.alice.pk], []):
+            response = self.client.post(
+                "/api/personal/",
+                {"participant_ids": [str(user_id) for user_id in participant_ids]},
+                format="json",
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(PersonalChat.objects.exists())
+
+    def test_create_returns_existing_chat_of_the_pair(self):
+        data = {"participant_ids": [str(self.bob.pk)]}
+
+        created = self.client.post("/api/personal/", data, format="json")
+        existing = self.client.post("/api/personal/", data, format="json")
+
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(existing.status_code, 200)
+        self.assertEqual(created.json()["uuid"], existing.json()["uuid"])
+
+
+class SequenceTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice, self.bob)
+
+    def test_create_message_assigns_consecutive_seqs(self):
+        seqs = [create_message(self.chat, self.alice, str(n)).seq for n in range(3)]
+
+        self.chat.refresh_from_db()
+        self.assertEqual(seqs, [1, 2, 3])
+        self.assertEqual(self.chat.last_seq, 3)
+
+    def test_backfill_numbers_legacy_messages_before_new_ones(self):
+        start = timezone.now() - timedelta(days=1)
+        legacy = [
+            Message.objects.create(
+                group_chat=self.chat,
+                sender=self.alice,
+                content=str(n),
+                created_at=start + timedelta(minutes=n),
+            )
+            for n in range(3)
+        ]
+        new = [create_message(self.chat, self.bob, str(n)) for n in range(2)]
+        mark_read(self.chat, self.alice, 1)
+
+        call_command("backfill_message_seq", stdout=StringIO())
+
+        seqs = dict(Message.objects.values_list("uuid", "seq"))
+        self.assertEqual(
+            [seqs[message.uuid] for message in legacy + new], [1, 2, 3, 4, 5]
+        )
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.last_seq, 5)
+        membership = GroupChatMembership.objects.get(chat=self.chat, user=self.alice)
+        self.assertEqual(membership.last_read_seq, 4)
+        self.assertEqual(create_message(self.chat, self.bob, "next").seq, 6)
+
+
+class ResumableStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice)
+        self.sent = [create_message(self.chat, self.alice, str(n)) for n in range(3)]
+        user_buckets.clear()
+
+    def live_event(self, message):
+        return message_event(
+            GroupChat.kind,
+            self.chat.pk,
+            {
+                "uuid": message.uuid,
+                "seq": message.seq,
+                "content": message.content,
+                "created_at": message.created_at,
+            },
+            self.alice.uuid,
+            self.alice.username,
+        )
+
+    async def test_reconnect_replays_the_gap_and_skips_duplicates(self):
+        communicator = await connect(
+            GroupChatConsumer,
+            self.alice,
+            f"/ws/chat/group/{self.chat.uuid}/?since_seq=1",
+        )
+        replayed = [await communicator.receive_json_from() for _ in range(2)]
+        done = await communicator.receive_json_from()
+        # A live event already covered by the replay, then a new one
+        newer = await database_sync_to_async(create_message)(self.chat, self.alice, "3")
+        group_name = chat_group_name(GroupChat.kind, self.chat.pk)
+        for message in (self.sent[-1], newer):
+            await get_channel_layer().group_send(group_name, self.live_event(message))
+        live = await communicator.receive_json_from()
+        nothing = await communicator.receive_nothing()
+        await communicator.disconnect()
+
+        self.assertEqual([frame["seq"] for frame in replayed], [2, 3])
+        self.assertEqual((done["type"], done["seq"]), ("replay_done", 3))
+        self.assertEqual((live["seq"], live["message"]), (4, "3"))
+        self.assertTrue(nothing)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice)
+
+    def test_dispatch_sends_events_in_order_and_deletes_them(self):
+        for number in range(3):
+            create_message(self.chat, self.alice, str(number), publish=True)
+        layer = mock.Mock(group_send=mock.AsyncMock())
+
+        with mock.patch("chat.outbox.get_channel_layer", return_value=layer):
+            sent = dispatch_outbox(10)
+
+        self.assertEqual(sent, 3)
+        self.assertEqual(
+            [call.args[1]["seq"] for call in layer.group_send.call_args_list], [1, 2, 3]
+        )
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_rolled_back_message_leaves_no_event(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            create_message(self.chat, self.alice, "lost", publish=True)
+            raise RuntimeError
+
+        self.chat.refresh_from_db()
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertFalse(Message.objects.exists())
+        self.assertEqual(self.chat.last_seq, 0)
+
+
+class StartupTests(TransactionTestCase):
+    def setUp(self):
+        from core import lifespan
+
+        started = mock.patch.object(lifespan, "_started", False)
+        started.start()
+        self.addCleanup(started.stop)
+
+    async def test_first_http_request_starts_the_dispatcher(self):
+        # Servers without lifespan events (daphne) never call the hooks
+        from core.asgi import application
+
+        communicator = HttpCommunicator(application, "GET", "/api/missing/")
+        try:
+            await communicator.get_response()
+            self.assertIsNotNone(outbox_dispatcher._task)
+            self.assertFalse(outbox_dispatcher._task.done())
+        finally:
+            await outbox_dispatcher.stop()
+            await connection_tracker.stop()
+
+
+class BulkCreateMessagesTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice)
+
+    def build(self, content, delay=0):
+        message = build_message(self.chat, self.alice, content)
+        message.created_at += timedelta(seconds=delay)
+        return message
+
+    def test_seqs_follow_created_at(self):
+        late, early = self.build("late", 1), self.build("early")
+
+        bulk_create_messages([late, early])
+
+        self.assertEqual((early.seq, late.seq), (1, 2))
+
+    def test_replayed_batch_leaves_no_gap(self):
+        batch = [self.build(str(number), number) for number in range(3)]
+        bulk_create_messages(batch)
+
+        self.assertEqual(bulk_create_messages(batch), [])
+        self.assertEqual(create_message(self.chat, self.alice, "next").seq, 4)
+
+    def test_messages_of_deleted_chat_are_dropped(self):
+        message = self.build("orphan")
+        self.chat.delete()
+
+        with self.assertLogs("chat.services", "WARNING"):
+            self.assertEqual(bulk_create_messages([message]), [])
+        self.assertFalse(Message.objects.exists())
+
+
+@override_settings(CHAT_WRITE_BEHIND=True)
+class WriteBehindTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice)
+        # Nothing is flushed on a timer during the test
+        for name, value in (("flush_interval", 60), ("batch_size", 1000)):
+            patcher = mock.patch.object(message_buffer, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def send_messages(self, count):
+        communicator = await connect(
+            GroupChatConsumer, self.alice, f"/ws/chat/group/{self.chat.uuid}/"
+        )
+        for number in range(count):
+            await communicator.send_json_to({"message": str(number)})
+        frames = [await communicator.receive_json_from() for _ in range(count)]
+        await communicator.disconnect()
+        return frames
+
+    def test_buffer_is_written_when_the_process_exits(self):
+        from core.asgi import exit_hooks
+        from core.lifespan import run_exit_hooks
+
+        self.assertIn(message_buffer.drain_sync, exit_hooks)
+        # The event loop stops without a lifespan shutdown, as under daphne
+        async_to_sync(self.send_messages)(3)
+        self.assertFalse(Message.objects.exists())
+
+        run_exit_hooks()
+
+        self.assertEqual(
+            sorted(Message.objects.values_list("content", flat=True)), ["0", "1", "2"]
+        )
+        self.assertEqual(message_buffer.pending, [])
+
+    def test_broadcast_frames_carry_the_stored_seq(self):
+        frames = async_to_sync(self.send_messages)(3)
+        message_buffer.drain_sync()
+
+        self.assertEqual([frame["seq"] for frame in frames], [1, 2, 3])
+        self.assertEqual(
+            {frame["uuid"]: frame["seq"] for frame in frames},
+            {
+                str(message_uuid): seq
+                for message_uuid, seq in Message.objects.values_list("uuid", "seq")
+            },
+        )
+        self.chat.refresh_from_db()
+        self.assertEqual(self.chat.last_seq, 3)
+
+
+class JWTAuthMiddlewareTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        user_cache.clear()
+
+    async def connect_with(self, token):
+        from core.asgi import application
+
+        communicator = WebsocketCommunicator(application, f"/ws/chat/?token={token}")
+        connected, code = await communicator.connect()
+        if connected:
+            await communicator.disconnect()
+        return connected, code
+
+    def test_valid_token_connects_and_caches_the_user(self):
+        token = str(AccessToken.for_user(self.alice))
+
+        self.assertEqual(async_to_sync(self.connect_with)(token), (True, None))
+        with self.assertNumQueries(0):
+            user = async_to_sync(get_user_from_token)(token)
+        self.assertEqual(user.pk, self.alice.pk)
+
+    def test_expired_token_is_rejected(self):
+        token = AccessToken.for_user(self.alice)
+        token.set_exp(lifetime=-timedelta(minutes=1))
+
+        self.assertEqual(async_to_sync(self.connect_with)(str(token)), (False, 4003))
+
+    def test_bad_signature_is_rejected(self):
+        payload = AccessToken.for_user(self.alice).payload
+        token = jwt.encode(payload, "not-the-signing-key", algorithm="HS256")
+
+        self.assertEqual(async_to_sync(self.connect_with)(token), (False, 4003))
+
+    def test_inactive_user_is_rejected(self):
+        self.alice.is_active = False
+        self.alice.save()
+        token = str(AccessToken.for_user(self.alice))
+
+        self.assertEqual(async_to_sync(self.connect_with)(token), (False, 4003))
+
+    def test_deactivation_and_deletion_drop_the_cached_user(self):
+        token = str(AccessToken.for_user(self.alice))
+        async_to_sync(get_user_from_token)(token)
+
+        self.alice.is_active = False
+        self.alice.save(update_fields=["is_active"])
+        self.assertTrue(async_to_sync(get_user_from_token)(token).is_anonymous)
+
+        self.alice.is_active = True
+        self.alice.save(update_fields=["is_active"])
+        self.assertFalse(async_to_sync(get_user_from_token)(token).is_anonymous)
+        self.alice.delete()
+        self.assertTrue(async_to_sync(get_user_from_token)(token).is_anonymous)
+
+
+class MessageKeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice)
+        # Three messages share each timestamp, so uuid breaks the ties
+        start = timezone.now()
+        for number in range(7):
+            message = create_message(self.chat, self.alice, str(number))
+            Message.objects.filter(pk=message.pk).update(
+                created_at=start + timedelta(seconds=number // 3)
+            )
+        self.ordered = [
+            str(message_uuid)
+            for message_uuid in Message.objects.order_by(
+                "created_at", "uuid"
+            ).values_list("uuid", flat=True)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def page(self, **params):
+        response = self.client.get(f"/api/groups/{self.chat.pk}/messages/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def uuids(self, page):
+        return [message["uuid"] for message in page["results"]]
+
+    def test_latest_page(self):
+        page = self.page(limit=3)
+
+        self.assertEqual(self.uuids(page), self.ordered[4:])
+        self.assertEqual(page["before"], self.ordered[4])
+        self.assertIsNone(page["after"])
+
+    def test_before_excludes_the_anchor(self):
+        page = self.page(before=self.ordered[4], limit=2)
+
+        self.assertEqual(self.uuids(page), self.ordered[2:4])
+        self.assertEqual(page["before"], self.ordered[2])
+        self.assertEqual(page["after"], self.ordered[3])
+
+    def test_before_reaching_the_start(self):
+        page = self.page(before=self.ordered[2], limit=5)
+
+        self.assertEqual(self.uuids(page), self.ordered[:2])
+        self.assertIsNone(page["before"])
+
+    def test_after_excludes_the_anchor(self):
+        page = self.page(after=self.ordered[1], limit=2)
+
+        self.assertEqual(self.uuids(page), self.ordered[2:4])
+        self.assertEqual(page["after"], self.ordered[3])
+
+    def test_after_reaching_the_end(self):
+        page = self.page(after=self.ordered[4], limit=5)
+
+        self.assertEqual(self.uuids(page), self.ordered[5:])
+        self.assertIsNone(page["after"])
+
+    def test_around_includes_the_anchor(self):
+        page = self.page(around=self.ordered[3], limit=4)
+
+        self.assertEqual(self.uuids(page), self.ordered[2:6])
+
+    def test_chained_pages_cover_the_history_once(self):
+        page = self.page(limit=3)
+        seen = self.uuids(page)
+        while page["before"]:
+            page = self.page(before=page["before"], limit=3)
+            seen = self.uuids(page) + seen
+
+        self.assertEqual(seen, self.ordered)
+
+    def test_two_anchors_are_rejected(self):
+        response = self.client.get(
+            f"/api/groups/{self.chat.pk}/messages/",
+            {"before": self.ordered[1], "after": self.ordered[2]},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_anchor_is_not_found(self):
+        response = self.client.get(
+            f"/api/groups/{self.chat.pk}/messages/", {"before": str(uuid.uuid4())}
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+
+class MembershipCacheTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice)
+        membership_cache.clear()
+
+    def test_hit_needs_no_query(self):
+        get_member_chat_pk(GroupChat, self.chat.pk, self.alice.pk)
+
+        with self.assertNumQueries(0):
+            chat_pk = get_member_chat_pk(GroupChat, self.chat.pk, self.alice.pk)
+        self.assertEqual(chat_pk, self.chat.pk)
+
+    def test_cached_miss_is_forgotten_when_the_add_commits(self):
+        self.assertIsNone(get_member_chat_pk(GroupChat, self.chat.pk, self.bob.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            add_participants(self.chat, [self.bob.pk])
+
+        self.assertEqual(
+            get_member_chat_pk(GroupChat, self.chat.pk, self.bob.pk), self.chat.pk
+        )
+
+    def test_removal_is_forgotten_only_after_commit(self):
+        key = membership_key(GroupChat.kind, self.chat.pk, self.alice.pk)
+        get_member_chat_pk(GroupChat, self.chat.pk, self.alice.pk)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            remove_participants(self.chat, [self.alice.pk])
+            self.assertIn(key, membership_cache)
+        for callback in callbacks:
+            callback()
+
+        self.assertNotIn(key, membership_cache)
+        self.assertIsNone(get_member_chat_pk(GroupChat, self.chat.pk, self.alice.pk))
+
+    def test_rest_access_follows_membership(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+        url = f"/api/groups/{self.chat.pk}/messages/"
+        self.assertEqual(client.get(url).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            remove_participants(self.chat, [self.alice.pk])
+
+        self.assertEqual(client.get(url).status_code, 404)
+
+
+class MultiplexConsumerTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.team = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.team.participants.add(self.alice, self.bob)
+        self.other = GroupChat.objects.create(name="other", created_by=self.bob)
+        self.other.participants.add(self.bob)
+        user_buckets.clear()
+
+    async def subscribe(self, communicator, chats):
+        await communicator.send_json_to(
+            {"type": "subscribe", "kind": "group", "chats": chats}
+        )
+        return await communicator.receive_json_from()
+
+    async def test_subscribe_rejects_foreign_and_malformed_chats(self):
+        communicator = await connect(MultiplexChatConsumer, self.alice)
+        reply = await self.subscribe(
+            communicator, [str(self.team.pk), str(self.other.pk), "not-a-uuid"]
+        )
+        await communicator.disconnect()
+
+        self.assertEqual(reply["type"], "subscribed")
+        self.assertEqual(reply["chats"], [str(self.team.pk)])
+        self.assertEqual(reply["rejected"], [str(self.other.pk), "not-a-uuid"])
+
+    async def test_messages_follow_subscriptions(self):
+        alice = await connect(MultiplexChatConsumer, self.alice)
+        bob = await connect(MultiplexChatConsumer, self.bob)
+        await self.subscribe(alice, [str(self.team.pk)])
+        await self.subscribe(bob, [str(self.team.pk)])
+        team = {"kind": "group", "chat": str(self.team.pk)}
+
+        await bob.send_json_to({"type": "message", **team, "message": "hello"})
+        received = await receive_frame(alice, "message")
+        await receive_frame(bob, "message")
+        await alice.send_json_to(
+            {"type": "unsubscribe", "kind": "group", "chats": [str(self.team.pk)]}
+        )
+        unsubscribed = await receive_frame(alice, "unsubscribed")
+        await bob.send_json_to({"type": "message", **team, "message": "gone"})
+        await receive_frame(bob, "message")
+        nothing = await alice.receive_nothing()
+        await alice.disconnect()
+        await bob.disconnect()
+
+        self.assertEqual(received["message"], "hello")
+        self.assertEqual(received["chat"], str(self.team.pk))
+        self.assertEqual(unsubscribed["chats"], [str(self.team.pk)])
+        self.assertTrue(nothing)
+
+    async def test_unsubscribed_chat_refuses_messages(self):
+        communicator = await connect(MultiplexChatConsumer, self.alice)
+        await communicator.send_json_to(
+            {
+                "type": "message",
+                "kind": "group",
+                "chat": str(self.team.pk),
+                "message": "x",
+            }
+        )
+        reply = await communicator.receive_json_from()
+        await communicator.disconnect()
+
+        self.assertEqual(
+            reply["detail"], "Subscribe to the chat before sending messages."
+        )
+
+    async def test_chats_must_be_a_list_of_strings(self):
+        communicator = await connect(MultiplexChatConsumer, self.alice)
+        await communicator.send_json_to(
+            {"type": "subscribe", "kind": "group", "chats": {"a": 1}}
+        )
+        reply = await communicator.receive_json_from()
+        await communicator.disconnect()
+
+        self.assertEqual(reply["detail"], "chats must be a list of chat uuids.")
+
+
+class PresenceRegistryTests(unittest.TestCase):
+    def test_status_follows_the_freshest_sockets(self):
+        registry = PresenceRegistry(ttl=60)
+
+        self.assertEqual(registry.update("u", "a"), ONLINE)
+        self.assertIsNone(registry.update("u", "b", AWAY))
+        self.assertEqual(registry.update("u", "a", AWAY), AWAY)
+        self.assertEqual(registry.status("u"), AWAY)
+        self.assertIsNone(registry.remove("u", "a"))
+        self.assertEqual(registry.remove("u", "b"), OFFLINE)
+        self.assertEqual(registry.snapshot(), {})
+
+    def test_silent_sockets_stop_counting(self):
+        registry = PresenceRegistry(ttl=0)
+        registry.update("u", "a")
+
+        with mock.patch("chat.presence.time.monotonic", return_value=10**9):
+            self.assertEqual(registry.status("u"), OFFLINE)
+
+
+class TypingAndPresenceTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice, self.bob)
+        self.path = f"/ws/chat/group/{self.chat.uuid}/"
+        user_buckets.clear()
+
+    @mock.patch.object(typing_events, "interval", 0.2)
+    async def test_typing_bursts_are_sent_once(self):
+        alice = await connect(GroupChatConsumer, self.alice, self.path)
+        bob = await connect(GroupChatConsumer, self.bob, self.path)
+        for _ in range(5):
+            await bob.send_json_to({"type": "typing"})
+        typing = await receive_frame(alice, "typing")
+        nothing = await alice.receive_nothing(timeout=0.3)
+        await alice.disconnect()
+        await bob.disconnect()
+
+        self.assertEqual(
+            typing["users"], [{"uuid": str(self.bob.uuid), "username": "bob"}]
+        )
+        self.assertTrue(nothing)
+
+    async def test_presence_changes_reach_other_participants(self):
+        alice = await connect(GroupChatConsumer, self.alice, self.path)
+        bob = await connect(GroupChatConsumer, self.bob, self.path)
+        online = await receive_frame(alice, "presence")
+        await bob.send_json_to({"type": "presence", "status": "away"})
+        away = await receive_frame(alice, "presence")
+        await bob.disconnect()
+        offline = await receive_frame(alice, "presence")
+        await alice.disconnect()
+
+        self.assertEqual(
+            online, {"type": "presence", "user": str(self.bob.uuid), "status": ONLINE}
+        )
+        self.assertEqual(away["status"], AWAY)
+        self.assertEqual(offline["status"], OFFLINE)
+
+    async def test_malformed_frames_get_an_error(self):
+        communicator = await connect(GroupChatConsumer, self.alice, self.path)
+        details = []
+        for text_data in ("{", "[1]", '{"type": "dance"}', '{"message": ""}'):
+            await communicator.send_to(text_data=text_data)
+            details.append((await receive_frame(communicator, "error"))["detail"])
+        await communicator.disconnect()
+
+        self.assertEqual(
+            details,
+            [
+                "Invalid JSON.",
+                "Frame must be a JSON object.",
+                "Unknown frame type.",
+                "Message must be a non-empty string.",
+            ],
+        )
+
+
+async def receive_close(communicator):
+    """
+    Close code of the socket, skipping the frames sent before it
+    """
+    while True:
+        output = await communicator.receive_output()
+        if output["type"] == "websocket.close":
+            return output["code"]
+
+
+class ConnectionLifecycleTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice)
+        self.path = f"/ws/chat/group/{self.chat.uuid}/"
+        user_buckets.clear()
+
+    @override_settings(CHAT_WS_HEARTBEAT_INTERVAL=0.05, CHAT_WS_IDLE_TIMEOUT=10)
+    async def test_server_pings_live_sockets(self):
+        communicator = await connect(GroupChatConsumer, self.alice, self.path)
+        ping = await receive_frame(communicator, "ping")
+        await communicator.disconnect()
+
+        self.assertEqual(ping, {"type": "ping"})
+
+    @override_settings(CHAT_WS_HEARTBEAT_INTERVAL=0.05, CHAT_WS_IDLE_TIMEOUT=0.1)
+    async def test_silent_socket_is_reaped(self):
+        communicator = await connect(GroupChatConsumer, self.alice, self.path)
+        code = await receive_close(communicator)
+
+        self.assertEqual(code, 4009)
+        self.assertEqual(connection_tracker.consumers, set())
+
+    async def test_drain_asks_clients_to_reconnect(self):
+        self.addCleanup(setattr, connection_tracker, "draining", False)
+        communicator = await connect(GroupChatConsumer, self.alice, self.path)
+        connection_tracker.draining = True
+        await connection_tracker.drain(period=0)
+        reconnect = await receive_frame(communicator, "reconnect")
+        code = await receive_close(communicator)
+        refused = WebsocketCommunicator(GroupChatConsumer.as_asgi(), self.path)
+        refused.scope["user"] = self.alice
+        refused.scope["url_route"] = {"kwargs": {"chat_uuid": str(self.chat.uuid)}}
+        connected, refused_code = await refused.connect()
+
+        self.assertLessEqual(reconnect["retry_after"], connection_tracker.jitter)
+        self.assertEqual(code, DRAIN_CLOSE_CODE)
+        self.assertFalse(connected)
+        self.assertEqual(refused_code, DRAIN_CLOSE_CODE)
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.carol = make_user("carol")
+        self.team = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.team.participants.add(self.alice, self.bob)
+        self.personal, _ = open_personal_chat(self.alice.pk, self.bob.pk)
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def inbox(self):
+        response = self.client.get("/api/inbox/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_messages_fan_out_to_every_entry(self):
+        create_message(self.team, self.alice, "morning")
+        create_message(self.personal, self.alice, "psst")
+        create_message(self.personal, self.alice, "are you there?")
+
+        inbox = self.inbox()
+
+        self.assertEqual(
+            [
+                (entry["chat"], entry["preview"], entry["unread_count"])
+                for entry in inbox
+            ],
+            [
+                (str(self.personal.pk), "are you there?", 2),
+                (str(self.team.pk), "morning", 1),
+            ],
+        )
+        self.assertEqual(
+            InboxEntry.objects.filter(chat_id=self.team.pk, last_seq=1).count(), 2
+        )
+
+    def test_read_watermark_clears_unread_count(self):
+        message = create_message(self.team, self.alice, "morning")
+        mark_read(self.team, self.bob, message.seq)
+
+        entry = next(e for e in self.inbox() if e["chat"] == str(self.team.pk))
+
+        self.assertEqual(entry["last_read_seq"], 1)
+        self.assertEqual(entry["unread_count"], 0)
+
+    @override_settings(CHAT_INBOX_FANOUT_LIMIT=2)
+    def test_large_group_entries_are_refreshed_on_read(self):
+        self.team.participants.add(self.carol)
+        create_message(self.team, self.alice, "all hands")
+        stored = InboxEntry.objects.get(chat_id=self.team.pk, user=self.bob)
+
+        entry = next(e for e in self.inbox() if e["chat"] == str(self.team.pk))
+
+        self.assertTrue(stored.lazy)
+        self.assertEqual(stored.last_seq, 0)
+        self.assertEqual(entry["last_seq"], 1)
+        self.assertEqual(entry["preview"], "all hands")
+
+    @override_settings(CHAT_INBOX_FANOUT_LIMIT=2)
+    def test_shrinking_group_goes_back_to_fan_out(self):
+        self.team.participants.add(self.carol)
+        create_message(self.team, self.alice, "all hands")
+        self.team.participants.remove(self.carol)
+        create_message(self.team, self.alice, "just us")
+
+        entries = InboxEntry.objects.filter(chat_id=self.team.pk)
+
+        self.assertEqual(entries.count(), 2)
+        self.assertFalse(entries.filter(lazy=True).exists())
+        self.assertEqual(set(entries.values_list("last_seq", flat=True)), {2})
+
+
+class BulkParticipantTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.users = [make_user(f"user{number}") for number in range(3)]
+        self.chat = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.chat.participants.add(self.alice)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+        self.url = f"/api/groups/{self.chat.pk}/"
+
+    def test_add_reports_added_existing_and_unknown(self):
+        unknown = uuid.uuid4()
+        user_ids = [user.pk for user in self.users] + [self.alice.pk, unknown]
+
+        solo = make_user("solo")
+        with CaptureQueriesContext(connection) as one_user:
+            add_participants(self.chat, [solo.pk])
+        # Same number of statements however many users are added
+        with self.assertNumQueries(len(one_user)):
+            added, existing, missing = add_participants(self.chat, user_ids)
+
+        self.assertCountEqual(added, [user.pk for user in self.users])
+        self.assertEqual(existing, [self.alice.pk])
+        self.assertEqual(missing, [unknown])
+        self.assertEqual(self.chat.participants.count(), 5)
+
+    def test_create_group_adds_everyone_at_once(self):
+        unknown = str(uuid.uuid4())
+        response = self.client.post(
+            "/api/groups/",
+            {
+                "name": "new",
+                "participant_ids": [str(user.pk) for user in self.users] + [unknown],
+            },
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["unknown_participant_ids"], [unknown])
+        chat = GroupChat.objects.get(pk=response.json()["uuid"])
+        self.assertEqual(chat.participants.count(), 4)
+
+    def test_add_and_remove_lists_over_rest(self):
+        user_ids = [str(user.pk) for user in self.users]
+        unknown = str(uuid.uuid4())
+
+        added = self.client.post(
+            f"{self.url}add_participant/",
+            {"user_ids": user_ids + [unknown]},
+            format="json",
+        ).json()
+        removed = self.client.delete(
+            f"{self.url}remove_participant/",
+            {"user_ids": user_ids[:2] + [unknown]},
+            format="json",
+        ).json()
+
+        self.assertCountEqual(added["added"], user_ids)
+        self.assertEqual(added["unknown"], [unknown])
+        self.assertCountEqual(removed["removed"], user_ids[:2])
+        self.assertEqual(removed["not_participants"], [unknown])
+        self.assertEqual(
+            list(self.chat.participants.order_by("username")),
+            [self.alice, self.users[2]],
+        )
+
+    def test_single_unknown_user_is_not_found(self):
+        response = self.client.post(
+            f"{self.url}add_participant/", {"user_id": str(uuid.uuid4())}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_creator_cannot_be_removed(self):
+        response = self.client.delete(
+            f"{self.url}remove_participant/",
+            {"user_ids": [str(self.alice.pk)]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(self.chat.participants.filter(pk=self.alice.pk).exists())
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        self.alice = make_user("alice")
+        self.bob = make_user("bob")
+        self.team = GroupChat.objects.create(name="team", created_by=self.alice)
+        self.team.participants.add(self.alice, self.bob)
+        self.private = GroupChat.objects.create(name="private", created_by=self.bob)
+        self.private.participants.add(self.bob)
+        self.deploy = create_message(self.team, self.alice, "deploy the release today")
+        self.release = create_message(self.team, self.bob, "release notes are ready")
+        create_message(self.private, self.bob, "secret release plan")
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def search(self, query, **params):
+        response = self.client.get("/api/groups/search/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [message["content"] for message in response.json()["results"]]
+
+    def test_only_the_users_chats_are_searched(self):
+        self.assertCountEqual(
+            self.search("release"),
+            ["deploy the release today", "release notes are ready"],
+        )
+
+    def test_every_word_must_match_and_the_last_is_a_prefix(self):
+        self.assertEqual(self.search("release tod"), ["deploy the release today"])
+        self.assertEqual(self.search("release missing"), [])
+
+    def test_search_within_one_chat(self):
+        other = GroupChat.objects.create(name="other", created_by=self.alice)
+        other.participants.add(self.alice)
+        create_message(other, self.alice, "another release")
+
+        self.assertEqual(len(self.search("release", chat=str(other.pk))), 1)
+        response = self.client.get(
+            "/api/groups/search/", {"q": "release", "chat": str(self.private.pk)}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_index_follows_edits_and_deletes(self):
+        Message.objects.filter(pk=self.deploy.pk).update(content="rollback now")
+        self.release.delete()
+
+        self.assertEqual(self.search("rollback"), ["rollback now"])
+        self.assertEqual(self.search("release"), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('release" OR "secret'), [])
+        self.assertEqual(
+            self.client.get("/api/groups/search/", {"q": "   "}).status_code, 400
+        )
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "SQLite FTS5 index")
+    def test_sqlite_uses_the_fts5_index(self):
+        with connection.cursor() as cursor:
+            self.assertTrue(fts5_exists(cursor))
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+            self.assertEqual(cursor.fetchone()[0], 3)
+        hits = search_messages(GroupChat, self.alice, "release")
+        self.assertTrue(all(rank > 0 for _, rank in hits))
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "PostgreSQL GIN index")
+    def test_postgresql_uses_the_gin_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", [PG_INDEX])
+            self.assertIsNotNone(cursor.fetchone())
+        hits = search_messages(GroupChat, self.alice, "release")
+        self.assertEqual(len(hits), 2)
+        self.assertTrue(all(rank > 0 for _, rank in hits))
@@ -9,5 +9,7 @@ router.register(r"personal", views.PersonalChatViewSet, basename="personal-chat"
 router.register(r"groups", views.GroupChatViewSet, basename="group-chat")
 
 urlpatterns = [
+    path("inbox/", views.InboxView.as_view(), name="inbox"),
+    path("chat/metrics/", views.ChatMetricsView.as_view(), name="chat-metrics"),
     path("", include(router.urls)),
 ]
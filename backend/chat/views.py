@@ -2,32 +2,201 @@
 
 from rest_framework import viewsets, status, mixins
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
-from django.shortcuts import get_object_or_404
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.generics import ListAPIView
+from rest_framework.views import APIView
+from django.db.models import F, Prefetch
 
-from .models import PersonalChat, GroupChat, Message
+from .models import PersonalChat, GroupChat, InboxEntry, Message
+from .pagination import InboxKeysetPagination, MessageKeysetPagination
+from .services import (
+    create_message,
+    mark_read,
+    add_participants,
+    remove_participants,
+    open_personal_chat,
+    refresh_lazy_inbox,
+)
+from .cache import get_member_chat_pk
+from .search import search_messages
+from .presence import presence_registry
+from utils.metrics import counters
+from user.models import User
+from user.serializers import UserSerializer
 from .serializers import (
     PersonalChatSerializer,
     GroupChatSerializer,
     MessageSerializer,
+    CompactMessageSerializer,
+    MessageSearchResultSerializer,
     CreatePersonalChatSerializer,
     CreateGroupChatSerializer,
+    ParticipantIdsSerializer,
+    OpenPersonalChatSerializer,
+    InboxEntrySerializer,
 )
 
 
+class ChatMembershipMixin:
+    """
+    Access check for per-chat actions through the membership cache.
+    Returns an unsaved chat stub carrying only the primary key.
+    """
+
+    chat_model = None
+
+    def get_member_chat(self):
+        chat_pk = get_member_chat_pk(
+            self.chat_model, self.kwargs["pk"], self.request.user.uuid
+        )
+        if chat_pk is None:
+            raise NotFound()
+        return self.chat_model(pk=chat_pk)
+
+    def is_compact(self):
+        return self.request.query_params.get("compact", "").lower() in ("1", "true")
+
+    def get_messages_response(self, messages):
+        """
+        One page of chat history. With ?compact=true every sender is
+        serialized once in "users" and messages only carry sender_id.
+        """
+        paginator = MessageKeysetPagination()
+        if not self.is_compact():
+            page = paginator.paginate_queryset(
+                messages.select_related("sender__primary_avatar"),
+                self.request,
+                view=self,
+            )
+            return paginator.get_paginated_response(
+                MessageSerializer(page, many=True).data
+            )
+
+        page = paginator.paginate_queryset(messages, self.request, view=self)
+        senders = User.objects.with_avatars().filter(
+            uuid__in={message.sender_id for message in page}
+        )
+        response = paginator.get_paginated_response(
+            CompactMessageSerializer(page, many=True).data
+        )
+        response.data["users"] = {
+            str(user.uuid): UserSerializer(user).data for user in senders
+        }
+        return response
+
+    def get_search_response(self):
+        """
+        Full-text search over the user's chats of this kind, best match first.
+        Query params: q, chat (optional uuid), limit, offset.
+        """
+        params = self.request.query_params
+        query = params.get("q", "").strip()
+        if not query:
+            return Response(
+                {"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = max(1, min(int(params.get("limit", 20)), 100))
+            offset = max(0, min(int(params.get("offset", 0)), 1000))
+        except ValueError:
+            return Response(
+                {"error": "limit and offset must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        chat_pk = None
+        if params.get("chat"):
+            chat_pk = get_member_chat_pk(
+                self.chat_model, params["chat"], self.request.user.uuid
+            )
+            if chat_pk is None:
+                raise NotFound()
+
+        hits = search_messages(
+            self.chat_model, self.request.user, query, chat_pk, limit + 1, offset
+        )
+        has_more = len(hits) > limit
+        hits = hits[:limit]
+        messages = Message.objects.select_related("sender__primary_avatar").in_bulk(
+            [message_uuid for message_uuid, _ in hits]
+        )
+        results = []
+        for message_uuid, rank in hits:
+            message = messages.get(message_uuid)
+            if message is not None:
+                message.rank = rank
+                results.append(message)
+        return Response(
+            {
+                "results": MessageSearchResultSerializer(results, many=True).data,
+                "next_offset": offset + limit if has_more else None,
+            }
+        )
+
+    def get_presence_response(self):
+        """
+        {chat uuid: {user uuid: "online" | "away"}} over the user's chats of
+        this kind, from the presence registry of this process. Offline users
+        are left out.
+        """
+        active = presence_registry.snapshot()
+        chats = {}
+        if active:
+            membership_model = self.chat_model.participants.through
+            rows = membership_model.objects.filter(
+                chat__in=membership_model.objects.filter(user=self.request.user).values(
+                    "chat"
+                ),
+                user__in=list(active),
+            ).values_list("chat", "user")
+            for chat_pk, user_pk in rows:
+                chats.setdefault(str(chat_pk), {})[str(user_pk)] = active[user_pk]
+        return Response({"chats": chats})
+
+    def get_read_response(self):
+        """
+        Advance the user's read watermark to "seq" (default: newest message)
+        """
+        chat = self.get_member_chat()
+        seq = self.request.data.get("seq")
+        if seq is not None:
+            try:
+                seq = max(0, int(seq))
+            except (TypeError, ValueError):
+                return Response(
+                    {"error": "seq must be an integer"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        result = mark_read(chat, self.request.user, seq)
+        if result is None:
+            raise NotFound("Chat not found.")
+        return Response(result)
+
+
 class PersonalChatViewSet(
+    ChatMembershipMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
     permission_classes = [IsAuthenticated]
+    chat_model = PersonalChat
 
     def get_queryset(self):
-        return PersonalChat.objects.filter(participants=self.request.user).order_by(
-            "-updated_at"
+        return (
+            PersonalChat.objects.filter(memberships__user=self.request.user)
+            .annotate(
+                last_read_seq=F("memberships__last_read_seq"),
+                unread_count=F("last_seq") - F("memberships__last_read_seq"),
+            )
+            .select_related("last_message__sender__primary_avatar")
+            .prefetch_related(
+                Prefetch("participants", queryset=User.objects.with_avatars())
+            )
+            .order_by("-updated_at")
         )
 
     def get_serializer_class(self):
@@ -42,40 +211,88 @@ class PersonalChatViewSet(
         serializer.is_valid(raise_exception=True)
         chat = serializer.save()
         return Response(
-            PersonalChatSerializer(chat).data, status=status.HTTP_201_CREATED
+            {
+                **PersonalChatSerializer(self.get_queryset().get(pk=chat.pk)).data,
+                "unknown_participant_ids": chat.unknown_participant_ids,
+            },
+            # An existing chat of the same pair is returned as is
+            status=status.HTTP_201_CREATED if chat.created else status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["post"])
+    def open(self, request):
+        """
+        Find or create the personal chat with "user_id" (idempotent)
+        """
+        serializer = OpenPersonalChatSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        chat, created = open_personal_chat(
+            request.user.pk, serializer.validated_data["user_id"]
+        )
+        # Reloaded for the requesting user's read watermark
+        return Response(
+            PersonalChatSerializer(self.get_queryset().get(pk=chat.pk)).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
         )
 
     @action(detail=True, methods=["get"])
     def messages(self, request, pk=None):
-        chat = self.get_object()
-        messages = Message.objects.filter(personal_chat=chat).order_by("created_at")
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        chat = self.get_member_chat()
+        return self.get_messages_response(Message.objects.filter(chat_id=chat.pk))
 
     @action(detail=True, methods=["post"])
     def add_message(self, request, pk=None):
-        chat = self.get_object()
+        chat = self.get_member_chat()
 
         serializer = MessageSerializer(data=request.data)
         if serializer.is_valid():
-            message = serializer.save(sender=request.user, personal_chat=chat)
+            message = create_message(
+                chat, request.user, serializer.validated_data["content"], publish=True
+            )
             return Response(
                 MessageSerializer(message).data, status=status.HTTP_201_CREATED
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=["post"])
+    def mark_read(self, request, pk=None):
+        return self.get_read_response()
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        return self.get_search_response()
+
+    @action(detail=False, methods=["get"])
+    def presence(self, request):
+        return self.get_presence_response()
+
 
 class GroupChatViewSet(
+    ChatMembershipMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
     permission_classes = [IsAuthenticated]
+    chat_model = GroupChat
 
     def get_queryset(self):
-        return GroupChat.objects.filter(participants=self.request.user).order_by(
-            "-updated_at"
+        return (
+            GroupChat.objects.filter(memberships__user=self.request.user)
+            .annotate(
+                last_read_seq=F("memberships__last_read_seq"),
+                unread_count=F("last_seq") - F("memberships__last_read_seq"),
+            )
+            .select_related(
+                "created_by__primary_avatar", "last_message__sender__primary_avatar"
+            )
+            .prefetch_related(
+                Prefetch("participants", queryset=User.objects.with_avatars())
+            )
+            .order_by("-updated_at")
         )
 
     def get_serializer_class(self):
@@ -89,85 +306,145 @@ class GroupChatViewSet(
         )
         serializer.is_valid(raise_exception=True)
         chat = serializer.save()
-        return Response(GroupChatSerializer(chat).data, status=status.HTTP_201_CREATED)
+        return Response(
+            {
+                **GroupChatSerializer(chat).data,
+                "unknown_participant_ids": chat.unknown_participant_ids,
+            },
+            status=status.HTTP_201_CREATED,
+        )
 
     @action(detail=True, methods=["get"])
     def messages(self, request, pk=None):
-        chat = self.get_object()
-        messages = Message.objects.filter(group_chat=chat).order_by("created_at")
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        chat = self.get_member_chat()
+        return self.get_messages_response(Message.objects.filter(chat_id=chat.pk))
 
     @action(detail=True, methods=["post"])
     def add_message(self, request, pk=None):
-        chat = self.get_object()
+        chat = self.get_member_chat()
 
         serializer = MessageSerializer(data=request.data)
         if serializer.is_valid():
-            message = serializer.save(sender=request.user, group_chat=chat)
+            message = create_message(
+                chat, request.user, serializer.validated_data["content"], publish=True
+            )
             return Response(
                 MessageSerializer(message).data, status=status.HTTP_201_CREATED
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=["post"])
-    def add_participant(self, request, pk=None):
-        chat = self.get_object()
-        user_id = request.data.get("user_id")
+    def mark_read(self, request, pk=None):
+        return self.get_read_response()
 
-        if not user_id:
-            return Response(
-                {"error": "User ID is required"}, status=status.HTTP_400_BAD_REQUEST
-            )
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        return self.get_search_response()
 
-        try:
-            from user.models import User
+    @action(detail=False, methods=["get"])
+    def presence(self, request):
+        return self.get_presence_response()
 
-            user = User.objects.get(uuid=user_id)
+    @action(detail=True, methods=["post"])
+    def add_participant(self, request, pk=None):
+        chat = self.get_member_chat()
+        serializer = ParticipantIdsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            if user in chat.participants.all():
+        if "user_id" in serializer.validated_data:
+            user_id = serializer.validated_data["user_id"]
+            added, existing, unknown = add_participants(chat, [user_id])
+            if unknown:
+                return Response(
+                    {"error": "User not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+            if existing:
                 return Response(
                     {"error": "User is already a participant"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
+            username = User.objects.values_list("username", flat=True).get(uuid=user_id)
+            return Response({"success": f"User {username} added to the chat"})
 
-            chat.participants.add(user)
-            return Response({"success": f"User {user.username} added to the chat"})
-        except User.DoesNotExist:
-            return Response(
-                {"error": "User not found"}, status=status.HTTP_404_NOT_FOUND
-            )
+        added, existing, unknown = add_participants(
+            chat, serializer.validated_data["user_ids"]
+        )
+        return Response(
+            {"added": added, "already_participants": existing, "unknown": unknown}
+        )
 
     @action(detail=True, methods=["delete"])
     def remove_participant(self, request, pk=None):
-        chat = self.get_object()
-        user_id = request.data.get("user_id")
+        chat = self.get_member_chat()
+        serializer = ParticipantIdsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        if not user_id:
+        single = "user_id" in serializer.validated_data
+        user_ids = (
+            [serializer.validated_data["user_id"]]
+            if single
+            else serializer.validated_data["user_ids"]
+        )
+        created_by_id = GroupChat.objects.values_list("created_by", flat=True).get(
+            pk=chat.pk
+        )
+        if created_by_id in user_ids:
             return Response(
-                {"error": "User ID is required"}, status=status.HTTP_400_BAD_REQUEST
+                {"error": "Cannot remove the chat creator"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        try:
-            from user.models import User
-
-            user = User.objects.get(uuid=user_id)
-
-            if chat.created_by == user:
-                return Response(
-                    {"error": "Cannot remove the chat creator"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            if user not in chat.participants.all():
+        if single:
+            username = (
+                User.objects.filter(uuid=user_ids[0])
+                .values_list("username", flat=True)
+                .first()
+            )
+            if username is None:
                 return Response(
-                    {"error": "User is not a participant"},
-                    status=status.HTTP_400_BAD_REQUEST,
+                    {"error": "User not found"}, status=status.HTTP_404_NOT_FOUND
                 )
 
-            chat.participants.remove(user)
-            return Response({"success": f"User {user.username} removed from the chat"})
-        except User.DoesNotExist:
+        removed, not_participants = remove_participants(chat, user_ids)
+        if not single:
+            return Response({"removed": removed, "not_participants": not_participants})
+        if not removed:
             return Response(
-                {"error": "User not found"}, status=status.HTTP_404_NOT_FOUND
+                {"error": "User is not a participant"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        return Response({"success": f"User {username} removed from the chat"})
+
+
+class ChatMetricsView(APIView):
+    """
+    Counters of this worker process (WebSocket traffic, rate limiting and
+    slow consumers). Each process reports its own numbers.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"counters": counters.snapshot()})
+
+
+class InboxView(ListAPIView):
+    """
+    All of the user's chats, personal and group, most recently active first,
+    from the materialized inbox. Paginated with ?cursor= and ?limit=.
+    """
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = InboxEntrySerializer
+    pagination_class = InboxKeysetPagination
+
+    def get_queryset(self):
+        return InboxEntry.objects.filter(user=self.request.user).annotate(
+            unread_count=F("last_seq") - F("last_read_seq")
+        )
+
+    def list(self, request, *args, **kwargs):
+        refresh_lazy_inbox(request.user)
+        return super().list(request, *args, **kwargs)
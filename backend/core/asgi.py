@@ -9,14 +9,49 @@ django.setup()
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 import chat.routing
+from chat.buffer import message_buffer
+from chat.lifecycle import connection_tracker
+from chat.outbox import outbox_dispatcher
+from core.lifespan import (
+    StartupMiddleware,
+    exit_hooks,
+    lifespan_application,
+    startup_hooks,
+    shutdown_hooks,
+)
+from user.thumbnails import thumbnail_pipeline
+from utils.jwt_middleware import JWTAuthMiddleware
 
 print("ASGI application initializing...")
 
-application = ProtocolTypeRouter(
-    {
-        "http": get_asgi_application(),
-        "websocket": URLRouter(chat.routing.websocket_urlpatterns),
-    }
+# Write out buffered (write-behind) chat messages before the process exits,
+# with or without a lifespan shutdown
+shutdown_hooks.append(message_buffer.drain)
+exit_hooks.append(message_buffer.drain_sync)
+
+# Fan REST-created messages out to WebSocket subscribers
+startup_hooks.append(outbox_dispatcher.start)
+shutdown_hooks.append(outbox_dispatcher.stop)
+
+# Drain mode for deploys: SIGUSR1 or the drain_chat_sockets command
+startup_hooks.append(connection_tracker.start)
+shutdown_hooks.append(connection_tracker.stop)
+
+# Avatar thumbnail worker processes
+shutdown_hooks.append(thumbnail_pipeline.stop)
+
+# Startup hooks run on lifespan startup, or before the first request when
+# the server sends no lifespan events (daphne)
+application = StartupMiddleware(
+    ProtocolTypeRouter(
+        {
+            "http": get_asgi_application(),
+            "websocket": JWTAuthMiddleware(
+                URLRouter(chat.routing.websocket_urlpatterns)
+            ),
+            "lifespan": lifespan_application,
+        }
+    )
 )
 
 print("ASGI application setup complete")
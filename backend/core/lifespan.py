@@ -0,0 +1,77 @@
+# backend\core\lifespan.py:
+
+import atexit
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Coroutine functions run on ASGI lifespan startup / shutdown
+startup_hooks = []
+shutdown_hooks = []
+# Plain functions run when the process exits, after the event loop stopped.
+# daphne stops on SIGTERM without a lifespan shutdown, so anything that must
+# not be lost goes here as well.
+exit_hooks = []
+
+_started = False
+
+
+async def run_startup_hooks():
+    """
+    Run the startup hooks once per process, whichever comes first: the
+    lifespan startup event or the first connection
+    """
+    global _started
+    if _started:
+        return
+    _started = True
+    for hook in startup_hooks:
+        await hook()
+
+
+async def lifespan_application(scope, receive, send):
+    """
+    ASGI lifespan protocol handler (uvicorn sends these events, daphne does not)
+    """
+    while True:
+        message = await receive()
+
+        if message["type"] == "lifespan.startup":
+            await run_startup_hooks()
+            await send({"type": "lifespan.startup.complete"})
+
+        elif message["type"] == "lifespan.shutdown":
+            for hook in shutdown_hooks:
+                try:
+                    await hook()
+                except Exception as e:
+                    logger.error(f"Error in shutdown hook {hook.__name__}: {str(e)}")
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+class StartupMiddleware:
+    """
+    Runs the startup hooks on the server's event loop before the first HTTP
+    request or WebSocket connection, for servers without lifespan events
+    (daphne, ``manage.py runserver``)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "lifespan":
+            await run_startup_hooks()
+        return await self.app(scope, receive, send)
+
+
+def run_exit_hooks():
+    for hook in exit_hooks:
+        try:
+            hook()
+        except Exception as e:
+            logger.error(f"Error in exit hook {hook.__name__}: {str(e)}")
+
+
+atexit.register(run_exit_hooks)
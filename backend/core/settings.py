@@ -28,6 +28,17 @@ AVATAR_MULTIPLE_MODE = os.getenv("AVATAR_MULTIPLE_MODE") == "True"
 AVATAR_MAX_COUNT = int(os.getenv("AVATAR_MAX_COUNT"))
 AVATAR_DEFAULT_PATH = "media/avatars/default/PROFILE.jpg"
 
+# Avatar WebP thumbnails (see user/thumbnails.py): square sizes in pixels and
+# the processes rendering them; 0 renders inline in the saving thread
+AVATAR_THUMBNAIL_SIZES = [
+    int(size) for size in os.getenv("AVATAR_THUMBNAIL_SIZES", "32,64,256").split(",")
+]
+AVATAR_THUMBNAIL_QUALITY = int(os.getenv("AVATAR_THUMBNAIL_QUALITY", 80))
+AVATAR_THUMBNAIL_WORKERS = int(os.getenv("AVATAR_THUMBNAIL_WORKERS", 2))
+
+# Rows fetched per database round trip by the staff NDJSON user export
+USER_EXPORT_CHUNK_SIZE = int(os.getenv("USER_EXPORT_CHUNK_SIZE", 2000))
+
 # Email configuration
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = os.getenv("EMAIL_HOST")
@@ -123,16 +134,98 @@ WSGI_APPLICATION = "core.wsgi.application"
 
 ASGI_APPLICATION = "core.asgi.application"
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
-        # В продакшене рекомендуется использовать Redis:
-        # 'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        # 'CONFIG': {
-        #     "hosts": [('127.0.0.1', 6379)],
-        # },
-    },
-}
+# Channel layer: "memory" is single-process only, "broker" fans out across
+# workers and nodes through `python manage.py run_channel_broker` processes
+CHANNEL_LAYER_BACKEND = os.getenv("CHANNEL_LAYER_BACKEND", "memory")
+match CHANNEL_LAYER_BACKEND:
+    case "memory":
+        CHANNEL_LAYERS = {
+            "default": {
+                "BACKEND": "channels.layers.InMemoryChannelLayer",
+                # В продакшене рекомендуется использовать Redis:
+                # 'BACKEND': 'channels_redis.core.RedisChannelLayer',
+                # 'CONFIG': {
+                #     "hosts": [('127.0.0.1', 6379)],
+                # },
+            },
+        }
+    case "broker":
+        CHANNEL_LAYERS = {
+            "default": {
+                "BACKEND": "chat.layers.BrokerChannelLayer",
+                "CONFIG": {
+                    # Comma-separated shards: tcp://host:port or unix:///path
+                    "hosts": os.getenv(
+                        "CHANNEL_BROKER_HOSTS", "tcp://127.0.0.1:8765"
+                    ).split(","),
+                },
+            },
+        }
+    case _:
+        raise ValueError("Invalid CHANNEL_LAYER_BACKEND.")
+
+# Chat membership cache (per process, see chat/cache.py)
+CHAT_MEMBERSHIP_CACHE_SIZE = int(os.getenv("CHAT_MEMBERSHIP_CACHE_SIZE", 10000))
+CHAT_MEMBERSHIP_CACHE_TTL = int(os.getenv("CHAT_MEMBERSHIP_CACHE_TTL", 60))
+
+# WebSocket JWT authentication: recently seen users (see utils/jwt_middleware.py)
+WS_USER_CACHE_SIZE = int(os.getenv("WS_USER_CACHE_SIZE", 10000))
+WS_USER_CACHE_TTL = int(os.getenv("WS_USER_CACHE_TTL", 300))
+
+# Write-behind persistence of WebSocket messages (opt-in, see chat/buffer.py)
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND") == "True"
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BEHIND_BATCH_SIZE", 200))
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(
+    os.getenv("CHAT_WRITE_BEHIND_FLUSH_INTERVAL", 0.05)
+)
+# Messages that cannot be written are kept here until replay_dead_letters
+CHAT_WRITE_BEHIND_DEAD_LETTER_PATH = os.getenv(
+    "CHAT_WRITE_BEHIND_DEAD_LETTER_PATH",
+    str(BASE_DIR.parent / "logs" / "chat_dead_letters.ndjson"),
+)
+
+# Multiplexed ws/chat/ endpoint: chats one socket may subscribe to
+CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS = int(
+    os.getenv("CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS", 500)
+)
+
+# Replay of missed messages on reconnect (?since_seq=)
+CHAT_REPLAY_BATCH_SIZE = int(os.getenv("CHAT_REPLAY_BATCH_SIZE", 200))
+CHAT_REPLAY_MAX_MESSAGES = int(os.getenv("CHAT_REPLAY_MAX_MESSAGES", 5000))
+
+# WebSocket flow control: incoming frames per second (token buckets) for each
+# connection and for each user across connections, and the outbound queue of
+# each connection. A full queue drops live events ("drop") or closes the
+# socket ("close").
+CHAT_WS_CONNECTION_RATE = float(os.getenv("CHAT_WS_CONNECTION_RATE", 10))
+CHAT_WS_CONNECTION_BURST = int(os.getenv("CHAT_WS_CONNECTION_BURST", 20))
+CHAT_WS_USER_RATE = float(os.getenv("CHAT_WS_USER_RATE", 20))
+CHAT_WS_USER_BURST = int(os.getenv("CHAT_WS_USER_BURST", 40))
+CHAT_WS_OUTBOUND_QUEUE_SIZE = int(os.getenv("CHAT_WS_OUTBOUND_QUEUE_SIZE", 256))
+CHAT_WS_SLOW_CONSUMER_POLICY = os.getenv("CHAT_WS_SLOW_CONSUMER_POLICY", "drop")
+
+# WebSocket liveness: the server pings every CHAT_WS_HEARTBEAT_INTERVAL seconds
+# and closes sockets that sent nothing for CHAT_WS_IDLE_TIMEOUT seconds. Drain
+# mode (see chat/lifecycle.py) closes all sockets over CHAT_WS_DRAIN_PERIOD
+# seconds, telling clients to reconnect within CHAT_WS_RECONNECT_JITTER seconds.
+CHAT_WS_HEARTBEAT_INTERVAL = float(os.getenv("CHAT_WS_HEARTBEAT_INTERVAL", 25))
+CHAT_WS_IDLE_TIMEOUT = float(os.getenv("CHAT_WS_IDLE_TIMEOUT", 75))
+CHAT_WS_DRAIN_PERIOD = float(os.getenv("CHAT_WS_DRAIN_PERIOD", 30))
+CHAT_WS_RECONNECT_JITTER = float(os.getenv("CHAT_WS_RECONNECT_JITTER", 10))
+
+# Presence and typing indicators, in memory only (see chat/presence.py).
+# A socket that sends nothing for CHAT_PRESENCE_TTL seconds counts as gone.
+CHAT_PRESENCE_TTL = int(os.getenv("CHAT_PRESENCE_TTL", 60))
+CHAT_TYPING_INTERVAL = float(os.getenv("CHAT_TYPING_INTERVAL", 3.0))
+
+# Transactional outbox of REST-created messages (see chat/outbox.py): events
+# per dispatch batch and how often the table is checked without a wake-up
+CHAT_OUTBOX_BATCH_SIZE = int(os.getenv("CHAT_OUTBOX_BATCH_SIZE", 100))
+CHAT_OUTBOX_POLL_INTERVAL = float(os.getenv("CHAT_OUTBOX_POLL_INTERVAL", 1.0))
+
+# Per-user inbox (chat.models.InboxEntry): groups with more participants than
+# this are refreshed when the inbox is read instead of on every message
+CHAT_INBOX_FANOUT_LIMIT = int(os.getenv("CHAT_INBOX_FANOUT_LIMIT", 1000))
 
 
 # Database
@@ -346,5 +439,22 @@ SWAGGER_SETTINGS = {
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR.parent, "media")
 
+# Avatars are stored content-addressed (utils/storage.py) so identical images
+# share one file; unreferenced blobs are removed by collect_avatar_blobs
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "avatars": {
+        "BACKEND": "utils.storage.ContentAddressedStorage",
+        "OPTIONS": {"prefix": os.getenv("AVATAR_BLOB_PREFIX", "avatars/blobs")},
+    },
+}
+
 # Maximum upload size (5MB)
 MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+
+# Maximum width * height of an uploaded image, checked from its header
+MAX_UPLOAD_PIXELS = int(os.getenv("MAX_UPLOAD_PIXELS", 4096 * 4096))
+
+# Uploads stream to a temporary file and are cut off at MAX_UPLOAD_SIZE
+FILE_UPLOAD_HANDLERS = ["utils.upload_handlers.LimitedUploadHandler"]
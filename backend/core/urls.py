@@ -31,7 +31,11 @@ urlpatterns = [
         SpectacularSwaggerView.as_view(url_name="schema"),
         name="swagger-ui",
     ),
-    path("spectacular-redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
+    path(
+        "spectacular-redoc/",
+        SpectacularRedocView.as_view(url_name="schema"),
+        name="redoc",
+    ),
     path(
         "spectacular-rapidoc/",
         TemplateView.as_view(
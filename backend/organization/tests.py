@@ -1,5 +1,54 @@
 # backend\organization\tests.py:
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+#
+from user.models import Avatar, User
+from .models import Organization
+
+
+def make_owner(username):
+    user = User.objects.create_user(
+        username=username, email=f"{username}@example.com", password="pw12345!"
+    )
+    Avatar.objects.create(user=user, image=f"avatars/{username}.png")
+    return user
+
+
+class OrganizationListQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def add_organizations(self, count):
+        for _ in range(count):
+            number = Organization.objects.count()
+            Organization.objects.create(
+                name=f"org {number}", created_by=make_owner(f"owner{number}")
+            )
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/organizations/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"], len(queries)
+
+    def test_query_count_does_not_grow_with_creators(self):
+        self.add_organizations(1)
+        _, one = self.list_queries()
+        self.add_organizations(4)
+        results, five = self.list_queries()
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(five, one)
+
+    def test_creator_avatar_comes_from_the_joined_primary_avatar(self):
+        self.add_organizations(1)
+
+        results, _ = self.list_queries()
+
+        self.assertTrue(
+            results[0]["created_by"]["avatar_url"].endswith("avatars/owner0.png")
+        )
@@ -24,7 +24,9 @@ from utils.permissions import IsOwnerOrAdmin
 
 
 class OrganizationViewSet(viewsets.ModelViewSet):
-    queryset = Organization.objects.select_related("created_by").all()
+    queryset = Organization.objects.select_related(
+        "created_by__primary_avatar"
+    ).all()
     serializer_class = OrganizationSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -54,9 +56,9 @@ class OrganizationViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"])
     def branches(self, request, pk=None):
         organization = self.get_object()
-        branches = Branch.objects.select_related("organization", "created_by").filter(
-            organization=organization
-        )
+        branches = Branch.objects.select_related(
+            "organization", "created_by__primary_avatar"
+        ).filter(organization=organization)
         serializer = BranchSerializer(branches, many=True)
         return Response(serializer.data)
 
@@ -78,7 +80,9 @@ class OrganizationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        relations = Relation.objects.filter(organization=organization)
+        relations = Relation.objects.select_related(
+            "user__primary_avatar", "organization", "branch"
+        ).filter(organization=organization)
         serializer = RelationSerializer(relations, many=True)
         return Response(serializer.data)
 
@@ -87,7 +91,9 @@ class OrganizationViewSet(viewsets.ModelViewSet):
 
 
 class BranchViewSet(viewsets.ModelViewSet):
-    queryset = Branch.objects.select_related("organization", "created_by").all()
+    queryset = Branch.objects.select_related(
+        "organization", "created_by__primary_avatar"
+    ).all()
     serializer_class = BranchSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -138,7 +144,7 @@ class BranchViewSet(viewsets.ModelViewSet):
             )
 
         relations = Relation.objects.select_related(
-            "user", "organization", "branch"
+            "user__primary_avatar", "organization", "branch"
         ).filter(organization=organization)
         serializer = RelationSerializer(relations, many=True)
         return Response(serializer.data)
@@ -214,7 +220,9 @@ class BranchViewSet(viewsets.ModelViewSet):
 
 
 class RelationViewSet(viewsets.ModelViewSet):
-    queryset = Relation.objects.select_related("user", "organization", "branch").all()
+    queryset = Relation.objects.select_related(
+        "user__primary_avatar", "organization", "branch"
+    ).all()
     serializer_class = RelationSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
@@ -255,7 +263,9 @@ class RelationViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        return Relation.objects.select_related("user", "organization", "branch").filter(
+        return Relation.objects.select_related(
+            "user__primary_avatar", "organization", "branch"
+        ).filter(
             Q(user=user)
             | Q(
                 branch__in=Branch.objects.filter(
@@ -311,7 +321,7 @@ class RelationViewSet(viewsets.ModelViewSet):
     def my_relations(self, request):
         """Get all relations for the current user"""
         relations = Relation.objects.select_related(
-            "user", "organization", "branch"
+            "user__primary_avatar", "organization", "branch"
         ).filter(user=request.user, relation_type=RelationType.RELATION)
         serializer = self.get_serializer(relations, many=True)
         return Response(serializer.data)
@@ -319,7 +329,7 @@ class RelationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"])
     def my_invitations(self, request):
         invitations = Relation.objects.select_related(
-            "user", "organization", "branch"
+            "user__primary_avatar", "organization", "branch"
         ).filter(user=request.user, relation_type=RelationType.INVITATION_TO_USER)
         serializer = self.get_serializer(invitations, many=True)
         return Response(serializer.data)
@@ -341,7 +351,7 @@ class RelationViewSet(viewsets.ModelViewSet):
             relations__relation_type=RelationType.RELATION,
         )
         pending_requests = Relation.objects.select_related(
-            "user", "organization", "branch"
+            "user__primary_avatar", "organization", "branch"
         ).filter(
             Q(branch__in=managed_branches) | Q(organization__in=owned_organizations),
             relation_type=RelationType.REQUEST_TO_JOIN,
@@ -20,7 +20,9 @@ class CustomUserAdmin(UserAdmin):
     ordering = ("email", "username")
 
     def avatar_preview(self, obj):
-        avatar_url = obj.get_avatar_url()
+        # The smallest thumbnail instead of the full-size upload
+        thumbnails = obj.get_avatar_thumbnail_urls()
+        avatar_url = thumbnails[min(thumbnails, key=int)]
         if avatar_url:
             return format_html(
                 '<img src="{}" width="10" height="10" style="border-radius: 100%;" />',
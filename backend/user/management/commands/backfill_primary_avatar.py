@@ -0,0 +1,56 @@
+# backend\user\management\commands\backfill_primary_avatar.py:
+
+import logging
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from user.models import Avatar, User
+
+logger = logging.getLogger(__name__)
+
+# ~~~~~~~~~~~~~~~~~~~~ USER ~~~~~~~~~~~~~~~~~~~~
+
+
+class Command(BaseCommand):
+    help = (
+        "Points User.primary_avatar at each user's primary Avatar for rows "
+        "created before the field existed. Runs in small batches, each "
+        "committed on its own, and can be interrupted and restarted at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between batches to spare the database",
+        )
+
+    def handle(self, *args, **options):
+        primary = Avatar.objects.filter(user=OuterRef("pk"), is_primary=True)
+        pending = User.objects.filter(
+            primary_avatar__isnull=True, avatars__is_primary=True
+        ).order_by("uuid")
+        last_uuid = None
+        updated = 0
+
+        while True:
+            batch = pending if last_uuid is None else pending.filter(uuid__gt=last_uuid)
+            uuids = list(batch.values_list("uuid", flat=True)[: options["batch_size"]])
+            if not uuids:
+                break
+            last_uuid = uuids[-1]
+
+            updated += User.objects.filter(uuid__in=uuids).update(
+                primary_avatar=Subquery(
+                    primary.order_by("-created_at").values("uuid")[:1]
+                )
+            )
+
+            self.stdout.write(f"{updated} users backfilled")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        logger.info(f"Primary avatar backfill finished: {updated} rows")
+        self.stdout.write(self.style.SUCCESS(f"Done, {updated} users backfilled"))
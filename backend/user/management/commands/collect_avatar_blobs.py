@@ -0,0 +1,129 @@
+# backend\user\management\commands\collect_avatar_blobs.py:
+
+import logging
+import posixpath
+import time
+from collections import Counter
+from datetime import timedelta
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from user.models import Avatar, User
+
+logger = logging.getLogger(__name__)
+
+# ~~~~~~~~~~~~~~~~~~~~ USER ~~~~~~~~~~~~~~~~~~~~
+
+
+class Command(BaseCommand):
+    help = (
+        "Garbage-collects the content-addressed avatar storage. Counts the "
+        "references of every blob from Avatar.image, User.avatar and their "
+        "thumbnails, then deletes the blobs nothing references that are older "
+        "than the grace period. Both phases run in batches and the command can "
+        "be interrupted and restarted at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between batches to spare the database",
+        )
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=3600,
+            help="Seconds a blob must exist before it can be deleted, so "
+            "uploads whose row is not committed yet are never swept",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be deleted without deleting",
+        )
+
+    def handle(self, *args, **options):
+        storage = storages["avatars"]
+        references = self.mark(options)
+        blobs = sum(1 for name in references if storage.is_blob(name))
+        self.stdout.write(
+            f"{sum(references.values())} references to {blobs} blobs found"
+        )
+
+        deleted, freed = self.sweep(storage, references, options)
+
+        logger.info(f"Avatar blob collection finished: {deleted} blobs, {freed} bytes")
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {deleted} unreferenced blobs, {freed} bytes")
+        )
+
+    def mark(self, options):
+        """
+        Reference count of every stored name, read in primary key batches
+        """
+        references = Counter()
+        for model, field_name, thumbnails_field in (
+            (Avatar, "image", "thumbnails"),
+            (User, "avatar", "avatar_thumbnails"),
+        ):
+            rows = model.objects.order_by("pk").values_list(
+                "pk", field_name, thumbnails_field
+            )
+            last_pk = None
+            while True:
+                batch = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+                batch = list(batch[: options["batch_size"]])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+
+                for pk, name, thumbnails in batch:
+                    if name:
+                        references[name] += 1
+                    for thumbnail in (thumbnails or {}).get("sizes", {}).values():
+                        references[thumbnail] += 1
+
+                if options["sleep"]:
+                    time.sleep(options["sleep"])
+        return references
+
+    def sweep(self, storage, references, options):
+        """
+        Delete unreferenced blobs, one <prefix>/<h[:2]>/<h[2:4]> directory at
+        a time; stale temporary files of interrupted uploads go too
+        """
+        cutoff = timezone.now() - timedelta(seconds=options["grace"])
+        deleted = freed = 0
+
+        for directory in self.blob_directories(storage):
+            _, files = storage.listdir(directory)
+            for filename in files:
+                name = posixpath.join(directory, filename)
+                if references[name] or storage.get_modified_time(name) > cutoff:
+                    continue
+                freed += storage.size(name)
+                deleted += 1
+                if not options["dry_run"]:
+                    # storage.delete() keeps blobs, remove the file itself
+                    storage.delete_blob(name)
+
+            if files and options["sleep"]:
+                time.sleep(options["sleep"])
+        return deleted, freed
+
+    def blob_directories(self, storage):
+        if not storage.exists(storage.prefix):
+            return
+        if storage.exists(posixpath.join(storage.prefix, "tmp")):
+            yield posixpath.join(storage.prefix, "tmp")
+        first_level, _ = storage.listdir(storage.prefix)
+        for first in sorted(first_level):
+            if first == "tmp":
+                continue
+            second_level, _ = storage.listdir(posixpath.join(storage.prefix, first))
+            for second in sorted(second_level):
+                yield posixpath.join(storage.prefix, first, second)
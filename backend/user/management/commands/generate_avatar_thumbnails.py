@@ -0,0 +1,77 @@
+# backend\user\management\commands\generate_avatar_thumbnails.py:
+
+import logging
+import time
+from django.core.management.base import BaseCommand
+from user.models import Avatar, User
+from user.thumbnails import thumbnail_pipeline
+
+logger = logging.getLogger(__name__)
+
+# ~~~~~~~~~~~~~~~~~~~~ USER ~~~~~~~~~~~~~~~~~~~~
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates the WebP thumbnails of avatars uploaded before the "
+        "thumbnail pipeline existed, or whose image changed since. Rendering "
+        "uses the AVATAR_THUMBNAIL_WORKERS process pool; rows that are already "
+        "up to date are skipped, so the command can be restarted at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between batches to spare the storage",
+        )
+
+    def handle(self, *args, **options):
+        if thumbnail_pipeline.workers:
+            thumbnail_pipeline.start()
+        generated = self.generate(Avatar, "image", "thumbnails", options)
+        generated += self.generate(User, "avatar", "avatar_thumbnails", options)
+
+        logger.info(f"Avatar thumbnails finished: {generated} images")
+        self.stdout.write(
+            self.style.SUCCESS(f"Done, thumbnails generated for {generated} images")
+        )
+
+    def generate(self, model, field_name, thumbnails_field, options):
+        rows = (
+            model.objects.exclude(**{field_name: ""})
+            .exclude(**{f"{field_name}__isnull": True})
+            .order_by("pk")
+        )
+        last_pk = None
+        generated = 0
+
+        while True:
+            batch = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+            batch = list(
+                batch.values_list("pk", field_name, thumbnails_field)[
+                    : options["batch_size"]
+                ]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+
+            for pk, name, thumbnails in batch:
+                if (thumbnails or {}).get("source") == name:
+                    continue
+                try:
+                    generated += thumbnail_pipeline.generate(
+                        model, pk, field_name, thumbnails_field
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"Error generating thumbnails of {model.__name__} {pk}: {e}"
+                    )
+
+            self.stdout.write(f"{generated} images processed")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        return generated
@@ -0,0 +1,72 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:02
+
+import django.core.validators
+import django.db.models.deletion
+import user.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="user",
+            managers=[
+                ("objects", user.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="avatar",
+            name="thumbnails",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="avatar_thumbnails",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="primary_avatar",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="user.avatar",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="avatar",
+            name="image",
+            field=models.ImageField(
+                storage=user.models.avatar_storage,
+                upload_to=user.models.avatar_upload_path,
+                validators=[
+                    django.core.validators.FileExtensionValidator(
+                        ["jpg", "jpeg", "png", "webp"]
+                    )
+                ],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="avatar",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=user.models.avatar_storage,
+                upload_to=user.models.avatar_upload_path,
+                validators=[
+                    django.core.validators.FileExtensionValidator(
+                        ["jpg", "jpeg", "png", "webp"]
+                    )
+                ],
+            ),
+        ),
+    ]
@@ -1,14 +1,23 @@
 # backend\user\models.py:
 
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.core.validators import FileExtensionValidator
+from django.core.files.storage import storages
 from django.conf import settings
 
 #
 import os
 import uuid
 
+#
+from .thumbnails import thumbnail_urls
+
+
+def avatar_storage():
+    # Content-addressed: identical uploads share one file (utils/storage.py)
+    return storages["avatars"]
+
 
 def avatar_upload_path(instance, filename):
     # For Avatar model
@@ -30,9 +39,12 @@ class Avatar(models.Model):
     user = models.ForeignKey("User", on_delete=models.CASCADE, related_name="avatars")
     image = models.ImageField(
         upload_to=avatar_upload_path,
+        storage=avatar_storage,
         validators=[FileExtensionValidator(["jpg", "jpeg", "png", "webp"])],
     )
     is_primary = models.BooleanField(default=False)
+    # WebP derivatives, filled in by user.thumbnails after the upload
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -42,19 +54,33 @@ class Avatar(models.Model):
     def __str__(self):
         return f"Avatar for {self.user.username}"
 
+    def get_thumbnail_urls(self):
+        return thumbnail_urls(self.image, self.thumbnails, self.image.url)
+
     def save(self, *args, **kwargs):
         # If setting this avatar as primary, unset all other primary avatars
         if self.is_primary:
-            Avatar.objects.filter(user=self.user, is_primary=True).update(
-                is_primary=False
-            )
+            Avatar.objects.filter(user=self.user, is_primary=True).exclude(
+                pk=self.pk
+            ).update(is_primary=False)
 
-        # If this is the only avatar, make it primary
-        if not self.pk and not Avatar.objects.filter(user=self.user).exists():
+        # If this is the only avatar, make it primary (pk is a default uuid,
+        # so it is set before the first save)
+        if self._state.adding and not Avatar.objects.filter(user=self.user).exists():
             self.is_primary = True
 
         super().save(*args, **kwargs)
 
+        # Keep User.primary_avatar pointing at the primary avatar
+        if self.is_primary:
+            User.objects.filter(pk=self.user_id).update(primary_avatar=self)
+            if Avatar.user.is_cached(self):
+                self.user.primary_avatar = self
+        else:
+            User.objects.filter(pk=self.user_id, primary_avatar=self).update(
+                primary_avatar=None
+            )
+
 
 def avatar_upload_path(instance, filename):
     ext = filename.split(".")[-1]
@@ -62,6 +88,29 @@ def avatar_upload_path(instance, filename):
     return os.path.join("avatars", new_filename)
 
 
+class UserQuerySet(models.QuerySet):
+    def with_avatars(self):
+        """
+        Join the primary avatar, so serializing the users needs no extra query
+        """
+        return self.select_related("primary_avatar")
+
+    def with_prefix(self, field, prefix):
+        """
+        Users whose username / email starts with prefix. On PostgreSQL the
+        LIKE 'prefix%' is served by the varchar_pattern_ops ("_like") index
+        Django creates next to every unique CharField, whatever the
+        database collation
+        """
+        if not prefix:
+            return self
+        return self.filter(**{f"{field}__startswith": prefix})
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     email = models.EmailField(unique=True, verbose_name="Email address")
@@ -74,10 +123,24 @@ class User(AbstractUser):
 
     avatar = models.ImageField(
         upload_to=avatar_upload_path,
+        storage=avatar_storage,
         null=True,
         blank=True,
         validators=[FileExtensionValidator(["jpg", "jpeg", "png", "webp"])],
     )
+    avatar_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Denormalized Avatar with is_primary=True, kept by Avatar.save
+    primary_avatar = models.ForeignKey(
+        Avatar,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name="+",
+    )
+
+    objects = UserManager()
 
     USERNAME_FIELD = "username"
     REQUIRED_FIELDS = ["email"]
@@ -94,10 +157,22 @@ class User(AbstractUser):
             return self.avatar.url
         return "/media/avatars/default/PROFILE.jpg"
 
+    def get_avatar_thumbnail_urls(self):
+        """
+        {size: url} of the single avatar if set, else of the primary avatar
+        """
+        if self.avatar:
+            return thumbnail_urls(
+                self.avatar, self.avatar_thumbnails, self.get_avatar_url()
+            )
+        if self.primary_avatar_id:
+            return self.primary_avatar.get_thumbnail_urls()
+        return thumbnail_urls(None, {}, "/media/avatars/default/PROFILE.jpg")
+
     def get_primary_avatar_url(self):
-        primary_avatar = self.avatars.filter(is_primary=True).first()
-        if primary_avatar:
-            return primary_avatar.image.url
+        # One query per user unless loaded with User.objects.with_avatars()
+        if self.primary_avatar_id:
+            return self.primary_avatar.image.url
         return "/media/avatars/default/PROFILE.jpg"
 
     # def get_avatar_url(self):
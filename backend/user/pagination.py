@@ -0,0 +1,73 @@
+# backend\user\pagination.py:
+
+import base64
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class DirectoryKeysetPagination(BasePagination):
+    """
+    Keyset pagination of users over one unique field (username or email),
+    in ascending order.
+
+    Set ``ordering_field`` before paginating. The ``cursor`` of the next page
+    encodes the last value of the current one, so with a prefix filter every
+    page is a single range scan of the field's unique index.
+    """
+
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    ordering_field = "username"
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_cursor(self, value):
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            return base64.urlsafe_b64decode(cursor.encode()).decode()
+        except ValueError:
+            raise ValidationError({"detail": "Invalid cursor."})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        limit = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(
+                **{f"{self.ordering_field}__gt": self.decode_cursor(cursor)}
+            )
+        rows = list(queryset.order_by(self.ordering_field)[: limit + 1])
+        self.has_more = len(rows) > limit
+        self.page = rows[:limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": (
+                    self.encode_cursor(getattr(self.page[-1], self.ordering_field))
+                    if self.page and self.has_more
+                    else None
+                ),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
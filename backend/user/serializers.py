@@ -13,6 +13,7 @@ User = get_user_model()
 
 class UserSerializer(serializers.ModelSerializer):
     avatar_url = serializers.SerializerMethodField()
+    avatar_thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -24,8 +25,9 @@ class UserSerializer(serializers.ModelSerializer):
             "last_name",
             "phone_number",
             "avatar_url",
+            "avatar_thumbnails",
         )
-        read_only_fields = ("uuid", "avatar_url")
+        read_only_fields = ("uuid", "avatar_url", "avatar_thumbnails")
 
     def get_avatar_url(self, obj):
         if hasattr(obj, "avatar") and obj.avatar:
@@ -33,6 +35,9 @@ class UserSerializer(serializers.ModelSerializer):
         # For Multiple Avatar scenario, get primary avatar
         return obj.get_primary_avatar_url()
 
+    def get_avatar_thumbnails(self, obj):
+        return obj.get_avatar_thumbnail_urls()
+
 
 class UserCreateSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
@@ -96,15 +101,19 @@ class ChangePasswordSerializer(serializers.Serializer):
 
 class AvatarSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Avatar
-        fields = ("uuid", "image_url", "is_primary", "created_at")
-        read_only_fields = ("uuid", "image_url", "created_at")
+        fields = ("uuid", "image_url", "thumbnails", "is_primary", "created_at")
+        read_only_fields = ("uuid", "image_url", "thumbnails", "created_at")
 
     def get_image_url(self, obj):
         return obj.image.url if obj.image else None
 
+    def get_thumbnails(self, obj):
+        return obj.get_thumbnail_urls() if obj.image else None
+
 
 class AvatarCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,53 @@
+# backend\user\signals.py:
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+#
+from .models import Avatar, User
+from .thumbnails import thumbnail_pipeline
+from utils.jwt_middleware import forget_user
+
+
+def wrote_image(update_fields, field_name, thumbnails_field):
+    # Saves limited to other columns (e.g. the last_login update) leave
+    # both the image and its thumbnails untouched
+    return update_fields is None or bool(
+        {field_name, thumbnails_field} & set(update_fields)
+    )
+
+
+@receiver(post_save, sender=Avatar)
+def queue_avatar_thumbnails(sender, instance, raw, update_fields, **kwargs):
+    """
+    Generate derivatives of a new or replaced image once the save commits
+    """
+    if raw or not instance.image:
+        return
+    if not wrote_image(update_fields, "image", "thumbnails"):
+        return
+    # A full save also writes the in-memory thumbnails: if they do not belong
+    # to the image (new upload, or a copy loaded before they were generated),
+    # the row now needs them
+    if instance.thumbnails.get("source") != instance.image.name:
+        thumbnail_pipeline.schedule(instance, "image", "thumbnails")
+
+
+@receiver(post_save, sender=User)
+def queue_user_avatar_thumbnails(sender, instance, raw, update_fields, **kwargs):
+    if raw or not instance.avatar:
+        return
+    if not wrote_image(update_fields, "avatar", "avatar_thumbnails"):
+        return
+    if instance.avatar_thumbnails.get("source") != instance.avatar.name:
+        thumbnail_pipeline.schedule(instance, "avatar", "avatar_thumbnails")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """
+    WebSocket auth serves users from memory; a change (is_active,
+    username) or a deletion must not wait for the cache TTL
+    """
+    forget_user(instance.pk)
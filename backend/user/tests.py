@@ -1,5 +1,325 @@
 # backend\user\tests.py:
 
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+#
+from .models import Avatar, User
+from .thumbnails import thumbnail_pipeline
+
+
+def make_user(username, **extra):
+    return User.objects.create_user(
+        username=username,
+        email=f"{username}@example.com",
+        password="pw12345!",
+        **extra,
+    )
+
+
+def use_temp_media(testcase):
+    """
+    Point MEDIA_ROOT at a directory removed after the test
+    """
+    media_root = tempfile.mkdtemp()
+    testcase.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    media = override_settings(MEDIA_ROOT=media_root)
+    media.enable()
+    testcase.addCleanup(media.disable)
+
+
+def png(width, height, color="red"):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(output, "PNG")
+    return output.getvalue()
+
+
+def png_header(width, height):
+    """
+    A tiny PNG that declares a width x height canvas (a decompression bomb)
+    """
+
+    def chunk(kind, data):
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data))
+        )
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(b"\0" * 64))
+        + chunk(b"IEND", b"")
+    )
+
+
+@override_settings(MAX_UPLOAD_SIZE=64 * 1024, MAX_UPLOAD_PIXELS=1000 * 1000)
+class AvatarUploadLimitTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        self.user = User.objects.create_user(
+            username="alice", email="alice@example.com", password="pw12345!"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, data):
+        return self.client.patch(
+            "/api/users/patch_me/",
+            {"avatar": SimpleUploadedFile(name, data, "image/png")},
+            format="multipart",
+        )
+
+    def test_small_image_is_accepted(self):
+        response = self.upload("ok.png", png(64, 64))
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar)
+
+    def test_file_over_size_limit_is_rejected(self):
+        response = self.upload("big.png", b"\0" * (65 * 1024))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("upload limit", response.json()["detail"])
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.avatar)
+
+    def test_image_over_pixel_limit_is_rejected(self):
+        response = self.upload("wide.png", png_header(2000, 1000))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("pixel limit", response.json()["detail"])
+
+    def test_decompression_bomb_is_rejected_from_its_header(self):
+        response = self.upload("bomb.png", png_header(60000, 60000))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("pixel limit", response.json()["detail"])
+
+    def test_non_image_is_left_to_field_validation(self):
+        response = self.upload("text.png", b"not an image")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("avatar", response.json())
+
+
+class AvatarThumbnailTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        patcher = mock.patch.object(thumbnail_pipeline, "workers", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = make_user("alice")
+
+    def create_avatar(self, name="face.png"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Avatar.objects.create(
+                user=self.user, image=SimpleUploadedFile(name, png(300, 200))
+            )
+
+    def test_upload_gets_a_thumbnail_per_size(self):
+        avatar = self.create_avatar()
+        avatar.refresh_from_db()
+
+        self.assertEqual(avatar.thumbnails["source"], avatar.image.name)
+        self.assertEqual(sorted(avatar.thumbnails["sizes"]), ["256", "32", "64"])
+        for name in avatar.thumbnails["sizes"].values():
+            self.assertTrue(avatar.image.storage.exists(name))
+        with avatar.image.storage.open(avatar.thumbnails["sizes"]["64"]) as file:
+            self.assertEqual(Image.open(file).size, (64, 64))
+
+    def test_saves_that_keep_the_image_queue_nothing(self):
+        avatar = self.create_avatar()
+        avatar.refresh_from_db()
+
+        with mock.patch.object(thumbnail_pipeline, "schedule") as schedule:
+            avatar.is_primary = True
+            avatar.save()
+            avatar.save(update_fields=["is_primary"])
+            self.user.save(update_fields=["last_login"])
+
+        schedule.assert_not_called()
+
+    def test_replaced_image_is_queued_again(self):
+        avatar = self.create_avatar()
+        avatar.refresh_from_db()
+
+        with mock.patch.object(thumbnail_pipeline, "schedule") as schedule:
+            avatar.image = SimpleUploadedFile("new.png", png(100, 100))
+            avatar.save()
+
+        schedule.assert_called_once_with(avatar, "image", "thumbnails")
+
+
+class AvatarBlobCollectionTests(TestCase):
+    def setUp(self):
+        use_temp_media(self)
+        patcher = mock.patch.object(thumbnail_pipeline, "workers", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.storage = storages["avatars"]
+        self.user = make_user("alice")
+
+    def create_avatar(self, color):
+        image = SimpleUploadedFile("a.png", png(300, 300, color))
+        with self.captureOnCommitCallbacks(execute=True):
+            return Avatar.objects.create(user=self.user, image=image)
+
+    def age(self, *names):
+        # Past the default one hour grace period
+        past = time.time() - 2 * 3600
+        for name in names:
+            os.utime(self.storage.path(name), (past, past))
+
+    def stored_names(self):
+        names = set()
+        for root, _, files in os.walk(self.storage.path(self.storage.prefix)):
+            for filename in files:
+                path = os.path.join(root, filename)
+                names.add(
+                    os.path.relpath(path, self.storage.location).replace("\\", "/")
+                )
+        return names
+
+    def collect(self, *args):
+        output = StringIO()
+        call_command("collect_avatar_blobs", *args, stdout=output)
+        return output.getvalue()
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.create_avatar("red")
+        second = self.create_avatar("red")
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(self.storage.is_blob(first.image.name))
+
+    def test_only_old_unreferenced_blobs_are_swept(self):
+        kept = self.create_avatar("red")
+        kept.refresh_from_db()
+        dropped = self.create_avatar("blue")
+        dropped.refresh_from_db()
+        dropped_names = {dropped.image.name, *dropped.thumbnails["sizes"].values()}
+        dropped.delete()
+        fresh = self.storage.save("fresh.png", ContentFile(png(60, 60, "green")))
+        self.age(*(self.stored_names() - {fresh}))
+
+        output = self.collect("--batch-size", "1")
+
+        self.assertIn("Deleted 4 unreferenced blobs", output)
+        self.assertEqual(
+            self.stored_names(),
+            {kept.image.name, *kept.thumbnails["sizes"].values(), fresh},
+        )
+        self.assertFalse(self.stored_names() & dropped_names)
+
+    def test_dry_run_and_grace_delete_nothing(self):
+        Avatar.objects.filter(pk=self.create_avatar("red").pk).delete()
+        before = self.stored_names()
+
+        dry_run = self.collect("--grace", "0", "--dry-run")
+        after_dry_run = self.stored_names()
+        in_grace = self.collect()
+
+        self.assertIn("Would delete 4 unreferenced blobs", dry_run)
+        self.assertEqual(after_dry_run, before)
+        self.assertIn("Deleted 0 unreferenced blobs", in_grace)
+        self.assertEqual(self.stored_names(), before)
+
+
+class UserDirectoryTests(TestCase):
+    def setUp(self):
+        for username in ("dave", "carol", "bob", "alice", "bobby"):
+            make_user(username)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(username="alice"))
+
+    def get_page(self, **params):
+        response = self.client.get("/api/users/get_users/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_follow_the_cursor_in_username_order(self):
+        pages = [self.get_page(limit=2)]
+        while pages[-1]["next"]:
+            pages.append(self.get_page(limit=2, cursor=pages[-1]["next"]))
+
+        self.assertEqual(
+            [[user["username"] for user in page["results"]] for page in pages],
+            [["alice", "bob"], ["bobby", "carol"], ["dave"]],
+        )
+
+    def test_prefix_search_by_username_and_email(self):
+        by_username = self.get_page(username="bob")
+        by_email = self.get_page(email="car")
+
+        self.assertEqual(
+            [user["username"] for user in by_username["results"]], ["bob", "bobby"]
+        )
+        self.assertEqual(
+            [user["email"] for user in by_email["results"]], ["carol@example.com"]
+        )
+        self.assertIsNone(by_username["next"])
+
+    def test_directory_requires_authentication(self):
+        response = APIClient().get("/api/users/get_users/")
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get("/api/users/get_users/", {"cursor": "abc"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(USER_EXPORT_CHUNK_SIZE=2)
+class UserExportTests(TestCase):
+    def setUp(self):
+        self.admin = make_user("admin", is_staff=True)
+        for username in ("erin", "frank", "grace"):
+            make_user(username)
+
+    async def export(self, user):
+        token = str(AccessToken.for_user(user))
+        response = await AsyncClient().get(
+            "/api/users/export/", headers={"Authorization": f"Bearer {token}"}
+        )
+        if response.status_code != 200:
+            return response.status_code, []
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        return response.status_code, [json.loads(line) for line in body.splitlines()]
+
+    async def test_every_user_is_streamed_as_ndjson(self):
+        status, rows = await self.export(self.admin)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [row["username"] for row in rows], ["admin", "erin", "frank", "grace"]
+        )
+        self.assertIn("avatar_url", rows[0])
+
+    async def test_export_is_staff_only(self):
+        user = await User.objects.aget(username="erin")
+
+        status, _ = await self.export(user)
+
+        self.assertEqual(status, 403)
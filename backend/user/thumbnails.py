@@ -0,0 +1,141 @@
+# backend\user\thumbnails.py:
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+
+#
+from utils.images import render_thumbnails
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail_name(name, size):
+    """
+    Storage name of a derivative, next to its source: <name>_<size>.webp
+    """
+    root, _ = os.path.splitext(name)
+    return f"{root}_{size}.webp"
+
+
+def thumbnail_urls(file, thumbnails, fallback_url):
+    """
+    {size: url} for every configured size. Sizes not generated yet (or
+    generated for an older image) fall back to fallback_url.
+    """
+    names = {}
+    if file and thumbnails.get("source") == file.name:
+        names = thumbnails.get("sizes", {})
+    return {
+        str(size): (
+            file.storage.url(names[str(size)]) if str(size) in names else fallback_url
+        )
+        for size in settings.AVATAR_THUMBNAIL_SIZES
+    }
+
+
+class ThumbnailPipeline:
+    """
+    Fixed-size WebP derivatives of avatar images, generated off the request.
+
+    A saved image is queued once its transaction commits. A worker thread
+    reads it from storage, renders every size in a process pool (Pillow is
+    CPU bound), saves the files in the image's storage and records them in the
+    row's JSON field as {"source": name, "sizes": {"32": name, ...}}.
+    With workers=0 the work runs in the calling thread instead.
+    """
+
+    def __init__(self, sizes, quality, workers):
+        self.sizes = sizes
+        self.quality = quality
+        self.workers = workers
+        self._processes = None
+        self._threads = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads is None:
+                # Forking a multi-threaded server process is unsafe
+                self._processes = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+                self._threads = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="thumbnails"
+                )
+
+    async def stop(self):
+        with self._lock:
+            if self._threads is not None:
+                self._threads.shutdown(wait=False, cancel_futures=True)
+                self._processes.shutdown(wait=False, cancel_futures=True)
+                self._threads = self._processes = None
+
+    def schedule(self, instance, field_name, thumbnails_field):
+        model, pk = type(instance), instance.pk
+        transaction.on_commit(
+            lambda: self.submit(model, pk, field_name, thumbnails_field)
+        )
+
+    def submit(self, model, pk, field_name, thumbnails_field):
+        if not self.workers:
+            self.generate(model, pk, field_name, thumbnails_field)
+            return
+        self.start()
+        self._threads.submit(self.run, model, pk, field_name, thumbnails_field)
+
+    def run(self, model, pk, field_name, thumbnails_field):
+        try:
+            self.generate(model, pk, field_name, thumbnails_field)
+        except Exception as e:
+            logger.error(f"Error generating thumbnails of {model.__name__} {pk}: {e}")
+        finally:
+            # This thread's database connection would otherwise stay open
+            connections.close_all()
+
+    def render(self, data):
+        if self._processes is None:
+            return render_thumbnails(data, self.sizes, self.quality)
+        return self._processes.submit(
+            render_thumbnails, data, self.sizes, self.quality
+        ).result()
+
+    def generate(self, model, pk, field_name, thumbnails_field):
+        """
+        Render and store the derivatives of one row's image. Returns False if
+        there was nothing to do.
+        """
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None:
+            return False
+        file = getattr(instance, field_name)
+        if not file or getattr(instance, thumbnails_field).get("source") == file.name:
+            return False
+
+        with file.open("rb"):
+            data = file.read()
+        sizes = {}
+        for size, content in self.render(data).items():
+            name = thumbnail_name(file.name, size)
+            if file.storage.exists(name):
+                file.storage.delete(name)
+            sizes[str(size)] = file.storage.save(name, ContentFile(content))
+
+        # Unless the image was replaced in the meantime
+        model.objects.filter(pk=pk, **{field_name: file.name}).update(
+            **{thumbnails_field: {"source": file.name, "sizes": sizes}}
+        )
+        return True
+
+
+thumbnail_pipeline = ThumbnailPipeline(
+    sizes=settings.AVATAR_THUMBNAIL_SIZES,
+    quality=settings.AVATAR_THUMBNAIL_QUALITY,
+    workers=settings.AVATAR_THUMBNAIL_WORKERS,
+)
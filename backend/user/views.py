@@ -1,16 +1,23 @@
 # backend\user\views.py:
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.conf import settings
 
+#
+import json
+
 #
 from .models import Avatar
+from .pagination import DirectoryKeysetPagination
 
 #
 from .serializers import (
@@ -65,11 +72,61 @@ class UserViewSet(viewsets.GenericViewSet):
 
         return Response(response_data, status=status.HTTP_201_CREATED)
 
-    @action(detail=False, methods=["get"], permission_classes=[AllowAny])
+    @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def get_users(self, request):
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
-        return Response(serializer.data)
+        """
+        User directory ordered by username, or by email when searching by
+        email. Query params: username or email (prefix), cursor, limit.
+        """
+        field = "email" if request.query_params.get("email") else "username"
+        users = User.objects.with_avatars().with_prefix(
+            field, request.query_params.get(field, "")
+        )
+        paginator = DirectoryKeysetPagination()
+        paginator.ordering_field = field
+        page = paginator.paginate_queryset(users, request, view=self)
+        return paginator.get_paginated_response(UserSerializer(page, many=True).data)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAdminUser],
+        url_path="export",
+    )
+    def export_users(self, request):
+        """
+        Every user as newline-delimited JSON, streamed in keyset batches so
+        memory use does not grow with the number of users
+        """
+        response = StreamingHttpResponse(
+            self.export_lines(), content_type="application/x-ndjson"
+        )
+        response["Content-Disposition"] = 'attachment; filename="users.ndjson"'
+        return response
+
+    async def export_lines(self):
+        # Under ASGI a sync iterator would be collected into a list before
+        # the first byte is sent, so each batch is fetched off the event loop
+        last_username = None
+        while True:
+            batch = await sync_to_async(self.export_batch)(last_username)
+            if batch is None:
+                break
+            last_username, chunk = batch
+            yield chunk
+
+    def export_batch(self, last_username):
+        users = User.objects.with_avatars().order_by("username")
+        if last_username is not None:
+            users = users.filter(username__gt=last_username)
+        users = list(users[: settings.USER_EXPORT_CHUNK_SIZE])
+        if not users:
+            return None
+        chunk = "".join(
+            json.dumps(UserSerializer(user).data, cls=DjangoJSONEncoder) + "\n"
+            for user in users
+        )
+        return users[-1].username, chunk
 
     @action(detail=True, methods=["get"], permission_classes=[AllowAny])
     def get_user(self, request, pk=None):
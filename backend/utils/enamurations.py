@@ -13,3 +13,8 @@ class RelationType(models.TextChoices):
     REQUEST_TO_JOIN = "request_to_join", "Request to Join"
     RELATION = "relation", "Relation"
     INVITATION_TO_USER = "invitation_to_user", "Invitation to User"
+
+
+class ChatKind(models.TextChoices):
+    PERSONAL = "personal", "Personal"
+    GROUP = "group", "Group"
@@ -0,0 +1,29 @@
+# backend\utils\images.py:
+
+import io
+
+from PIL import Image, ImageOps
+
+# No Django imports: this module is loaded by process pool workers
+
+
+def render_thumbnails(data, sizes, quality=80):
+    """
+    Square WebP thumbnails of an encoded image: {size: bytes}.
+    The image is EXIF-rotated, center-cropped and downscaled, never enlarged.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        side = min(image.size)
+        square = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+
+    thumbnails = {}
+    for size in sizes:
+        thumbnail = square
+        if side > size:
+            thumbnail = square.resize((size, size), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        thumbnail.save(output, "WEBP", quality=quality, method=4)
+        thumbnails[size] = output.getvalue()
+    return thumbnails
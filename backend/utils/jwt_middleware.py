@@ -0,0 +1,102 @@
+# backend\utils\jwt_middleware.py:
+
+import logging
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+#
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# user uuid -> lightweight User (only uuid, username, is_active loaded)
+user_cache = LRUCache(
+    maxsize=settings.WS_USER_CACHE_SIZE,
+    ttl=settings.WS_USER_CACHE_TTL,
+)
+
+
+def forget_user(user_id):
+    """
+    Drop a user from user_cache once the current transaction commits, so a
+    deactivated or deleted user is not served from memory. Other processes
+    drop it when WS_USER_CACHE_TTL runs out.
+    """
+    transaction.on_commit(lambda: user_cache.delete(str(user_id)), robust=True)
+
+
+def get_raw_token(scope):
+    """
+    Token from the "Authorization: Bearer <token>" header, or from the
+    ?token= query parameter for browsers that cannot set WebSocket headers
+    """
+    headers = dict(scope.get("headers", []))
+    auth_header = headers.get(b"authorization", b"").decode()
+    parts = auth_header.split()
+    if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+        return parts[1]
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    tokens = query.get("token")
+    return tokens[0] if tokens else None
+
+
+def load_user(user_id):
+    try:
+        return User.objects.only("uuid", "username", "is_active").get(
+            **{api_settings.USER_ID_FIELD: user_id}
+        )
+    except (User.DoesNotExist, ValueError):
+        return None
+
+
+async def get_user_from_token(raw_token):
+    """
+    Verify the access token (signature, expiry, type) and return its user.
+    Recently seen users are served from memory without a query.
+    """
+    if not raw_token:
+        return AnonymousUser()
+
+    try:
+        token = AccessToken(raw_token)
+    except TokenError as e:
+        logger.info(f"Rejected WebSocket token: {str(e)}")
+        return AnonymousUser()
+
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if not user_id:
+        return AnonymousUser()
+
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await database_sync_to_async(load_user)(user_id)
+        if user is None:
+            return AnonymousUser()
+        user_cache.set(user_id, user)
+
+    if not user.is_active:
+        return AnonymousUser()
+    return user
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Populates scope["user"] from a SIMPLE_JWT access token
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        scope["user"] = await get_user_from_token(get_raw_token(scope))
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,25 @@
+# backend\utils\metrics.py:
+
+import threading
+from collections import defaultdict
+
+
+class Counters:
+    """
+    Thread-safe named counters of this process
+    """
+
+    def __init__(self):
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._values[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+counters = Counters()
@@ -0,0 +1,53 @@
+# backend\utils\ratelimit.py:
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    ``rate`` tokens per second, at most ``burst`` saved up
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def refill(self):
+        """
+        Top up the tokens earned since the last call; hold self._lock
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def consume(self, tokens=1):
+        """
+        Take tokens if available; False means the caller is over the limit
+        """
+        return consume_all([self], tokens)
+
+
+def consume_all(buckets, tokens=1):
+    """
+    Take tokens from every bucket, or from none of them if any is short, so
+    a frame refused by one limit is not charged to the others
+    """
+    # A fixed lock order keeps two callers sharing buckets from deadlocking
+    locked = sorted(buckets, key=id)
+    for bucket in locked:
+        bucket._lock.acquire()
+    try:
+        for bucket in locked:
+            bucket.refill()
+        if any(bucket.tokens < tokens for bucket in locked):
+            return False
+        for bucket in locked:
+            bucket.tokens -= tokens
+        return True
+    finally:
+        for bucket in reversed(locked):
+            bucket._lock.release()
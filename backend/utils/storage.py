@@ -0,0 +1,75 @@
+# backend\utils\storage.py:
+
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every saved file by the SHA-256 of its
+    content: <prefix>/<h[:2]>/<h[2:4]>/<h>.<ext>. Saving bytes that are
+    already stored writes nothing and returns the existing name, so any number
+    of rows can share one blob.
+
+    Because a blob may be shared, delete() leaves blobs in place; the
+    collect_avatar_blobs command removes the ones no row references anymore.
+    Names outside the prefix (files saved before this storage) behave as with
+    FileSystemStorage.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, prefix="blobs", **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix.strip("/")
+
+    def is_blob(self, name):
+        return name.replace("\\", "/").startswith(self.prefix + "/")
+
+    def blob_name(self, digest, ext):
+        return posixpath.join(self.prefix, digest[:2], digest[2:4], digest + ext)
+
+    def temp_name(self, ext):
+        return posixpath.join(self.prefix, "tmp", f"{uuid.uuid4().hex}{ext}")
+
+    def digest(self, content):
+        sha256 = hashlib.sha256()
+        if hasattr(content, "seek"):
+            content.seek(0)
+        for chunk in content.chunks(self.chunk_size):
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+        name = self.blob_name(self.digest(content), ext)
+        if self.exists(name):
+            # A fresh mtime keeps the garbage collector's grace period from
+            # sweeping a blob that was unreferenced until this upload
+            os.utime(self.path(name))
+            return name
+
+        # Written under a unique temporary name first and renamed into place:
+        # two concurrent uploads of the same bytes both end up with one
+        # complete blob, never with a half-written one or a "_abc123" copy
+        temp_name = super()._save(self.temp_name(ext), content)
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+    def delete(self, name):
+        if not self.is_blob(name):
+            super().delete(name)
+
+    def delete_blob(self, name):
+        super().delete(name)
@@ -0,0 +1,84 @@
+# backend\utils\upload_handlers.py:
+
+import os
+import warnings
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from PIL import Image, UnidentifiedImageError
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+class UploadTooLarge(MultiPartParserError, RequestDataTooBig):
+    """
+    Rejected upload: a 400 "Multipart form parse error" in DRF views and a 400
+    (suspicious operation) in plain Django views such as the admin
+    """
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every uploaded file to a temporary file and aborts the upload as
+    soon as it grows past MAX_UPLOAD_SIZE, instead of receiving it whole first.
+
+    Images are then checked from their header alone: Image.open() reads the
+    format and dimensions without decoding pixels, so a small file declaring
+    a huge canvas (a decompression bomb) is refused before ImageField
+    validation or the thumbnail pipeline decodes it.
+    """
+
+    def new_file(self, field_name, file_name, content_type, content_length, *args):
+        if content_length is not None and content_length > settings.MAX_UPLOAD_SIZE:
+            raise self.too_large(file_name)
+        super().new_file(field_name, file_name, content_type, content_length, *args)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_UPLOAD_SIZE:
+            self.upload_interrupted()
+            raise self.too_large(self.file_name)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if self.is_image():
+            self.check_image(file)
+        return file
+
+    def is_image(self):
+        extension = os.path.splitext(self.file_name or "")[1].lower()
+        return extension in IMAGE_EXTENSIONS or (self.content_type or "").startswith(
+            "image/"
+        )
+
+    def check_image(self, file):
+        try:
+            # The pixel limit below replaces Pillow's own warning
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+                with Image.open(file) as image:
+                    width, height = image.size
+        except Image.DecompressionBombError:
+            width = height = None
+        except (UnidentifiedImageError, OSError, ValueError):
+            # Not an image after all; ImageField validation reports it
+            file.seek(0)
+            return
+        file.seek(0)
+
+        if width is None or width * height > settings.MAX_UPLOAD_PIXELS:
+            self.upload_interrupted()
+            raise UploadTooLarge(
+                f"Image '{self.file_name}' exceeds the "
+                f"{settings.MAX_UPLOAD_PIXELS} pixel limit."
+            )
+
+    def too_large(self, file_name):
+        return UploadTooLarge(
+            f"File '{file_name}' exceeds the "
+            f"{settings.MAX_UPLOAD_SIZE // (1024 * 1024)} MB upload limit."
+        )